@@ -5,25 +5,59 @@ from routes.auth import auth_bp
 from routes.orders import orders_bp
 from routes.analytics import analytics_bp
 from routes.menu import menu_bp
+from routes.jobs import jobs_bp
+from routes.debug import debug_bp
+from services import admission, assets, fragment_cache, images, metrics, profiling, warmup
+from services.json_provider import FastJSONProvider
+from models.database import db_manager
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def create_app():
-    """Application factory pattern"""
+def create_app(config_object=Config):
+    """Application factory pattern.
+
+    Building the app never touches the database. Each serving process warms
+    up after the fork instead: it opens its pool, loads the menu catalog and
+    precomputes the analytics summary, and only then reports ready on /readyz.
+    """
+    started = time.perf_counter()
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_object)
+    app.json = FastJSONProvider(app)
+    db_manager.init_app(app)
     
     # Initialize CSRF protection
     csrf = CSRFProtect(app)
     
+    # Fingerprinted, precompressed static assets
+    assets.init_app(app)
+    
+    # Resized menu item images from the local image cache
+    images.init_app(app)
+    
+    # {% cache %} tag for reusable template fragments
+    fragment_cache.init_app(app)
+    
+    # Per-endpoint latency metrics and on-demand request profiling
+    metrics.init_app(app)
+    # Shed load before it reaches the views (after metrics so 503s are counted)
+    admission.init_app(app)
+    profiling.init_app(app)
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(orders_bp, url_prefix='/orders')
     app.register_blueprint(analytics_bp, url_prefix='/analytics')
     app.register_blueprint(menu_bp, url_prefix='/menu')
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
+    app.register_blueprint(debug_bp, url_prefix='/debug')
+    
+    # /healthz and /readyz, and the per-process warm-up readiness waits for
+    warmup.init_app(app)
     
     # Root route - redirect to orders home
     @app.route('/')
@@ -45,9 +79,16 @@ def create_app():
     def forbidden_error(error):
         return render_template('errors/403.html'), 403
     
+    logger.info(f"Application created in {(time.perf_counter() - started) * 1000:.1f} ms")
     return app
 
-app = create_app()
+def __getattr__(name):
+    """Build the module-level app on first access, so importing create_app builds nothing"""
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
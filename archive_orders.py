@@ -0,0 +1,82 @@
+import mysql.connector
+from config import Config
+from datetime import datetime, timedelta
+from models.archive import database_label, order_archive
+from models.database import db_manager
+from models.partitions import ORDER_TABLES, get_monthly_partitions, ensure_future_partitions
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _archive_database(orders_db, cutoff, label):
+    """Archive one database's order partitions that end before the cutoff"""
+    params = orders_db.connect_params()
+    schema = params['database']
+    connection = None
+    cursor = None
+    archived = []
+    try:
+        connection = mysql.connector.connect(**params)
+        cursor = connection.cursor()
+        
+        partitions = get_monthly_partitions(cursor, schema)
+        if not partitions:
+            logger.warning(f"Order tables in {schema} are not partitioned, run migrate_db.py first")
+            return archived
+        
+        row_cursor = connection.cursor(dictionary=True)
+        try:
+            for name, start, end in partitions:
+                if end > cutoff:
+                    break
+                
+                # Write the archive file before dropping so a crash never loses rows
+                row_cursor.execute(f"""
+                    SELECT h.order_id, h.user_id, l.item_id, l.quantity, l.unit_price, l.category,
+                           a.address AS delivery_address, h.order_timestamp
+                    FROM order_headers PARTITION ({name}) h
+                    JOIN order_items PARTITION ({name}) l
+                      ON l.order_id = h.order_id AND l.order_timestamp = h.order_timestamp
+                    JOIN addresses a ON a.address_id = h.address_id
+                    ORDER BY h.order_timestamp, h.order_id
+                """)
+                rows = row_cursor.fetchall()
+                # Shards archive the same months, so their files are told apart by a suffix
+                order_archive.write_partition(f"{name}_{label}" if label else name, start, end, rows, label)
+                # Headers and lines are partitioned alike, so the month leaves both tables
+                for table in ORDER_TABLES:
+                    cursor.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+                archived.append(name)
+        finally:
+            row_cursor.close()
+        
+        for table in ORDER_TABLES:
+            ensure_future_partitions(cursor, schema, Config.ORDER_PARTITIONS_AHEAD, table)
+        return archived
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def archive_orders(retention_days=None):
+    """Move order partitions past the retention horizon into the archive"""
+    retention_days = retention_days or Config.ORDER_RETENTION_DAYS
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    archived = []
+    try:
+        for orders_db in db_manager.order_databases():
+            # Each shard's archived months are labelled, so a failure here leaves other shards' horizons alone
+            label = database_label(orders_db) if db_manager.sharded else None
+            archived.extend(_archive_database(orders_db, cutoff, label))
+        
+        logger.info(f"Order archival completed, {len(archived)} partition(s) archived")
+        return archived
+        
+    except Exception as e:
+        logger.error(f"Order archival failed: {e}")
+        raise
+
+if __name__ == '__main__':
+    archive_orders()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+JSON serialization microbenchmark.
+
+Compares, on synthetic order rows holding Decimal and datetime values:
+  * the old /orders/api/orders path (Order objects -> hand-built dicts with
+    strftime/float -> Flask's default provider)
+  * the row path (dict rows -> Flask's default provider)
+  * the row path through FastJSONProvider
+
+Usage: python benchmarks/bench_json.py [--rows 5000] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from services.json_provider import FastJSONProvider, orjson
+
+class OrderRow:
+    """Stand-in for models.order.Order, which needs a database to import"""
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+def make_rows(count):
+    started = datetime(2025, 1, 1)
+    return [{
+        'order_id': index,
+        'user_id': index % 97,
+        'item_id': index % 16,
+        'quantity': index % 5 + 1,
+        'delivery_address': f"{index} Main Street, Bengaluru 5600{index % 100:02d}",
+        'order_timestamp': started + timedelta(minutes=index),
+        'item_name': f"Item {index % 16}",
+        'category': 'Main Course',
+        'price': Decimal('220.00')
+    } for index in range(count)]
+
+def object_path(provider, rows):
+    orders = [OrderRow(**row) for row in rows]
+    data = [{
+        'order_id': order.order_id,
+        'item_name': order.item_name,
+        'quantity': order.quantity,
+        'delivery_address': order.delivery_address,
+        'order_timestamp': order.order_timestamp.strftime('%Y-%m-%d %H:%M:%S') if order.order_timestamp else None,
+        'category': order.category,
+        'price': float(order.price) if order.price else 0
+    } for order in orders]
+    return provider.response(data).get_data()
+
+def row_path(provider, rows):
+    return provider.response(rows).get_data()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    rows = make_rows(args.rows)
+    
+    cases = [
+        ('objects + default provider', lambda: object_path(default, rows)),
+        ('rows + default provider', lambda: row_path(default, rows)),
+        ('rows + FastJSONProvider', lambda: row_path(fast, rows)),
+    ]
+    
+    print(f"{args.rows} rows x {args.repeat} runs (orjson {'available' if orjson else 'NOT installed'})")
+    with app.app_context():
+        baseline = None
+        for name, case in cases:
+            elapsed = min(timeit.repeat(case, number=1, repeat=args.repeat))
+            baseline = baseline or elapsed
+            print(f"{name:>28}: {elapsed * 1000:8.2f} ms  ({baseline / elapsed:4.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Bulk menu import benchmark.
+
+Builds a CSV of --items menu items, then imports it twice through the same
+path as POST /menu/menu/import (parse, validate, batched upsert): first as
+new items, then again so every row is an update. The benchmark items are
+deleted afterwards. Needs a migrated database.
+
+Usage: python benchmarks/bench_menu_import.py [--items 10000] [--batch-size 500]
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import db_manager
+from models.item import Item
+from services import menu_io
+
+BENCH_PREFIX = 'bench-import-'
+
+def build_csv(count, price_offset):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(menu_io.COLUMNS)
+    for index in range(count):
+        writer.writerow([f"{BENCH_PREFIX}{index}", 'Benchmark', f"{index % 500 + price_offset}.50", ''])
+    return buffer.getvalue().encode('utf-8')
+
+def run(label, data, batch_size):
+    """Import one CSV file and return items/second"""
+    started = time.perf_counter()
+    items, errors = menu_io.validate_rows(menu_io.parse_items(data, 'csv'))
+    validated = time.perf_counter() - started
+    result = Item.upsert_items(items, batch_size)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>7}: {len(items)} items ({result['created']} created, {result['updated']} updated, "
+          f"{len(errors)} errors), validated in {validated:.2f}s, "
+          f"imported in {elapsed:.2f}s -> {len(items) / elapsed:,.0f} items/s")
+    return len(items) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    try:
+        run('insert', build_csv(args.items, 1), args.batch_size)
+        run('update', build_csv(args.items, 2), args.batch_size)
+    finally:
+        db_manager.execute_query("DELETE FROM items WHERE item_name LIKE %s", (f"{BENCH_PREFIX}%",))
+        Item.bump_menu_version()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Order ingestion throughput benchmark.
+
+Places the same burst of orders through Order.create_order in 'direct' mode
+(header and line INSERTs + COMMIT per order) and in 'buffered' mode (WAL append + batched
+multi-row INSERT), and reports orders/second for each. Needs a migrated
+database with at least one user and one item.
+
+Usage: python benchmarks/bench_order_ingest.py [--orders 2000] [--threads 16]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from models.database import db_manager
+from models.order import Order
+from models.order_buffer import order_buffer
+
+BENCH_ADDRESS = 'benchmark address, please ignore'
+
+def run(mode, orders, threads, user_id, item_id):
+    """Place orders from several threads and return orders/second"""
+    Config.ORDER_INGEST_MODE = mode
+    per_thread = orders // threads
+    
+    def place():
+        for _ in range(per_thread):
+            Order.create_order(user_id, item_id, 1, BENCH_ADDRESS)
+    
+    workers = [threading.Thread(target=place) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    acknowledged = time.perf_counter() - started
+    
+    # Include the time needed to drain the buffer into MySQL
+    order_buffer.flush(timeout=120)
+    elapsed = time.perf_counter() - started
+    total = per_thread * threads
+    print(f"{mode:>8}: {total} orders, acked in {acknowledged:.2f}s, "
+          f"committed in {elapsed:.2f}s -> {total / elapsed:,.0f} orders/s")
+    return total / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+    
+    user_id = db_manager.execute_query("SELECT MIN(user_id) AS id FROM users", fetch=True)[0]['id']
+    item_id = db_manager.execute_query("SELECT MIN(item_id) AS id FROM items", fetch=True)[0]['id']
+    if not user_id or not item_id:
+        sys.exit("Seed the database first (python init_db.py)")
+    
+    try:
+        direct = run('direct', args.orders, args.threads, user_id, item_id)
+        buffered = run('buffered', args.orders, args.threads, user_id, item_id)
+        print(f"speedup: {buffered / direct:.1f}x")
+    finally:
+        order_buffer.flush(timeout=120)
+        db_manager.for_user(user_id).execute_query("""
+            DELETE h, l FROM order_headers h
+            JOIN order_items l ON l.order_id = h.order_id AND l.order_timestamp = h.order_timestamp
+            JOIN addresses a ON a.address_id = h.address_id
+            WHERE h.user_id = %s AND a.address = %s
+        """, (user_id, BENCH_ADDRESS))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Prepared statement and transaction benchmark.
+
+Runs the same hot lookups (Item.get_by_id, User.get_by_username and a page
+of Order.get_user_order_rows) three ways and reports lookups/second together
+with the server-side statement counters:
+
+    text         one text-protocol query per lookup, session reset on checkout
+    prepared     DB_PREPARED_STATEMENTS: each statement parsed once per connection
+    transaction  prepared lookups sharing one connection via db_manager.transaction()
+
+Needs a database with at least one user and one item.
+
+Usage: python benchmarks/bench_prepared.py [--lookups 3000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from models.database import db_manager
+from models.item import Item
+from models.order import Order
+from models.user import User
+
+COUNTERS = ('Questions', 'Com_stmt_prepare', 'Com_stmt_execute', 'Com_reset_connection')
+
+def server_counters():
+    rows = db_manager.execute_query(
+        "SHOW GLOBAL STATUS WHERE Variable_name IN (%s, %s, %s, %s)", COUNTERS, fetch=True)
+    return {row['Variable_name']: int(row['Value']) for row in rows}
+
+def lookups(count, item_id, username, user_id):
+    for _ in range(count // 3):
+        Item.get_by_id(item_id)
+        User.get_by_username(username)
+        Order.get_user_order_rows(user_id, limit=10)
+
+def run(mode, count, item_id, username, user_id):
+    Config.DB_PREPARED_STATEMENTS = mode != 'text'
+    db_manager.close_pool()
+    # Warm up so connection setup and the first PREPAREs are not timed
+    lookups(30, item_id, username, user_id)
+    
+    before = server_counters()
+    started = time.perf_counter()
+    if mode == 'transaction':
+        with db_manager.transaction():
+            lookups(count, item_id, username, user_id)
+    else:
+        lookups(count, item_id, username, user_id)
+    elapsed = time.perf_counter() - started
+    after = server_counters()
+    
+    deltas = ', '.join(f"{name}={after[name] - before[name]}" for name in COUNTERS)
+    print(f"{mode:>11}: {count / elapsed:,.0f} lookups/s ({deltas})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lookups', type=int, default=3000)
+    args = parser.parse_args()
+    
+    user = db_manager.execute_query("SELECT user_id, username FROM users ORDER BY user_id LIMIT 1", fetch=True)[0]
+    item_id = db_manager.execute_query("SELECT MIN(item_id) AS id FROM items", fetch=True)[0]['id']
+    
+    for mode in ('text', 'prepared', 'transaction'):
+        run(mode, args.lookups, item_id, user['username'], user['user_id'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Worker boot-time benchmark.
+
+Starts fresh interpreters that import the app module and call create_app(),
+reporting import and factory time, and checks that no database pool was
+created (so booting needs no live MySQL).
+
+Usage: python benchmarks/bench_startup.py [--runs 10]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app_module.create_app()
+created = time.perf_counter()
+from models.database import db_manager
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'create_ms': (created - imported) * 1000,
+                  'pool_created': db_manager.pool is not None}))
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    
+    for key in ('import_ms', 'create_ms'):
+        values = [result[key] for result in results]
+        print(f"{key:>10}: median {statistics.median(values):7.1f} ms, max {max(values):7.1f} ms")
+    if any(result['pool_created'] for result in results):
+        sys.exit("FAIL: booting the app created a database pool")
+    print("no database connections opened during boot")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check for the SQL issued by Order, Item, User and Address.
+
+Runs every model query method against a database (optionally seeded with a
+large generated dataset first) while recording the statements they send;
+writes are recorded but not executed. Each recorded statement is then run
+through EXPLAIN FORMAT=JSON and its table accesses are reported with the
+access type, index and estimated rows.
+
+The check fails (exit status 1) when a statement full-scans a table (access
+type ALL or index) or filesorts more than the row thresholds, unless its
+method is listed in ALLOWED_SCANS. It also fails when a SQL string in the
+model files was never executed by any scenario, so a new query cannot slip
+in unchecked: add a scenario for it below.
+
+Usage: python benchmarks/check_query_plans.py [--seed] [--orders 200000] [--max-scan-rows 1000]
+"""
+
+import argparse
+import ast
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_FILES = [os.path.join(ROOT, 'models', name) for name in ('order.py', 'item.py', 'user.py', 'address.py')]
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE)\s')
+
+# Methods whose statements read whole tables or time windows on purpose
+ALLOWED_SCANS = {
+    'Order._item_totals': 'aggregates every live order line',
+    'Order._category_totals': 'aggregates every live order line',
+    'Order.get_revenue_per_day': 'sums every order line in the chart window',
+    'Order.get_revenue_summary': 'sums every live order line',
+    'Order.get_carts': 'reads every cart in the co-occurrence lookback window',
+    'Order.get_order_times': 'reads every order in a cohort date range',
+    'Order.get_orders_per_day': 'counts every order in the chart window',
+    'Order.get_total_orders': 'counts every live order',
+    'Order.get_first_order_time': 'MIN over the partitioned order_timestamp',
+    'User.get_signup_times': 'reads every user for cohort analytics',
+    'Item.upsert_items': 'reads every item name once per bulk import',
+}
+
+BENCH_ADDRESS = 'query plan check address'
+
+class Recorder:
+    """Collects (caller, statement, params) sent through DatabaseManager while scenarios run"""
+
+    def __init__(self, patterns):
+        self.statements = {}
+        self.scenario = None
+        # Most specific first, since appended clauses (LIMIT ...) make matching prefix-based
+        self.patterns = sorted(patterns, key=lambda pattern: -len(pattern[2].pattern))
+        self.model_files = {os.path.realpath(path) for path in MODEL_FILES}
+        self.method_names = {}
+
+    def caller(self, query):
+        """Model method whose source holds the statement, e.g. 'Order._item_totals'"""
+        compact = re.sub(r'\s+', '', query)
+        for _, method, regex in self.patterns:
+            if regex.match(compact):
+                return method
+        # Otherwise the innermost model method on the stack
+        frame = sys._getframe(2)
+        while frame is not None:
+            if os.path.realpath(frame.f_code.co_filename) in self.model_files:
+                return self.method_name(frame)
+            frame = frame.f_back
+        return '?'
+
+    def method_name(self, frame):
+        """'Class.method' of a model frame; functions nested in a method count as that method"""
+        code = frame.f_code
+        if code not in self.method_names:
+            self.method_names.update(method_codes(frame.f_globals))
+        return self.method_names.get(code, code.co_name)
+
+def method_codes(module_globals):
+    """{code object: 'Class.method'} for the classes of a module, including code nested in each method"""
+    names = {}
+    for cls in module_globals.values():
+        if not isinstance(cls, type) or cls.__module__ != module_globals.get('__name__'):
+            continue
+        for attr, value in vars(cls).items():
+            function = value.__func__ if isinstance(value, (staticmethod, classmethod)) else value
+            code = getattr(function, '__code__', None)
+            pending = [code] if code else []
+            while pending:
+                code = pending.pop()
+                names[code] = f"{cls.__name__}.{attr}"
+                pending.extend(const for const in code.co_consts if hasattr(const, 'co_code'))
+    return names
+
+    def record(self, query, params):
+        key = ' '.join(query.split())
+        if key not in self.statements:
+            self.statements[key] = {'caller': self.caller(query), 'scenario': self.scenario,
+                                    'query': key, 'params': tuple(params or ())}
+
+def is_read(query):
+    return query.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+def recording(recorder):
+    """Patch DatabaseManager so statements are recorded and only reads reach MySQL"""
+    from models.database import DatabaseManager, Transaction
+    original_run = DatabaseManager._run
+
+    def run(manager, connection, query, params, fetch, prepared):
+        recorder.record(query, params)
+        if is_read(query):
+            return original_run(manager, connection, query, params, fetch, prepared)
+        return ([] if fetch else 1), 1
+
+    def executemany(transaction, query, seq_params):
+        seq_params = list(seq_params)
+        recorder.record(query, seq_params[0] if seq_params else ())
+        transaction.lastrowid = 1
+        return len(seq_params)
+
+    return [mock.patch.object(DatabaseManager, '_run', run),
+            mock.patch.object(Transaction, 'executemany', executemany)]
+
+def store_new_address():
+    """Address.get_ids for an address not stored yet"""
+    from models.address import Address
+    from models.database import db_manager
+    try:
+        Address.get_ids(db_manager, [f"query plan check address {time.time()}"])
+    except KeyError:
+        # The INSERT is recorded but not executed, so the follow-up lookup finds nothing
+        pass
+
+def read_menu_version():
+    """Item.get_menu_version past the per-process copy of the version"""
+    import models.item
+    models.item._menu_version = (None, None)
+    models.item.Item.get_menu_version()
+
+def scenarios(sample):
+    """(label, call) pairs covering every query method of the models"""
+    from models.address import Address
+    from models.item import Item
+    from models.order import Order
+    from models.user import User
+    now = datetime.now()
+    item = {'item_name': sample['item_name'], 'category': sample['category'], 'price': 10, 'image_url': None}
+    return [
+        ('User.get_by_username', lambda: User.get_by_username(sample['username'])),
+        ('User.get_by_id', lambda: User.get_by_id(sample['user_id'])),
+        ('User.create_user', lambda: User.create_user('plan_check_user', 'password123')),
+        ('User.get_signup_times', lambda: User.get_signup_times()),
+        ('Item.get_all_items', lambda: Item.get_all_items()),
+        ('Item.get_items_by_category', lambda: Item.get_items_by_category()),
+        ('Item.get_by_id', lambda: Item.get_by_id(sample['item_id'])),
+        ('Item.get_by_name', lambda: Item.get_by_name(sample['item_name'])),
+        ('Item.search_items', lambda: Item.search_items(sample['item_name'][:4])),
+        ('Item.search_items category', lambda: Item.search_items(sample['item_name'][:4], sample['category'])),
+        ('Item.create_item', lambda: Item.create_item('Plan check item', sample['category'], 10)),
+        ('Item.update_item', lambda: Item.update_item(sample['item_id'], sample['item_name'], sample['category'], 10)),
+        ('Item.upsert_items', lambda: Item.upsert_items([item])),
+        ('Item.iter_items', lambda: list(Item.iter_items())),
+        ('Item.get_menu_version', read_menu_version),
+        ('Item.set_image_key', lambda: Item.set_image_key(sample['item_id'], None)),
+        ('Item.delete_item', lambda: Item.delete_item(sample['item_id'])),
+        ('Address.get_ids new', store_new_address),
+        ('Address.get_user_addresses', lambda: Address.get_user_addresses(sample['user_id'])),
+        ('Address.forget', lambda: Address.forget(sample['user_id'], 1)),
+        ('Order.place_order', lambda: Order.place_order(sample['user_id'], [(sample['item_id'], 1)], BENCH_ADDRESS)),
+        ('Order.get_user_orders page', lambda: Order.get_user_orders(sample['user_id'], 20, 0)),
+        ('Order.get_user_orders all', lambda: Order.get_user_orders(sample['user_id'])),
+        ('Order.get_user_orders past live rows', lambda: Order.get_user_orders(sample['user_id'], 20, 10 ** 6)),
+        ('Order.get_all_orders', lambda: Order.get_all_orders(50, 0)),
+        ('Order.update_order', lambda: Order.update_order(sample['line_id'], sample['user_id'], 2, BENCH_ADDRESS)),
+        ('Order.delete_order', lambda: Order.delete_order(sample['line_id'], sample['user_id'])),
+        ('Order.get_order_times', lambda: Order.get_order_times(now - timedelta(days=7), now)),
+        ('Order.get_carts', lambda: Order.get_carts(now - timedelta(days=Config.COOCCURRENCE_LOOKBACK_DAYS))),
+        ('Order.get_first_order_time', lambda: Order.get_first_order_time()),
+        ('Order.get_analytics_summary', lambda: Order.get_analytics_summary()),
+    ]
+
+def pick_sample(db_manager):
+    """Ids and names of existing rows for the scenarios to query"""
+    row = db_manager.execute_query("""
+        SELECT h.user_id, u.username, l.line_id, l.item_id
+        FROM order_headers h
+        JOIN order_items l ON l.order_id = h.order_id AND l.order_timestamp = h.order_timestamp
+        JOIN users u ON u.user_id = h.user_id
+        ORDER BY h.order_timestamp DESC LIMIT 1
+    """, fetch=True)
+    if not row:
+        sys.exit("No orders to check against, run with --seed")
+    item = db_manager.execute_query("SELECT item_name, category FROM items WHERE item_id = %s",
+                                    (row[0]['item_id'],), fetch=True)[0]
+    return dict(row[0], **item)
+
+def record_statements(db_manager, sample):
+    """Run every scenario with and without an archive horizon; returns the recorder"""
+    from models.order import order_archive
+    recorder = Recorder(sql_patterns())
+    horizon = datetime.now() - timedelta(days=Config.ORDER_RETENTION_DAYS)
+    patches = recording(recorder)
+    for patch in patches:
+        patch.start()
+    try:
+        # Both query shapes: everything live, and live rows limited to the archive horizon
+        for variant, variant_horizon in (('live', None), ('archived', horizon)):
+            with mock.patch.object(order_archive, 'horizon', return_value=variant_horizon):
+                for label, call in scenarios(sample):
+                    recorder.scenario = f"{label} ({variant})"
+                    try:
+                        call()
+                    except Exception as e:
+                        # Statements it did not reach show up as uncovered
+                        print(f"Scenario {recorder.scenario} failed: {e}")
+    finally:
+        for patch in patches:
+            patch.stop()
+    return recorder
+
+def sql_patterns():
+    """(file:line, method, regex) for every SQL string literal in the model files"""
+    patterns = []
+    for path in MODEL_FILES:
+        tree = ast.parse(open(path).read(), path)
+        scopes = {}
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+                for child in ast.walk(node):
+                    scopes.setdefault(child, []).append(node)
+        fstring_parts = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.JoinedStr):
+                fstring_parts.update(id(value) for value in node.values)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.JoinedStr):
+                parts = [value.value if isinstance(value, ast.Constant) else None for value in node.values]
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in fstring_parts:
+                parts = [node.value]
+            else:
+                continue
+            if not parts or parts[0] is None or not SQL_START.match(parts[0]):
+                continue
+            # Whitespace is ignored and interpolated fragments match anything
+            regex = '.*?'.join(re.escape(re.sub(r'\s+', '', part)) if part is not None else ''
+                               for part in parts)
+            method = '.'.join(scope.name for scope in scopes.get(node, [])[:2])
+            location = f"{os.path.relpath(path, ROOT)}:{node.lineno}"
+            patterns.append((location, method, re.compile(regex)))
+    return patterns
+
+def uncovered_statements(recorder):
+    executed = [re.sub(r'\s+', '', query) for query in recorder.statements]
+    return [(location, method) for location, method, regex in recorder.patterns
+            if not any(regex.match(query) for query in executed)]
+
+def table_accesses(node, accesses, flags):
+    """Walk an EXPLAIN FORMAT=JSON tree collecting table accesses and sort/temporary flags"""
+    if isinstance(node, dict):
+        table = node.get('table')
+        if isinstance(table, dict) and 'table_name' in table:
+            accesses.append(table)
+        if node.get('using_filesort'):
+            flags['filesort'] = True
+        if node.get('using_temporary_table'):
+            flags['temporary'] = True
+        for value in node.values():
+            table_accesses(value, accesses, flags)
+    elif isinstance(node, list):
+        for value in node:
+            table_accesses(value, accesses, flags)
+
+def explain(connection, statement, max_scan_rows, max_sort_rows):
+    """Plan summary of one recorded statement, with a 'status' of ok, allowed, fail or skipped"""
+    result = {'caller': statement['caller'], 'scenario': statement['scenario'], 'query': statement['query'],
+              'tables': [], 'filesort': False, 'temporary': False, 'problems': []}
+    query = statement['query']
+    if query.upper().startswith(('INSERT', 'REPLACE')) and ' SELECT ' not in query.upper():
+        result['status'] = 'skipped'
+        return result
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {query}", statement['params'])
+        plan = json.loads(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+
+    accesses, flags = [], {}
+    table_accesses(plan, accesses, flags)
+    result['filesort'] = bool(flags.get('filesort'))
+    result['temporary'] = bool(flags.get('temporary'))
+    for access in accesses:
+        rows = int(access.get('rows_examined_per_scan') or 0)
+        result['tables'].append({'table': access['table_name'], 'access_type': access.get('access_type'),
+                                 'key': access.get('key'), 'rows': rows,
+                                 'partitions': len(access.get('partitions') or [])})
+        if access.get('access_type') in ('ALL', 'index') and rows > max_scan_rows:
+            result['problems'].append(f"full {'index ' if access['access_type'] == 'index' else ''}scan of "
+                                      f"{access['table_name']} (~{rows} rows)")
+    sorted_rows = max((table['rows'] for table in result['tables']), default=0)
+    if result['filesort'] and sorted_rows > max_sort_rows:
+        result['problems'].append(f"filesort of ~{sorted_rows} rows")
+
+    if not result['problems']:
+        result['status'] = 'ok'
+    elif statement['caller'] in ALLOWED_SCANS:
+        result['status'] = 'allowed'
+    else:
+        result['status'] = 'fail'
+    return result
+
+def print_report(results, uncovered):
+    for result in results:
+        print(f"[{result['status'].upper():>7}] {result['caller']}: {result['query'][:110]}")
+        for table in result['tables']:
+            print(f"          {table['table']:<14} {table['access_type'] or '-':<7} key={table['key'] or '-':<30} "
+                  f"rows={table['rows']:<9} partitions={table['partitions']}")
+        extras = [name for name in ('filesort', 'temporary') if result[name]]
+        if extras:
+            print(f"          using {', '.join(extras)}")
+        for problem in result['problems']:
+            reason = ALLOWED_SCANS.get(result['caller'])
+            print(f"          ! {problem}" + (f" (allowed: {reason})" if result['status'] == 'allowed' else ''))
+    for location, method in uncovered:
+        print(f"[UNCOVRD] {method} ({location}): never executed by a scenario")
+
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print(f"\n{len(results)} statements: " + ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+          + f", {len(uncovered)} uncovered")
+
+def seed(db_manager, users, items, orders):
+    """Create the check database and top it up to the requested row counts"""
+    from init_db import init_database
+    from migrate_db import migrate_database
+    init_database()
+    migrate_database()
+
+    rng = random.Random(42)
+    now = datetime.now().replace(microsecond=0)
+    count = lambda table: db_manager.execute_query(f"SELECT COUNT(*) AS n FROM {table}", fetch=True)[0]['n']
+    batch = 5000
+
+    existing = count('users')
+    rows = [(f"plan_user_{index}", 'not-a-password-hash', now - timedelta(seconds=rng.randrange(400 * 86400)))
+            for index in range(existing, users)]
+    for start in range(0, len(rows), batch):
+        db_manager.executemany("INSERT IGNORE INTO users (username, password_hash, created_at) VALUES (%s, %s, %s)",
+                               rows[start:start + batch])
+
+    existing = count('items')
+    categories = ['Main Course', 'Snacks', 'Dessert', 'Beverage']
+    rows = [(f"Plan item {index}", categories[index % len(categories)], 50 + index % 400)
+            for index in range(existing, items)]
+    db_manager.executemany("INSERT IGNORE INTO items (item_name, category, price) VALUES (%s, %s, %s)", rows)
+
+    from migrate_db import rebuild_address_book
+    from models.address import Address
+    Address.get_id(db_manager, BENCH_ADDRESS)
+
+    user_ids = [row['user_id'] for row in db_manager.execute_query("SELECT user_id FROM users", fetch=True)]
+    items = db_manager.execute_query("SELECT item_id, price, category FROM items", fetch=True)
+    next_id = db_manager.execute_query("SELECT COALESCE(MAX(order_id), 0) + 1 AS id FROM order_headers",
+                                       fetch=True)[0]['id']
+    missing = orders - count('order_headers')
+    started = time.perf_counter()
+    for start in range(0, max(missing, 0), batch):
+        headers, lines = [], []
+        for order_id in range(next_id + start, next_id + min(start + batch, missing)):
+            timestamp = now - timedelta(seconds=rng.randrange(365 * 86400))
+            # Each user orders to one of three addresses
+            user_id = rng.choice(user_ids)
+            headers.append((order_id, user_id, f"{user_id} Plan Street, Flat {rng.randrange(3)}", timestamp))
+            for item in rng.sample(items, rng.randint(1, min(4, len(items)))):
+                lines.append((order_id, item['item_id'], rng.randint(1, 3), item['price'], item['category'], timestamp))
+        address_ids = Address.get_ids(db_manager, [address for _, _, address, _ in headers])
+        headers = [(order_id, user_id, address_ids[address], timestamp) for order_id, user_id, address, timestamp in headers]
+        with db_manager.transaction() as transaction:
+            transaction.executemany("""
+                INSERT INTO order_headers (order_id, user_id, address_id, order_timestamp)
+                VALUES (%s, %s, %s, %s)
+            """, headers)
+            transaction.executemany("""
+                INSERT INTO order_items (order_id, item_id, quantity, unit_price, category, order_timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, lines)
+    if missing > 0:
+        connection = db_manager.get_connection()
+        try:
+            rebuild_address_book(connection)
+        finally:
+            connection.close()
+        print(f"Seeded {missing} orders in {time.perf_counter() - started:.1f}s")
+
+    db_manager.execute_query("ANALYZE TABLE users, items, order_headers, order_items, addresses, user_addresses",
+                             fetch=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=f"{Config.DB_NAME}_plans",
+                        help="database to check (created by --seed); never the application database by default")
+    parser.add_argument('--seed', action='store_true', help="create the database and generate rows first")
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--max-scan-rows', type=int, default=1000)
+    parser.add_argument('--max-sort-rows', type=int, default=1000)
+    parser.add_argument('--report', help="also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    # Point the models at the check database, unsharded, writing orders directly
+    Config.DB_NAME = args.database
+    Config.ORDER_SHARDS = ''
+    Config.ORDER_INGEST_MODE = 'direct'
+    Config.DB_PREPARED_STATEMENTS = False
+    from models.database import db_manager
+
+    if args.seed:
+        seed(db_manager, args.users, args.items, args.orders)
+
+    recorder = record_statements(db_manager, pick_sample(db_manager))
+    connection = db_manager.get_connection()
+    try:
+        results = [explain(connection, statement, args.max_scan_rows, args.max_sort_rows)
+                   for statement in recorder.statements.values()]
+    finally:
+        connection.close()
+    uncovered = uncovered_statements(recorder)
+    print_report(results, uncovered)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'statements': results, 'uncovered': [{'location': location, 'method': method}
+                                                            for location, method in uncovered]}, f, indent=2)
+
+    failed = any(result['status'] == 'fail' for result in results) or uncovered
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Static asset pipeline.
+
+Vendors third-party scripts, minifies CSS/JS, writes content-hashed copies
+to static/dist with gzip and brotli variants, and records the mapping in
+static/dist/manifest.json for the asset_url() template helper.
+"""
+
+from services.assets import VENDOR_ASSETS, SOURCE_ASSETS, DIST_DIRNAME, MANIFEST_NAME
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};:,>])\s*', r'\1', source)
+    source = source.replace(';}', '}')
+    return source.strip()
+
+# Characters after which a '/' starts a regular expression literal rather than a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^') | {''}
+
+def minify_js(source):
+    """Strip comments and indentation from a script.
+
+    String, template and regex literals are copied verbatim and line breaks
+    are kept, so automatic semicolon insertion behaves exactly as before.
+    """
+    out = []
+    i, n = 0, len(source)
+    last_significant = ''
+    while i < n:
+        c = source[i]
+        nxt = source[i + 1] if i + 1 < n else ''
+        if c in '"\'`':
+            end = i + 1
+            while end < n and source[end] != c:
+                end += 2 if source[end] == '\\' else 1
+            out.append(source[i:end + 1])
+            last_significant = c
+            i = end + 1
+        elif c == '/' and nxt == '/':
+            while i < n and source[i] != '\n':
+                i += 1
+        elif c == '/' and nxt == '*':
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+        elif c == '/' and last_significant in REGEX_PRECEDERS:
+            end = i + 1
+            in_class = False
+            while end < n and (source[end] != '/' or in_class):
+                if source[end] == '\\':
+                    end += 1
+                elif source[end] == '[':
+                    in_class = True
+                elif source[end] == ']':
+                    in_class = False
+                end += 1
+            out.append(source[i:end + 1])
+            last_significant = '/'
+            i = end + 1
+        else:
+            out.append(c)
+            if not c.isspace():
+                last_significant = c
+            i += 1
+
+    lines = (line.strip() for line in ''.join(out).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+def vendor_assets():
+    """Download pinned third-party scripts that are not yet in static/vendor"""
+    for path, url in VENDOR_ASSETS.items():
+        target = os.path.join(STATIC_DIR, path)
+        if os.path.exists(target):
+            continue
+        logger.info(f"Vendoring {url} -> static/{path}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response, open(target + '.tmp', 'wb') as f:
+            shutil.copyfileobj(response, f)
+        os.replace(target + '.tmp', target)
+
+def build_asset(path, dist_dir):
+    """Minify, fingerprint and precompress one asset; returns its hashed path"""
+    with open(os.path.join(STATIC_DIR, path), 'r', encoding='utf-8') as f:
+        source = f.read()
+
+    if path.startswith('vendor/') or path.endswith('.min.js'):
+        content = source
+    elif path.endswith('.css'):
+        content = minify_css(source)
+    else:
+        content = minify_js(source)
+
+    data = content.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    root, ext = os.path.splitext(path)
+    hashed = f"{root}.{digest}{ext}"
+
+    target = os.path.join(dist_dir, hashed)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(data)
+    with open(target + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(target + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+    logger.info(f"{path}: {len(source.encode('utf-8'))} -> {len(data)} bytes -> {hashed}")
+    return hashed
+
+def build_assets():
+    """Run the asset pipeline and write the manifest"""
+    try:
+        vendor_assets()
+    except Exception as e:
+        logger.warning(f"Could not vendor third-party assets, templates will use the CDN: {e}")
+
+    if not brotli:
+        logger.warning("brotli is not installed, only gzip variants will be written")
+
+    dist_dir = os.path.join(STATIC_DIR, DIST_DIRNAME)
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for path in SOURCE_ASSETS:
+        if os.path.exists(os.path.join(STATIC_DIR, path)):
+            manifest[path] = build_asset(path, dist_dir)
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Wrote {len(manifest)} assets to static/{DIST_DIRNAME}")
+    return manifest
+
+if __name__ == '__main__':
+    build_assets()
+    sys.exit(0)
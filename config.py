@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+basedir = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-change-this-in-production'
     DB_HOST = os.environ.get('DB_HOST') or 'localhost'
@@ -10,3 +12,134 @@ class Config:
     DB_PASSWORD = os.environ.get('DB_PASSWORD') or 'root'
     DB_NAME = os.environ.get('DB_NAME') or 'zomato'
     FLASK_ENV = os.environ.get('FLASK_ENV') or 'development'
+
+    # Local storage for archives, queues and caches
+    DATA_DIR = os.environ.get('DATA_DIR') or os.path.join(basedir, 'data')
+
+    # Order partitions older than this are moved to the archive
+    ORDER_RETENTION_DAYS = int(os.environ.get('ORDER_RETENTION_DAYS') or 90)
+    ORDER_ARCHIVE_DIR = os.environ.get('ORDER_ARCHIVE_DIR') or os.path.join(DATA_DIR, 'archive')
+    ORDER_PARTITIONS_AHEAD = int(os.environ.get('ORDER_PARTITIONS_AHEAD') or 3)
+
+    # Background job queue
+    JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH') or os.path.join(DATA_DIR, 'jobs.sqlite3')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 1.0)
+    JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF') or 5.0)
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 900)
+    EXPORT_DIR = os.environ.get('EXPORT_DIR') or os.path.join(DATA_DIR, 'exports')
+
+    # Precomputed analytics summary served by the analytics API
+    ANALYTICS_SNAPSHOT_TTL = int(os.environ.get('ANALYTICS_SNAPSHOT_TTL') or 60)
+
+    # Offline order reports (report_orders.py): partitions aggregated in parallel, each saved so a run can resume
+    REPORT_DIR = os.environ.get('REPORT_DIR') or os.path.join(DATA_DIR, 'reports')
+    REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS') or min(os.cpu_count() or 1, 4))
+    REPORT_FETCH_SIZE = int(os.environ.get('REPORT_FETCH_SIZE') or 5000)
+
+    # Customer cohort analytics (services/cohorts.py), recomputed once a day
+    COHORT_WEEKS = int(os.environ.get('COHORT_WEEKS') or 12)
+    COHORT_WORKERS = int(os.environ.get('COHORT_WORKERS') or min(os.cpu_count() or 1, 4))
+    COHORT_CHUNK_DAYS = int(os.environ.get('COHORT_CHUNK_DAYS') or 7)
+
+    # "Customers also ordered" index (services/cooccurrence.py), built from the carts placed
+    # in the last COOCCURRENCE_LOOKBACK_DAYS
+    COOCCURRENCE_TOP_N = int(os.environ.get('COOCCURRENCE_TOP_N') or 3)
+    COOCCURRENCE_LOOKBACK_DAYS = int(os.environ.get('COOCCURRENCE_LOOKBACK_DAYS') or 180)
+    COOCCURRENCE_REFRESH_SECONDS = int(os.environ.get('COOCCURRENCE_REFRESH_SECONDS') or 900)
+    # How often web processes look for a newer index snapshot
+    COOCCURRENCE_RELOAD_SECONDS = int(os.environ.get('COOCCURRENCE_RELOAD_SECONDS') or 30)
+
+    # Menu item images (services/images.py): resized WebP/JPEG variants in a content-addressed cache
+    IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR') or os.path.join(DATA_DIR, 'images')
+    IMAGE_WIDTHS = [int(w) for w in (os.environ.get('IMAGE_WIDTHS') or '160,320,640').split(',')]
+    IMAGE_DEFAULT_WIDTH = int(os.environ.get('IMAGE_DEFAULT_WIDTH') or 320)
+    IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY') or 80)
+    IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES') or 10 * 1024 * 1024)
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS') or 40_000_000)
+    IMAGE_FETCH_TIMEOUT = float(os.environ.get('IMAGE_FETCH_TIMEOUT') or 10)
+
+    # Bulk menu import (POST /menu/menu/import): rows per INSERT ... ON DUPLICATE KEY UPDATE and per file
+    MENU_IMPORT_BATCH_SIZE = int(os.environ.get('MENU_IMPORT_BATCH_SIZE') or 500)
+    MENU_IMPORT_MAX_ROWS = int(os.environ.get('MENU_IMPORT_MAX_ROWS') or 50000)
+
+    # Order ingestion: 'direct' inserts each order, 'buffered' group-commits through a local WAL
+    ORDER_INGEST_MODE = os.environ.get('ORDER_INGEST_MODE') or 'direct'
+    ORDER_WAL_DIR = os.environ.get('ORDER_WAL_DIR') or os.path.join(DATA_DIR, 'order_wal')
+    ORDER_BUFFER_BATCH_SIZE = int(os.environ.get('ORDER_BUFFER_BATCH_SIZE') or 200)
+    ORDER_BUFFER_FLUSH_MS = int(os.environ.get('ORDER_BUFFER_FLUSH_MS') or 5)
+    ORDER_WAL_SEGMENT_BYTES = int(os.environ.get('ORDER_WAL_SEGMENT_BYTES') or 4 * 1024 * 1024)
+
+    # Delivery addresses: address hash -> id lookups cached per process, saved addresses offered per user
+    ADDRESS_CACHE_SIZE = int(os.environ.get('ADDRESS_CACHE_SIZE') or 10000)
+    ADDRESS_BOOK_SIZE = int(os.environ.get('ADDRESS_BOOK_SIZE') or 5)
+
+    # Change event log of order and menu writes (services/event_log.py), one per host
+    EVENT_LOG_ENABLED = (os.environ.get('EVENT_LOG_ENABLED') or 'true').lower() == 'true'
+    EVENT_LOG_DIR = os.environ.get('EVENT_LOG_DIR') or os.path.join(DATA_DIR, 'events')
+    EVENT_LOG_SEGMENT_BYTES = int(os.environ.get('EVENT_LOG_SEGMENT_BYTES') or 16 * 1024 * 1024)
+    EVENT_LOG_FSYNC = (os.environ.get('EVENT_LOG_FSYNC') or 'false').lower() == 'true'
+    EVENT_LOG_RETENTION_DAYS = int(os.environ.get('EVENT_LOG_RETENTION_DAYS') or 7)
+
+    # Rendered template fragments kept per process
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 256)
+
+    # Seconds a process reuses the menu version before re-reading it from the database
+    MENU_VERSION_TTL = float(os.environ.get('MENU_VERSION_TTL') or 2)
+
+    # Connections per worker process
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+
+    # Order sharding: comma-separated `database` or `host[:port]/database` entries; empty keeps
+    # orders in DB_NAME. Users are placed on a consistent-hash ring with ORDER_SHARD_VNODES points per shard.
+    ORDER_SHARDS = os.environ.get('ORDER_SHARDS') or ''
+    ORDER_SHARD_VNODES = int(os.environ.get('ORDER_SHARD_VNODES') or 160)
+
+    # Server-side prepared statements for hot lookups, cached per connection
+    DB_PREPARED_STATEMENTS = (os.environ.get('DB_PREPARED_STATEMENTS') or 'false').lower() == 'true'
+    DB_PREPARED_CACHE_SIZE = int(os.environ.get('DB_PREPARED_CACHE_SIZE') or 32)
+
+    # Production server (serve.py); WEB_WORKERS=0 derives the count from CPUs and DB_MAX_CONNECTIONS
+    WEB_BIND = os.environ.get('WEB_BIND') or '0.0.0.0:8000'
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS') or 0)
+    WEB_THREADS = int(os.environ.get('WEB_THREADS') or 4)
+    WEB_MAX_REQUESTS = int(os.environ.get('WEB_MAX_REQUESTS') or 2000)
+    WEB_MAX_REQUESTS_JITTER = int(os.environ.get('WEB_MAX_REQUESTS_JITTER') or 200)
+    WEB_KEEPALIVE = int(os.environ.get('WEB_KEEPALIVE') or 5)
+    WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT') or 30)
+    WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT') or 30)
+    DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS') or 150)
+    WEB_PRELOAD = (os.environ.get('WEB_PRELOAD') or 'false').lower() == 'true'
+    # Longest serve.py holds a new worker back to warm up (pool, menu catalog, analytics) before it accepts connections
+    WARMUP_TIMEOUT = float(os.environ.get('WARMUP_TIMEOUT') or 10)
+
+    # On-demand request profiling (services/profiling.py)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(DATA_DIR, 'profiles')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0.0)
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS') or 2.0)
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP') or 200)
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE') or 24 * 3600)
+
+    # Request latency metrics (services/metrics.py), kept per process in SLOT-second slots
+    PERF_SLOT_SECONDS = int(os.environ.get('PERF_SLOT_SECONDS') or 10)
+    PERF_WINDOWS = [int(w) for w in (os.environ.get('PERF_WINDOWS') or '60,300,900').split(',')]
+    PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS') or 1000)
+
+    # Admission control (services/admission.py): per-worker request slots, default DB_POOL_SIZE.
+    # Normal and low priority endpoints may only fill their share of the slots, so order
+    # placement keeps headroom when analytics and admin listings pile up.
+    ADMISSION_ENABLED = (os.environ.get('ADMISSION_ENABLED') or 'true').lower() == 'true'
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT') or 0)
+    ADMISSION_NORMAL_SHARE = float(os.environ.get('ADMISSION_NORMAL_SHARE') or 0.8)
+    ADMISSION_LOW_SHARE = float(os.environ.get('ADMISSION_LOW_SHARE') or 0.5)
+    ADMISSION_CRITICAL_ENDPOINTS = (os.environ.get('ADMISSION_CRITICAL_ENDPOINTS') or
+                                    'orders.place_order,orders.edit_order,orders.delete_order,auth.*')
+    ADMISSION_LOW_ENDPOINTS = (os.environ.get('ADMISSION_LOW_ENDPOINTS') or
+                               'analytics.*,orders.all_orders,menu.manage_menu,menu.import_items,'
+                               'menu.export_items,jobs.*')
+    ADMISSION_EXEMPT_ENDPOINTS = os.environ.get('ADMISSION_EXEMPT_ENDPOINTS') or 'static,assets.*,images.*,debug.*,health.*'
+    # Per-endpoint concurrency caps, e.g. 'analytics.api_export_orders=1'
+    ADMISSION_ENDPOINT_LIMITS = os.environ.get('ADMISSION_ENDPOINT_LIMITS') or 'analytics.analytics_dashboard=2'
+    # Longest a request may wait (upstream queue per X-Request-Start plus waiting for a slot)
+    ADMISSION_QUEUE_BUDGET_MS = os.environ.get('ADMISSION_QUEUE_BUDGET_MS') or 'critical=3000,normal=1000,low=250'
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER') or 2)
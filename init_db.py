@@ -1,5 +1,7 @@
 import mysql.connector
 from config import Config
+from migrate_db import (ORDER_HEADERS_TABLE, ORDER_ITEMS_TABLE, ADDRESSES_TABLE, USER_ADDRESSES_TABLE,
+                        MENU_VERSION_TABLE, MENU_VERSION_ROW, address_ids, migrate_addresses, rebuild_address_book)
 from werkzeug.security import generate_password_hash
 import logging
 
@@ -35,18 +37,8 @@ def init_database():
             item_name VARCHAR(100) NOT NULL UNIQUE,
             category VARCHAR(50),
             price DECIMAL(10,2),
-            image_url VARCHAR(500)
-        );
-
-        CREATE TABLE IF NOT EXISTS orders (
-            order_id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            item_id INT NOT NULL,
-            quantity INT NOT NULL,
-            delivery_address TEXT NOT NULL,
-            order_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-            FOREIGN KEY (item_id) REFERENCES items(item_id) ON DELETE CASCADE
+            image_url VARCHAR(500),
+            image_key CHAR(64)
         );
         """
         
@@ -54,6 +46,16 @@ def init_database():
             if statement.strip():
                 cursor.execute(statement)
         
+        # Orders are stored as a header per cart plus its lines (partitioned by migrate_db.py)
+        cursor.execute(ORDER_HEADERS_TABLE)
+        cursor.execute(ORDER_ITEMS_TABLE)
+        cursor.execute(ADDRESSES_TABLE)
+        cursor.execute(USER_ADDRESSES_TABLE)
+        cursor.execute(MENU_VERSION_TABLE)
+        cursor.execute(MENU_VERSION_ROW)
+        # Order headers of an older schema still carry the address text
+        migrate_addresses(connection, Config.DB_NAME)
+        
         # Insert sample users with proper password hashing
         users_data = [
             ('alice', 'password123'),
@@ -93,6 +95,8 @@ def init_database():
                 "INSERT IGNORE INTO items (item_name, category, price, image_url) VALUES (%s, %s, %s, %s)",
                 (item_name, category, price, image_url)
             )
+        # Running servers pick up the seeded menu
+        cursor.execute("UPDATE menu_version SET version = version + 1 WHERE id = 1")
         
         # Insert sample orders
         orders_data = [
@@ -108,13 +112,24 @@ def init_database():
             (1, 5, 3, '123 Main Street', '2025-01-07 10:25:00')
         ]
         
-        for user_id, item_id, quantity, address, timestamp in orders_data:
+        # Each sample order is a one-line cart; the seed key keeps re-runs from duplicating it
+        addresses = address_ids(connection, [order[3] for order in orders_data])
+        for index, (user_id, item_id, quantity, address, timestamp) in enumerate(orders_data):
             cursor.execute(
-                "INSERT IGNORE INTO orders (user_id, item_id, quantity, delivery_address, order_timestamp) VALUES (%s, %s, %s, %s, %s)",
-                (user_id, item_id, quantity, address, timestamp)
+                "INSERT IGNORE INTO order_headers (user_id, address_id, order_timestamp, ingest_key) VALUES (%s, %s, %s, %s)",
+                (user_id, addresses[address], timestamp, f"seed-{index}")
             )
+            if cursor.rowcount == 1:
+                # Lines snapshot the item's price and category at the time of the order
+                cursor.execute("""
+                    INSERT INTO order_items (order_id, item_id, quantity, unit_price, category, order_timestamp)
+                    SELECT %s, item_id, %s, price, category, %s FROM items WHERE item_id = %s
+                """, (cursor.lastrowid, quantity, timestamp, item_id))
         
         connection.commit()
+        
+        # Saved addresses of the sample users
+        rebuild_address_book(connection)
         logger.info("Database initialized successfully!")
         
     except Exception as e:
@@ -1,10 +1,369 @@
+import hashlib
 import mysql.connector
 from config import Config
+from datetime import datetime
+from models.address import Address
+from models.archive import order_archive
+from models.database import db_manager
+from models.partitions import ORDER_TABLES, add_months, month_start, partition_table
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One row per placed cart. Order tables are partitioned by month, so order_timestamp is part of
+# every unique key and there are no foreign keys; shards hold no users or items anyway.
+ORDER_HEADERS_TABLE = """
+    CREATE TABLE IF NOT EXISTS order_headers (
+        order_id INT AUTO_INCREMENT,
+        user_id INT NOT NULL,
+        address_id INT NOT NULL,
+        order_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        ingest_key CHAR(32) DEFAULT NULL,
+        PRIMARY KEY (order_id, order_timestamp),
+        UNIQUE KEY uq_order_headers_ingest_key (ingest_key, order_timestamp),
+        INDEX idx_order_headers_user_ts (user_id, order_timestamp)
+    )
+"""
+
+# One row per cart line; lines carry their header's timestamp so both tables partition alike,
+# and the item's price and category as they were when the order was placed
+ORDER_ITEMS_TABLE = """
+    CREATE TABLE IF NOT EXISTS order_items (
+        line_id INT AUTO_INCREMENT,
+        order_id INT NOT NULL,
+        item_id INT NOT NULL,
+        quantity INT NOT NULL,
+        unit_price DECIMAL(10,2) DEFAULT NULL,
+        category VARCHAR(50) DEFAULT NULL,
+        order_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (line_id, order_timestamp),
+        INDEX idx_order_items_order (order_id),
+        INDEX idx_order_items_item (item_id)
+    )
+"""
+
+# Each distinct delivery address is stored once per order database, keyed by the hash of its
+# normalized text, so orders can join it without leaving their shard
+ADDRESSES_TABLE = """
+    CREATE TABLE IF NOT EXISTS addresses (
+        address_id INT AUTO_INCREMENT PRIMARY KEY,
+        address_hash CHAR(64) NOT NULL,
+        address TEXT NOT NULL,
+        UNIQUE KEY uq_addresses_hash (address_hash)
+    )
+"""
+
+# Address book: the addresses each user has ordered to
+USER_ADDRESSES_TABLE = """
+    CREATE TABLE IF NOT EXISTS user_addresses (
+        user_id INT NOT NULL,
+        address_id INT NOT NULL,
+        last_used TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        use_count INT NOT NULL DEFAULT 1,
+        PRIMARY KEY (user_id, address_id),
+        INDEX idx_user_addresses_recent (user_id, last_used)
+    )
+"""
+
+# One row, bumped in the transaction of every menu write, so every host sees the same menu version
+MENU_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS menu_version (
+        id TINYINT PRIMARY KEY,
+        version BIGINT UNSIGNED NOT NULL
+    )
+"""
+MENU_VERSION_ROW = "INSERT IGNORE INTO menu_version (id, version) VALUES (1, 1)"
+
+# Legacy orders are copied a month at a time, each month in one transaction, so every monthly
+# partition of the unindexed legacy table is read once
+BACKFILL_BATCH_SIZE = 1000
+
+# Lines missing their price snapshot are filled this many per statement, each batch committed
+SNAPSHOT_BATCH_SIZE = 10000
+
+# Order headers moved from inline address text to address ids this many per transaction
+ADDRESS_BATCH_SIZE = 5000
+
+def _table_exists(cursor, schema, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+    """, (schema, table))
+    return cursor.fetchone()[0] > 0
+
+def address_ids(connection, addresses):
+    """Map addresses to ids in the connection's addresses table, inserting missing ones"""
+    hashes = {address: Address.address_hash(address) for address in set(addresses)}
+    cursor = connection.cursor()
+    try:
+        cursor.executemany("INSERT IGNORE INTO addresses (address_hash, address) VALUES (%s, %s)",
+                           [(address_hash, address) for address, address_hash in hashes.items()])
+        ids = {}
+        unique = list(set(hashes.values()))
+        for start in range(0, len(unique), ADDRESS_BATCH_SIZE):
+            chunk = unique[start:start + ADDRESS_BATCH_SIZE]
+            cursor.execute(f"""
+                SELECT address_hash, address_id FROM addresses
+                WHERE address_hash IN ({', '.join(['%s'] * len(chunk))})
+            """, chunk)
+            ids.update(cursor.fetchall())
+        return {address: ids[address_hash] for address, address_hash in hashes.items()}
+    finally:
+        cursor.close()
+
+def rebuild_address_book(connection):
+    """Recount every user's saved addresses from their orders"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO user_addresses (user_id, address_id, last_used, use_count)
+            SELECT * FROM (
+                SELECT user_id, address_id, MAX(order_timestamp) AS last_used, COUNT(*) AS use_count
+                FROM order_headers
+                GROUP BY user_id, address_id
+            ) AS uses
+            ON DUPLICATE KEY UPDATE last_used = VALUES(last_used), use_count = VALUES(use_count)
+        """)
+        connection.commit()
+    finally:
+        cursor.close()
+
+def migrate_addresses(connection, schema):
+    """Replace the delivery address text on order headers with a reference to the addresses table.
+
+    Headers are converted in keyset-ordered batches, each in one transaction,
+    and a re-run skips headers that already have an address id. The text
+    column is dropped and the address book built once all are converted.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(ADDRESSES_TABLE)
+        cursor.execute(USER_ADDRESSES_TABLE)
+        
+        cursor.execute("DESCRIBE order_headers")
+        header_columns = [column[0] for column in cursor.fetchall()]
+        if 'delivery_address' not in header_columns:
+            return
+        if 'address_id' not in header_columns:
+            logger.info(f"Adding address_id column to order_headers in {schema}...")
+            cursor.execute("ALTER TABLE order_headers ADD COLUMN address_id INT DEFAULT NULL AFTER user_id")
+        
+        converted = 0
+        last_order_id = 0
+        while True:
+            cursor.execute("""
+                SELECT order_id, order_timestamp, delivery_address FROM order_headers
+                WHERE order_id > %s AND address_id IS NULL
+                ORDER BY order_id
+                LIMIT %s
+            """, (last_order_id, ADDRESS_BATCH_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            ids = address_ids(connection, [address for _, _, address in rows])
+            cursor.executemany(
+                "UPDATE order_headers SET address_id = %s WHERE order_id = %s AND order_timestamp = %s",
+                [(ids[address], order_id, order_timestamp) for order_id, order_timestamp, address in rows])
+            connection.commit()
+            converted += len(rows)
+            last_order_id = rows[-1][0]
+        
+        rebuild_address_book(connection)
+        cursor.execute("ALTER TABLE order_headers MODIFY address_id INT NOT NULL, DROP COLUMN delivery_address")
+        connection.commit()
+        
+        cursor.execute("SELECT COUNT(*) FROM addresses")
+        logger.info(f"Moved {converted} order address(es) in {schema} onto {cursor.fetchone()[0]} distinct address row(s)")
+    finally:
+        cursor.close()
+
+def _legacy_cart_key(row):
+    """Header ingest key of a legacy cart, so a re-run backfill skips carts it already copied"""
+    value = f"legacy/{row['user_id']}/{row['order_timestamp']}/{row['delivery_address']}"
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+def _header_ids(cursor, keys, start, end):
+    """Map ingest keys of headers placed in [start, end) to their order ids, through the ingest key index"""
+    order_ids = {}
+    for offset in range(0, len(keys), BACKFILL_BATCH_SIZE):
+        chunk = keys[offset:offset + BACKFILL_BATCH_SIZE]
+        cursor.execute(f"""
+            SELECT ingest_key, order_id FROM order_headers
+            WHERE ingest_key IN ({', '.join(['%s'] * len(chunk))})
+              AND order_timestamp >= %s AND order_timestamp < %s
+        """, chunk + [start, end])
+        order_ids.update((row['ingest_key'], row['order_id']) for row in cursor.fetchall())
+    return order_ids
+
+def _backfill_chunk(connection, start, end):
+    """Copy legacy order rows placed in [start, end) into order headers and lines.
+
+    Rows of one user with the same timestamp and address were placed as one
+    cart and become one header. Returns the number of lines copied.
+    """
+    cursor = connection.cursor(dictionary=True)
+    try:
+        # A month-aligned range is pruned to one partition, read once
+        cursor.execute("""
+            SELECT user_id, item_id, quantity, delivery_address, order_timestamp
+            FROM orders
+            WHERE order_timestamp >= %s AND order_timestamp < %s
+            ORDER BY order_id
+        """, (start, end))
+        carts = {}
+        for row in cursor.fetchall():
+            cart = carts.setdefault(_legacy_cart_key(row), {'row': row, 'lines': []})
+            cart['lines'].append((row['item_id'], row['quantity']))
+        
+        copied = _header_ids(cursor, list(carts), start, end)
+        carts = {key: cart for key, cart in carts.items() if key not in copied}
+        if not carts:
+            return 0
+        
+        addresses = address_ids(connection, [cart['row']['delivery_address'] for cart in carts.values()])
+        headers = [(cart['row']['user_id'], addresses[cart['row']['delivery_address']], cart['row']['order_timestamp'], key)
+                   for key, cart in carts.items()]
+        for offset in range(0, len(headers), BACKFILL_BATCH_SIZE):
+            cursor.executemany("""
+                INSERT INTO order_headers (user_id, address_id, order_timestamp, ingest_key)
+                VALUES (%s, %s, %s, %s)
+            """, headers[offset:offset + BACKFILL_BATCH_SIZE])
+        
+        order_ids = _header_ids(cursor, list(carts), start, end)
+        lines = [(order_ids[key], item_id, quantity, cart['row']['order_timestamp'])
+                 for key, cart in carts.items() for item_id, quantity in cart['lines']]
+        for offset in range(0, len(lines), BACKFILL_BATCH_SIZE):
+            cursor.executemany("""
+                INSERT INTO order_items (order_id, item_id, quantity, order_timestamp)
+                VALUES (%s, %s, %s, %s)
+            """, lines[offset:offset + BACKFILL_BATCH_SIZE])
+        connection.commit()
+        return len(lines)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def backfill_order_lines(connection, schema):
+    """Move rows of the legacy one-row-per-line orders table into order headers and lines.
+
+    Safe to re-run after an interruption. Once every row is copied the
+    legacy table is renamed to orders_legacy; drop it when no longer needed.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT MIN(order_timestamp), MAX(order_timestamp), COUNT(*) FROM orders")
+        oldest, newest, legacy_rows = cursor.fetchone()
+        
+        if oldest is not None:
+            # Months match the legacy table's partitions
+            start = month_start(oldest)
+            copied = 0
+            while start <= newest:
+                copied += _backfill_chunk(connection, start, add_months(start, 1))
+                start = add_months(start, 1)
+            logger.info(f"Copied {copied} legacy order row(s) in {schema} into order headers and lines")
+        
+        cursor.execute("SELECT COUNT(*) FROM order_items WHERE order_timestamp <= %s", (newest or datetime.now(),))
+        lines = cursor.fetchone()[0]
+        if lines < legacy_rows:
+            raise RuntimeError(f"Backfill of {schema} copied {lines} of {legacy_rows} legacy order rows, "
+                               "check for orders without a timestamp")
+        
+        cursor.execute("RENAME TABLE orders TO orders_legacy")
+        connection.commit()
+        rebuild_address_book(connection)
+        logger.info(f"Legacy orders table in {schema} renamed to orders_legacy")
+    finally:
+        cursor.close()
+
+def backfill_line_snapshots(connection, schema, items):
+    """Fill unit_price and category of order lines placed before lines carried them.
+
+    items is a list of (item_id, price, category) rows from the catalog, which
+    shard databases do not hold. Old lines get the item's current price, the
+    best record there is of what was charged. Lines of deleted items stay NULL
+    and are left out of revenue. Safe to re-run after an interruption.
+    """
+    cursor = connection.cursor()
+    try:
+        filled = 0
+        for item_id, price, category in items:
+            while True:
+                cursor.execute("""
+                    UPDATE order_items SET unit_price = %s, category = %s
+                    WHERE item_id = %s AND unit_price IS NULL
+                    LIMIT %s
+                """, (price if price is not None else 0, category, item_id, SNAPSHOT_BATCH_SIZE))
+                connection.commit()
+                filled += cursor.rowcount
+                if cursor.rowcount < SNAPSHOT_BATCH_SIZE:
+                    break
+        if filled:
+            logger.info(f"Stored price and category on {filled} order line(s) in {schema}")
+    finally:
+        cursor.close()
+
+def migrate_order_tables(connection, schema, items):
+    """Create the partitioned order header and line tables, backfilling them from a legacy orders table"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(ORDER_HEADERS_TABLE)
+        cursor.execute(ORDER_ITEMS_TABLE)
+        
+        # Header tables created before addresses were stored once and referenced by id
+        migrate_addresses(connection, schema)
+        
+        # Line tables created before lines snapshotted their item's price and category
+        cursor.execute("DESCRIBE order_items")
+        line_columns = [column[0] for column in cursor.fetchall()]
+        if 'unit_price' not in line_columns:
+            logger.info(f"Adding unit_price and category columns to order_items in {schema}...")
+            cursor.execute("""
+                ALTER TABLE order_items
+                ADD COLUMN unit_price DECIMAL(10,2) DEFAULT NULL AFTER quantity,
+                ADD COLUMN category VARCHAR(50) DEFAULT NULL AFTER unit_price
+            """)
+        
+        legacy = _table_exists(cursor, schema, 'orders')
+        oldest = None
+        if legacy:
+            cursor.execute("SELECT MIN(order_timestamp) FROM orders")
+            oldest = cursor.fetchone()[0]
+        
+        # Partition by month so old months can be archived
+        for table in ORDER_TABLES:
+            if partition_table(cursor, schema, table, Config.ORDER_PARTITIONS_AHEAD, oldest):
+                logger.info(f"{table} table in {schema} partitioned by month")
+        connection.commit()
+    finally:
+        cursor.close()
+    
+    if legacy:
+        backfill_order_lines(connection, schema)
+    backfill_line_snapshots(connection, schema, items)
+
+def migrate_order_shards(items):
+    """Create the databases and order tables listed in ORDER_SHARDS"""
+    if not db_manager.sharded:
+        return
+    
+    for orders_db in db_manager.order_databases():
+        params = orders_db.connect_params()
+        schema = params.pop('database')
+        connection = mysql.connector.connect(**params)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {schema}")
+            cursor.execute(f"USE {schema}")
+            migrate_order_tables(connection, schema, items)
+        finally:
+            cursor.close()
+            connection.close()
+    logger.info("Order shards ready, run rebalance_orders.py to move existing orders onto them")
+
 def migrate_database():
     """Migrate database to fix schema issues"""
     try:
@@ -29,20 +388,41 @@ def migrate_database():
             logger.info("Adding image_url column to items table...")
             cursor.execute("ALTER TABLE items ADD COLUMN image_url VARCHAR(500) DEFAULT NULL")
         
-        # Check if orders table has order_timestamp column
-        cursor.execute("DESCRIBE orders")
-        order_columns = [column[0] for column in cursor.fetchall()]
+        if 'image_key' not in columns:
+            logger.info("Adding image_key column to items table...")
+            cursor.execute("ALTER TABLE items ADD COLUMN image_key CHAR(64) DEFAULT NULL")
         
-        if 'order_timestamp' not in order_columns:
-            logger.info("Adding order_timestamp column to orders table...")
-            cursor.execute("ALTER TABLE orders ADD COLUMN order_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+        # Legacy orders tables may predate order timestamps, which the backfill groups carts by
+        if _table_exists(cursor, Config.DB_NAME, 'orders'):
+            cursor.execute("DESCRIBE orders")
+            order_columns = [column[0] for column in cursor.fetchall()]
+            
+            if 'order_timestamp' not in order_columns:
+                logger.info("Adding order_timestamp column to orders table...")
+                cursor.execute("ALTER TABLE orders ADD COLUMN order_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
         
         # Update existing items with category if they don't have one
         cursor.execute("UPDATE items SET category = 'Main Course' WHERE category IS NULL")
         
+        # Menu version shared by every host, replacing the per-host stamp file
+        cursor.execute(MENU_VERSION_TABLE)
+        cursor.execute(MENU_VERSION_ROW)
         connection.commit()
-        logger.info("Database migration completed successfully!")
         
+        # Order lines snapshot the price and category of their item from the catalog
+        cursor.execute("SELECT item_id, price, category FROM items")
+        items = cursor.fetchall()
+        
+        # Carts are stored as one order header plus its lines
+        migrate_order_tables(connection, Config.DB_NAME, items)
+        
+        # Order tables of the shard databases, when sharding is configured
+        migrate_order_shards(items)
+        
+        # Archived lines get the same snapshot
+        order_archive.add_line_snapshots(items)
+        logger.info("Database migration completed successfully!")
+    
     except Exception as e:
         logger.error(f"Database migration failed: {e}")
         raise
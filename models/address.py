@@ -0,0 +1,116 @@
+from config import Config
+from models.database import db_manager
+from services.lru import LRUCache
+import hashlib
+import re
+
+# (order database, address hash) -> address id; ids never change once assigned, so entries never go stale
+address_cache = LRUCache(Config.ADDRESS_CACHE_SIZE)
+
+class Address:
+    def __init__(self, address_id=None, address=None, last_used=None, use_count=None):
+        self.address_id = address_id
+        self.address = address
+        self.last_used = last_used
+        self.use_count = use_count
+    
+    def to_dict(self):
+        """JSON-ready representation of a saved address"""
+        return {
+            'address_id': self.address_id,
+            'address': self.address,
+            'last_used': self.last_used,
+            'use_count': self.use_count
+        }
+    
+    @staticmethod
+    def normalize(address):
+        """Form of an address compared for deduplication: case, spacing and trailing punctuation are ignored"""
+        return re.sub(r'\s+', ' ', address).strip(' ,.').casefold()
+    
+    @staticmethod
+    def address_hash(address):
+        """SHA-256 hex digest of the normalized address, the unique key of the addresses table"""
+        return hashlib.sha256(Address.normalize(address).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _database_key(orders_db):
+        """Addresses are stored per order database, so their ids are too"""
+        params = orders_db.connect_params()
+        return params['host'], params['database']
+    
+    @staticmethod
+    def _lookup(orders_db, hashes):
+        """Get {address_hash: address_id} for the hashes already stored"""
+        placeholders = ', '.join(['%s'] * len(hashes))
+        rows = orders_db.execute_query(
+            f"SELECT address_id, address_hash FROM addresses WHERE address_hash IN ({placeholders})",
+            tuple(hashes), fetch=True)
+        return {row['address_hash']: row['address_id'] for row in rows}
+    
+    @staticmethod
+    def get_ids(orders_db, addresses):
+        """Map addresses to their ids in an order database, storing new ones.
+
+        Ids come from the process-wide LRU cache when possible, then from one
+        lookup by hash; only addresses never seen before are inserted. Call
+        outside the order's transaction, so an address id is only cached once
+        its row is committed.
+        """
+        database = Address._database_key(orders_db)
+        hashes = {address: Address.address_hash(address) for address in set(addresses)}
+        found = {}
+        missing = {}
+        for address, address_hash in hashes.items():
+            address_id = address_cache.get((database, address_hash))
+            if address_id is None:
+                missing[address_hash] = address
+            else:
+                found[address_hash] = address_id
+        
+        if missing:
+            stored = Address._lookup(orders_db, list(missing))
+            new = [(address_hash, address) for address_hash, address in missing.items() if address_hash not in stored]
+            if new:
+                # A concurrent insert of the same address is ignored, the lookup then finds its row
+                orders_db.executemany("INSERT IGNORE INTO addresses (address_hash, address) VALUES (%s, %s)", new)
+                stored.update(Address._lookup(orders_db, [address_hash for address_hash, _ in new]))
+            for address_hash, address_id in stored.items():
+                address_cache.set((database, address_hash), address_id)
+            found.update(stored)
+        return {address: found[address_hash] for address, address_hash in hashes.items()}
+    
+    @staticmethod
+    def get_id(orders_db, address):
+        """Id of one address in an order database, storing it if new"""
+        return Address.get_ids(orders_db, [address])[address]
+    
+    @staticmethod
+    def remember(transaction, uses):
+        """Record (user_id, address_id, used_at) uses in the users' address books"""
+        transaction.executemany("""
+            INSERT INTO user_addresses (user_id, address_id, last_used, use_count)
+            VALUES (%s, %s, %s, 1)
+            ON DUPLICATE KEY UPDATE last_used = GREATEST(last_used, VALUES(last_used)), use_count = use_count + 1
+        """, uses)
+    
+    @staticmethod
+    def get_user_addresses(user_id, limit=None):
+        """Get a user's saved addresses, most recently used first"""
+        query = """
+            SELECT a.address_id, a.address, ua.last_used, ua.use_count
+            FROM user_addresses ua
+            JOIN addresses a ON a.address_id = ua.address_id
+            WHERE ua.user_id = %s
+            ORDER BY ua.last_used DESC
+            LIMIT %s
+        """
+        rows = db_manager.for_user(user_id).execute_query(
+            query, (user_id, int(limit or Config.ADDRESS_BOOK_SIZE)), fetch=True, prepared=True)
+        return [Address(**row) for row in rows]
+    
+    @staticmethod
+    def forget(user_id, address_id):
+        """Remove an address from a user's address book; orders placed with it keep it"""
+        query = "DELETE FROM user_addresses WHERE user_id = %s AND address_id = %s"
+        return db_manager.for_user(user_id).execute_query(query, (user_id, address_id)) > 0
@@ -0,0 +1,256 @@
+from config import Config
+from datetime import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Columns stored for every archived order line, in file order
+ARCHIVE_COLUMNS = ('order_id', 'user_id', 'item_id', 'quantity', 'unit_price', 'category',
+                   'delivery_address', 'order_timestamp')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def database_label(orders_db):
+    """Name that tells one order database's archived partitions apart from another's"""
+    params = orders_db.connect_params()
+    return re.sub(r'\W', '_', f"{params['host']}_{params['database']}")
+
+class OrderArchive:
+    """Cold storage for order partitions that have aged past the retention horizon.
+
+    Each archived partition is one gzip-compressed columnar file (a JSON object
+    mapping column name to a list of values) plus an entry in manifest.json.
+    Rows are order lines joined with their order header, so the lines of one
+    order share its order_id, user, address and timestamp.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifest_mtime = None
+        self._columns_cache = {}
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _write_atomic(self, path, data):
+        """Write bytes to path via a temporary file and rename"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def get_manifest(self):
+        """Load the archive manifest, reloading it when the file changes"""
+        path = self._manifest_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {'partitions': {}}
+
+        with self._lock:
+            if self._manifest is None or self._manifest_mtime != mtime:
+                with open(path, 'r') as f:
+                    self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+            return self._manifest
+
+    @staticmethod
+    def _database(name, entry):
+        """Label of the order database a partition was archived from, None before sharding"""
+        if 'database' in entry:
+            return entry['database']
+        # Older entries only carry it as the suffix of the name, e.g. p202501_host_db
+        return name.partition('_')[2] or None
+
+    def horizon(self, database=None):
+        """Return the earliest timestamp still held in MySQL, or None if nothing is archived.
+
+        Shards are archived one at a time, so with a database label only that
+        database's partitions count: a month archived from one shard may still
+        be live on another whose archival failed.
+        """
+        ends = [datetime.strptime(entry['end'], TIMESTAMP_FORMAT)
+                for name, entry in self.get_manifest()['partitions'].items()
+                if database is None or self._database(name, entry) == database]
+        return max(ends) if ends else None
+
+    def write_partition(self, name, start, end, rows, database=None):
+        """Store the rows of one partition, archived from the labelled order database, as a compressed columnar file"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        columns = {column: [] for column in ARCHIVE_COLUMNS}
+        for row in rows:
+            for column in ARCHIVE_COLUMNS:
+                value = row[column]
+                if column == 'order_timestamp' and value is not None:
+                    value = value.strftime(TIMESTAMP_FORMAT)
+                elif column == 'unit_price' and value is not None:
+                    value = float(value)
+                columns[column].append(value)
+
+        filename = f"orders_{name}.json.gz"
+        payload = gzip.compress(json.dumps(columns, separators=(',', ':')).encode('utf-8'))
+        self._write_atomic(os.path.join(self.directory, filename), payload)
+
+        manifest = dict(self.get_manifest())
+        partitions = dict(manifest.get('partitions', {}))
+        partitions[name] = {
+            'file': filename,
+            'start': start.strftime(TIMESTAMP_FORMAT),
+            'end': end.strftime(TIMESTAMP_FORMAT),
+            'rows': len(columns['order_id']),
+            'orders': len(set(columns['order_id']))
+        }
+        if database:
+            partitions[name]['database'] = database
+        manifest['partitions'] = partitions
+        self._write_atomic(self._manifest_path(), json.dumps(manifest, indent=2).encode('utf-8'))
+        logger.info(f"Archived partition {name} ({partitions[name]['rows']} rows)")
+        return partitions[name]
+
+    def _load_columns(self, name, entry):
+        """Read and cache the columns of one archived partition"""
+        path = os.path.join(self.directory, entry['file'])
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._columns_cache.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with gzip.open(path, 'rb') as f:
+            columns = json.loads(f.read().decode('utf-8'))
+        # Files written before lines carried a price snapshot lack those columns
+        for column in ARCHIVE_COLUMNS:
+            columns.setdefault(column, [None] * len(columns['order_id']))
+        columns['order_timestamp'] = [
+            datetime.strptime(value, TIMESTAMP_FORMAT) if value else None
+            for value in columns['order_timestamp']
+        ]
+        self._columns_cache[name] = (mtime, columns)
+        return columns
+
+    def _partitions_since(self, since=None):
+        """Yield (name, entry) for archived partitions that overlap [since, horizon), newest first"""
+        partitions = self.get_manifest()['partitions']
+        for name in sorted(partitions, reverse=True):
+            entry = partitions[name]
+            if since and datetime.strptime(entry['end'], TIMESTAMP_FORMAT) <= since:
+                continue
+            yield name, entry
+
+    def iter_rows(self, user_id=None, since=None):
+        """Yield archived order rows as dicts, newest first"""
+        for name, entry in self._partitions_since(since):
+            columns = self._load_columns(name, entry)
+            matches = []
+            for index, timestamp in enumerate(columns['order_timestamp']):
+                if user_id is not None and columns['user_id'][index] != user_id:
+                    continue
+                if since and timestamp and timestamp < since:
+                    continue
+                matches.append({column: columns[column][index] for column in ARCHIVE_COLUMNS})
+            matches.sort(key=lambda row: row['order_timestamp'] or datetime.min, reverse=True)
+            yield from matches
+
+    def partitions_between(self, start, end):
+        """Return [(name, entry)] for archived partitions that overlap [start, end), oldest first"""
+        return [(name, entry) for name, entry in sorted(self.get_manifest()['partitions'].items())
+                if datetime.strptime(entry['start'], TIMESTAMP_FORMAT) < end
+                and datetime.strptime(entry['end'], TIMESTAMP_FORMAT) > start]
+
+    def iter_partition(self, name, columns, start=None, end=None):
+        """Yield tuples of the given columns for one partition's lines placed in [start, end)"""
+        data = self._load_columns(name, self.get_manifest()['partitions'][name])
+        timestamps = data['order_timestamp']
+        selected = [data[column] for column in columns]
+        for index, row in enumerate(zip(*selected)):
+            timestamp = timestamps[index]
+            if timestamp is None or (start and timestamp < start) or (end and timestamp >= end):
+                continue
+            yield row
+
+    def count(self, since=None):
+        """Count archived orders"""
+        if since is None:
+            # Partitions archived before orders had lines hold one order per row
+            return sum(entry.get('orders', entry['rows']) for entry in self.get_manifest()['partitions'].values())
+        return sum(self.daily_counts(since).values())
+
+    def _line_totals(self, key_column):
+        """Return {key: [total_quantity, order_count, revenue]} over the whole archive"""
+        totals = {}
+        for name, entry in self._partitions_since():
+            columns = self._load_columns(name, entry)
+            # Order ids are unique within one partition file
+            seen = set()
+            for key, order_id, quantity, unit_price in zip(columns[key_column], columns['order_id'],
+                                                           columns['quantity'], columns['unit_price']):
+                total = totals.setdefault(key, [0, 0, 0.0])
+                total[0] += quantity
+                if (key, order_id) not in seen:
+                    seen.add((key, order_id))
+                    total[1] += 1
+                if unit_price is not None:
+                    total[2] += quantity * unit_price
+        return totals
+
+    def item_totals(self):
+        """Return {item_id: [total_quantity, order_count, revenue]} over the whole archive"""
+        return self._line_totals('item_id')
+
+    def category_totals(self):
+        """Return {category: [total_quantity, order_count, revenue]} by the category snapshotted on each line"""
+        return self._line_totals('category')
+
+    def daily_totals(self, since=None):
+        """Return {date: [order_count, revenue]} for archived orders placed on or after since"""
+        totals = {}
+        for name, entry in self._partitions_since(since):
+            columns = self._load_columns(name, entry)
+            seen = set()
+            for order_id, timestamp, quantity, unit_price in zip(columns['order_id'], columns['order_timestamp'],
+                                                                 columns['quantity'], columns['unit_price']):
+                if timestamp is None or (since and timestamp < since):
+                    continue
+                total = totals.setdefault(timestamp.date(), [0, 0.0])
+                if order_id not in seen:
+                    seen.add(order_id)
+                    total[0] += 1
+                if unit_price is not None:
+                    total[1] += quantity * unit_price
+        return totals
+
+    def daily_counts(self, since=None):
+        """Return {date: order_count} for archived orders placed on or after since"""
+        return {day: order_count for day, (order_count, _) in self.daily_totals(since).items()}
+
+    def add_line_snapshots(self, items):
+        """Fill missing unit_price and category of archived lines from (item_id, price, category) rows"""
+        items = {item_id: (price, category) for item_id, price, category in items}
+        for name, entry in self._partitions_since():
+            columns = self._load_columns(name, entry)
+            missing = [index for index, unit_price in enumerate(columns['unit_price'])
+                       if unit_price is None and columns['item_id'][index] in items]
+            if not missing:
+                continue
+
+            columns = {column: list(values) for column, values in columns.items()}
+            for index in missing:
+                price, category = items[columns['item_id'][index]]
+                columns['unit_price'][index] = float(price) if price is not None else 0.0
+                columns['category'][index] = category
+            columns['order_timestamp'] = [value.strftime(TIMESTAMP_FORMAT) if value else None
+                                          for value in columns['order_timestamp']]
+            payload = gzip.compress(json.dumps(columns, separators=(',', ':')).encode('utf-8'))
+            self._write_atomic(os.path.join(self.directory, entry['file']), payload)
+            logger.info(f"Stored price and category on {len(missing)} archived line(s) of {name}")
+
+# Global order archive instance
+order_archive = OrderArchive(Config.ORDER_ARCHIVE_DIR)
@@ -1,59 +1,312 @@
-import mysql.connector
-from mysql.connector import pooling
 from config import Config
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from models.shards import ShardRouter, parse_shards
+import contextlib
+import contextvars
 import logging
+import os
+import threading
+import weakref
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Mutable [count] set per request by instrumentation; execute_query increments it
+query_counter = contextvars.ContextVar('query_counter', default=None)
+
+# Transaction opened by DatabaseManager.transaction() in the current thread/context
+_active_transaction = contextvars.ContextVar('active_transaction', default=None)
+
+def _count_query():
+    counter = query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+class Transaction:
+    """Statements run on one pooled connection and committed together"""
+    
+    def __init__(self, manager, connection):
+        self.manager = manager
+        self.connection = connection
+        self.lastrowid = None
+    
+    def execute(self, query, params=None, fetch=False, prepared=False):
+        """Execute a statement in the transaction; returns rows if fetch=True, else the rowcount"""
+        result, self.lastrowid = self.manager._run(self.connection, query, params, fetch, prepared)
+        return result
+    
+    def executemany(self, query, seq_params):
+        """Execute a statement once per parameter tuple; INSERTs are sent as one multi-row statement"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.executemany(query, seq_params)
+            _count_query()
+            self.lastrowid = cursor.lastrowid
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+class StatementCache:
+    """Prepared-statement cursors of one connection, least recently used evicted first"""
+    
+    def __init__(self, max_statements):
+        self.max_statements = max_statements
+        self.cursors = OrderedDict()
+    
+    def get(self, connection, query):
+        """Return (cursor, query) where query is the exact string object the cursor was prepared with.
+
+        mysql-connector only skips re-preparing when it is handed the
+        identical string object, so callers must execute the returned one.
+        """
+        entry = self.cursors.get(query)
+        if entry is not None:
+            self.cursors.move_to_end(query)
+            return entry
+        entry = (connection.cursor(prepared=True, dictionary=True), query)
+        self.cursors[query] = entry
+        while len(self.cursors) > self.max_statements:
+            _, (evicted, _) = self.cursors.popitem(last=False)
+            evicted.close()
+        return entry
+    
+    def close(self):
+        for cursor, _ in self.cursors.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.cursors.clear()
+
+# Settings a shard inherits from the primary database configuration
+SHARD_INHERITED_SETTINGS = ('DB_USER', 'DB_PASSWORD', 'DB_PORT', 'DB_POOL_SIZE',
+                            'DB_PREPARED_STATEMENTS', 'DB_PREPARED_CACHE_SIZE')
+
 class DatabaseManager:
-    def __init__(self):
+    """Owns the MySQL connection pool for the current process.
+
+    The pool is created on first use rather than at import, and re-created
+    when the PID changes, so a pre-forking server never shares sockets opened
+    in the master between its children.
+
+    When ORDER_SHARDS is configured, orders live in several databases and
+    for_user() routes a user's order queries to the shard owning that user;
+    scatter() runs a query function against every shard in parallel.
+    """
+    
+    def __init__(self, config=None, name='zomato'):
+        self.config = config or Config
+        self.name = name
+        self.pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._statement_caches = weakref.WeakKeyDictionary()
+        self._shards = None
+        self._router = None
+        self._executor = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _reset_after_fork(self):
+        """Drop the parent's pool and lock in a freshly forked child"""
         self.pool = None
-        self._create_pool()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._statement_caches = weakref.WeakKeyDictionary()
+        # Executor threads do not survive a fork
+        self._executor = None
+    
+    def _setting(self, name, default=None):
+        if isinstance(self.config, dict):
+            return self.config.get(name, default)
+        return getattr(self.config, name, default)
+    
+    def init_app(self, app):
+        """Use the app's configuration for future connections"""
+        self.config = app.config
+        self.pool = None
+        self._pid = None
+        self._shards = None
+        self._router = None
+    
+    def connect_params(self):
+        """Arguments for mysql.connector.connect() to this manager's database"""
+        return {
+            'host': self._setting('DB_HOST'),
+            'port': self._setting('DB_PORT') or 3306,
+            'user': self._setting('DB_USER'),
+            'password': self._setting('DB_PASSWORD'),
+            'database': self._setting('DB_NAME')
+        }
     
     def _create_pool(self):
         """Create connection pool for database"""
+        # Imported here so that importing the models stays cheap for tooling
+        import mysql.connector.pooling
         try:
             pool_config = {
-                'host': Config.DB_HOST,
-                'user': Config.DB_USER,
-                'password': Config.DB_PASSWORD,
-                'database': Config.DB_NAME,
-                'pool_name': 'zomato_pool',
-                'pool_size': 5,
+                **self.connect_params(),
+                'pool_name': f"{self.name}_pool_{os.getpid()}",
+                'pool_size': self._setting('DB_POOL_SIZE', 5),
+                # Resetting the session on checkout would deallocate cached prepared statements
+                'pool_reset_session': not self._prepared_enabled(),
                 'autocommit': False
             }
             self.pool = mysql.connector.pooling.MySQLConnectionPool(**pool_config)
-            logger.info("Database connection pool created successfully")
+            logger.info(f"Database connection pool created successfully (pid {os.getpid()})")
         except Exception as e:
             logger.error(f"Failed to create database pool: {e}")
             raise
     
+    def get_pool(self):
+        """Get this process's pool, creating it on first use or after a fork"""
+        pid = os.getpid()
+        if self.pool is None or self._pid != pid:
+            with self._lock:
+                if self.pool is None or self._pid != pid:
+                    # Connections inherited from the parent are abandoned, never closed,
+                    # so the parent's sessions are left untouched
+                    self.pool = None
+                    self._create_pool()
+                    self._pid = pid
+        return self.pool
+    
     def get_connection(self):
         """Get a connection from the pool"""
         try:
-            return self.pool.get_connection()
+            return self.get_pool().get_connection()
         except Exception as e:
             logger.error(f"Failed to get database connection: {e}")
             raise
     
-    def execute_query(self, query, params=None, fetch=False):
-        """Execute a query and return results if fetch=True"""
+    def close_pool(self):
+        """Close this process's idle pooled connections; the next query opens a new pool"""
+        with self._lock:
+            if self.pool is not None and self._pid == os.getpid():
+                self.pool._remove_connections()
+            self.pool = None
+            self._pid = None
+            self._statement_caches = weakref.WeakKeyDictionary()
+    
+    # Order sharding
+    
+    def _load_shards(self):
+        """Build one DatabaseManager per ORDER_SHARDS entry and the ring routing to them"""
+        shards = {}
+        for index, shard in enumerate(parse_shards(self._setting('ORDER_SHARDS'))):
+            config = {key: self._setting(key) for key in SHARD_INHERITED_SETTINGS}
+            config['DB_HOST'] = shard['host'] or self._setting('DB_HOST')
+            config['DB_PORT'] = shard['port'] or self._setting('DB_PORT')
+            config['DB_NAME'] = shard['database']
+            shards[shard['name']] = DatabaseManager(config, name=f"{self.name}_shard{index}")
+        router = ShardRouter(list(shards), self._setting('ORDER_SHARD_VNODES', 160)) if shards else None
+        return shards, router
+    
+    def _get_shards(self):
+        if self._shards is None:
+            with self._lock:
+                if self._shards is None:
+                    self._shards, self._router = self._load_shards()
+        return self._shards
+    
+    @property
+    def sharded(self):
+        """True when orders are spread over ORDER_SHARDS instead of living in this database"""
+        return bool(self._get_shards())
+    
+    def for_user(self, user_id):
+        """Database holding a user's orders"""
+        shards = self._get_shards()
+        if not shards:
+            return self
+        return shards[self._router.shard_for(user_id)]
+    
+    def order_databases(self):
+        """Every database holding orders"""
+        return list(self._get_shards().values()) or [self]
+    
+    def scatter(self, fn):
+        """Call fn(database) for every order database in parallel; returns the results in shard order"""
+        databases = self.order_databases()
+        if len(databases) == 1:
+            return [fn(databases[0])]
+        
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=len(databases),
+                                                        thread_name_prefix=f"{self.name}-scatter")
+        # Run each call in a copy of the caller's context so query counting keeps working
+        futures = [self._executor.submit(contextvars.copy_context().run, fn, database)
+                   for database in databases]
+        return [future.result() for future in futures]
+    
+    def _prepared_enabled(self):
+        return bool(self._setting('DB_PREPARED_STATEMENTS', False))
+    
+    def _statement_cache(self, connection):
+        # Pooled connections are wrappers handed out anew on each checkout; cache on the real one
+        raw = getattr(connection, '_cnx', connection)
+        with self._lock:
+            cache = self._statement_caches.get(raw)
+            if cache is None:
+                cache = StatementCache(self._setting('DB_PREPARED_CACHE_SIZE', 32))
+                self._statement_caches[raw] = cache
+        return cache
+    
+    def _discard_statements(self, connection):
+        raw = getattr(connection, '_cnx', connection)
+        with self._lock:
+            cache = self._statement_caches.pop(raw, None)
+        if cache is not None:
+            cache.close()
+    
+    def _run(self, connection, query, params, fetch, prepared):
+        """Execute one statement on a connection; returns (rows or rowcount, lastrowid)"""
+        if prepared and self._prepared_enabled():
+            cursor, query = self._statement_cache(connection).get(connection, query)
+            try:
+                cursor.execute(query, tuple(params or ()))
+                _count_query()
+                return (cursor.fetchall() if fetch else cursor.rowcount), cursor.lastrowid
+            except Exception:
+                # The statements may be gone with the session; prepare them again next time
+                self._discard_statements(connection)
+                raise
+        
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params or ())
+            _count_query()
+            return (cursor.fetchall() if fetch else cursor.rowcount), cursor.lastrowid
+        finally:
+            cursor.close()
+    
+    def execute_query(self, query, params=None, fetch=False, prepared=False):
+        """Execute a query and return results if fetch=True.
+
+        With prepared=True and DB_PREPARED_STATEMENTS enabled the statement is
+        prepared once per connection and re-executed from then on. Inside a
+        transaction() block the query joins the open transaction.
+        """
+        transaction = _active_transaction.get()
+        if transaction is not None and transaction.manager is self:
+            return transaction.execute(query, params, fetch, prepared)
+        
         connection = None
-        cursor = None
         try:
             connection = self.get_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            cursor.execute(query, params or ())
+            result, _ = self._run(connection, query, params, fetch, prepared)
             
             if fetch:
-                result = cursor.fetchall()
-                return result
+                # Without a session reset on checkout, end the read snapshot explicitly
+                if self._prepared_enabled() and connection.in_transaction:
+                    connection.rollback()
             else:
                 connection.commit()
-                return cursor.rowcount
+            return result
                 
         except Exception as e:
             if connection:
@@ -61,10 +314,45 @@ class DatabaseManager:
             logger.error(f"Database query failed: {e}")
             raise
         finally:
-            if cursor:
-                cursor.close()
             if connection:
                 connection.close()
+    
+    def executemany(self, query, seq_params):
+        """Execute a statement for every parameter tuple and commit once; returns the rowcount"""
+        with self.transaction() as transaction:
+            return transaction.executemany(query, seq_params)
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        """Hold one connection for the block and commit its statements together.
+
+            with db_manager.transaction() as tx:
+                tx.execute("INSERT ...", params)
+                Order.create_order(...)      # execute_query joins the transaction
+
+        Any exception rolls everything back. Nested blocks join the outer one.
+        """
+        current = _active_transaction.get()
+        if current is not None and current.manager is self:
+            yield current
+            return
+        
+        connection = self.get_connection()
+        transaction = Transaction(self, connection)
+        token = _active_transaction.set(transaction)
+        try:
+            yield transaction
+            connection.commit()
+        except Exception as e:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            logger.error(f"Transaction rolled back: {e}")
+            raise
+        finally:
+            _active_transaction.reset(token)
+            connection.close()
 
 # Global database manager instance
 db_manager = DatabaseManager()
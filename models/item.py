@@ -1,12 +1,100 @@
+from config import Config
 from models.database import db_manager
+from services import event_log, images
+import re
+import threading
+import time
+
+# Per-process copy of the shared menu version: (monotonic time read, version)
+_menu_version = (None, None)
+
+# Per-process copy of the whole menu: (menu version, items, categories)
+_catalog = (None, [], [])
+_catalog_lock = threading.Lock()
 
 class Item:
-    def __init__(self, item_id=None, item_name=None, category=None, price=None, image_url=None):
+    def __init__(self, item_id=None, item_name=None, category=None, price=None, image_url=None, image_key=None):
         self.item_id = item_id
         self.item_name = item_name
         self.category = category
         self.price = price
         self.image_url = image_url
+        # Content key of the cached, resized copies of the image (services/images.py)
+        self.image_key = image_key
+    
+    def to_dict(self):
+        """JSON-ready representation of the item"""
+        return {
+            'item_id': self.item_id,
+            'item_name': self.item_name,
+            'category': self.category,
+            'price': self.price,
+            'image_url': self.image_url,
+            'image_key': self.image_key
+        }
+    
+    @staticmethod
+    def validate_item(data):
+        """Validate item fields; returns (True, cleaned fields) or (False, error message)"""
+        item_name = (data.get('item_name') or '').strip()
+        category = (data.get('category') or '').strip()
+        price = data.get('price')
+        image_url = (data.get('image_url') or '').strip()
+        
+        if not item_name:
+            return False, "Item name is required"
+        if len(item_name) > 100:
+            return False, "Item name must be at most 100 characters"
+        
+        if not category:
+            return False, "Category is required"
+        if len(category) > 50:
+            return False, "Category must be at most 50 characters"
+        
+        if not price or isinstance(price, bool) or not isinstance(price, (int, float)) or price <= 0:
+            return False, "Valid price is required"
+        
+        # Validate price format
+        if not re.match(r'^\d+(\.\d{1,2})?$', str(price)):
+            return False, "Price must be a valid number with up to 2 decimal places"
+        
+        if len(image_url) > 500:
+            return False, "Image URL must be at most 500 characters"
+        
+        return True, {'item_name': item_name, 'category': category, 'price': price,
+                      'image_url': image_url if image_url else None}
+    
+    @staticmethod
+    def get_menu_version():
+        """Get a token that changes whenever a menu item is created, updated or deleted.
+
+        The version lives in the database, so edits made on any host are seen
+        everywhere; each process re-reads it at most every MENU_VERSION_TTL seconds.
+        """
+        global _menu_version
+        read_at, version = _menu_version
+        now = time.monotonic()
+        if read_at is None or now - read_at >= Config.MENU_VERSION_TTL:
+            query = "SELECT version FROM menu_version WHERE id = 1"
+            result = db_manager.execute_query(query, fetch=True, prepared=True)
+            version = result[0]['version'] if result else 0
+            _menu_version = (now, version)
+        return version
+    
+    @staticmethod
+    def bump_menu_version(transaction=None):
+        """Mark the menu as changed for every process on every host.
+
+        Pass the transaction of the item write so the new version commits with it.
+        """
+        global _menu_version
+        query = "UPDATE menu_version SET version = version + 1 WHERE id = 1"
+        if transaction is None:
+            db_manager.execute_query(query)
+        else:
+            transaction.execute(query)
+        # This process reads the new version on its next lookup
+        _menu_version = (None, None)
     
     @staticmethod
     def get_all_items():
@@ -21,12 +109,29 @@ class Item:
                 item_name=row['item_name'],
                 category=row['category'],
                 price=row['price'],
-                image_url=row.get('image_url')
+                image_url=row.get('image_url'),
+                image_key=row.get('image_key')
             )
             items.append(item)
         
         return items
     
+    @staticmethod
+    def get_catalog():
+        """All items and the sorted category names, cached per process until the menu version changes.
+
+        The items are shared between requests and must not be modified.
+        """
+        global _catalog
+        version = Item.get_menu_version()
+        if _catalog[0] != version:
+            with _catalog_lock:
+                if _catalog[0] != version:
+                    # Tagged with the version read before the query, so a change made meanwhile reloads it
+                    items = Item.get_all_items()
+                    _catalog = (version, items, sorted({item.category for item in items if item.category}))
+        return _catalog[1], _catalog[2]
+    
     @staticmethod
     def get_items_by_category():
         """Get items grouped by category"""
@@ -44,7 +149,8 @@ class Item:
                 item_name=row['item_name'],
                 category=row['category'],
                 price=row['price'],
-                image_url=row.get('image_url')
+                image_url=row.get('image_url'),
+                image_key=row.get('image_key')
             )
             items_by_category[category].append(item)
         
@@ -54,7 +160,7 @@ class Item:
     def get_by_id(item_id):
         """Get item by ID"""
         query = "SELECT * FROM items WHERE item_id = %s"
-        result = db_manager.execute_query(query, (item_id,), fetch=True)
+        result = db_manager.execute_query(query, (item_id,), fetch=True, prepared=True)
         
         if result:
             row = result[0]
@@ -63,29 +169,120 @@ class Item:
                 item_name=row['item_name'],
                 category=row['category'],
                 price=row['price'],
-                image_url=row.get('image_url')
+                image_url=row.get('image_url'),
+                image_key=row.get('image_key')
             )
         return None
     
     @staticmethod
-    def create_item(item_name, category, price, image_url=None):
-        """Create a new menu item"""
-        query = "INSERT INTO items (item_name, category, price, image_url) VALUES (%s, %s, %s, %s)"
-        result = db_manager.execute_query(query, (item_name, category, price, image_url))
+    def create_item(item_name, category, price, image_url=None, image_data=None):
+        """Create a new menu item, caching an uploaded image; image URLs are left to cache_item_images"""
+        image_key = images.ingest_image(image_data=image_data)
+        query = "INSERT INTO items (item_name, category, price, image_url, image_key) VALUES (%s, %s, %s, %s, %s)"
+        with db_manager.transaction() as transaction:
+            result = transaction.execute(query, (item_name, category, price, image_url, image_key))
+            item_id = transaction.lastrowid
+            Item.bump_menu_version(transaction)
+        event_log.emit('item.created', Item._event_data(item_id, item_name, category, price))
         return result
     
     @staticmethod
-    def update_item(item_id, item_name, category, price, image_url=None):
-        """Update an existing menu item"""
-        query = "UPDATE items SET item_name = %s, category = %s, price = %s, image_url = %s WHERE item_id = %s"
-        result = db_manager.execute_query(query, (item_name, category, price, image_url, item_id))
+    def _event_data(item_id, item_name, category, price):
+        """Data of an item.created or item.updated event"""
+        return {'item_id': item_id, 'item_name': item_name, 'category': category, 'price': str(price)}
+    
+    @staticmethod
+    def update_item(item_id, item_name, category, price, image_url=None, image_data=None):
+        """Update an existing menu item; its cached image is kept unless a new image is given.
+
+        A changed image URL clears the cached image until cache_item_images fetches it.
+        """
+        image_key = None
+        if image_data is not None:
+            image_key = images.ingest_image(image_data=image_data)
+        else:
+            current = Item.get_by_id(item_id)
+            if current and current.image_url == image_url:
+                image_key = current.image_key
+        
+        query = "UPDATE items SET item_name = %s, category = %s, price = %s, image_url = %s, image_key = %s WHERE item_id = %s"
+        with db_manager.transaction() as transaction:
+            result = transaction.execute(query, (item_name, category, price, image_url, image_key, item_id))
+            Item.bump_menu_version(transaction)
+        if result:
+            event_log.emit('item.updated', Item._event_data(item_id, item_name, category, price))
         return result
     
+    @staticmethod
+    def upsert_items(items, batch_size=500):
+        """Create or update items by name from validated fields, in one transaction.
+
+        Rows are sent as multi-row INSERT ... ON DUPLICATE KEY UPDATE statements
+        of batch_size items. An item whose image URL changes loses its cached
+        image until the cache_item_images job fetches the new one.
+        """
+        columns = ('item_name', 'category', 'price', 'image_url')
+        with db_manager.transaction() as transaction:
+            rows = transaction.execute("SELECT item_name FROM items", fetch=True)
+            existing = {row['item_name'].casefold() for row in rows}
+            
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+                params = [item[column] for item in batch for column in columns]
+                # image_key is assigned before image_url so it still sees the old URL
+                transaction.execute(f"""
+                    INSERT INTO items (item_name, category, price, image_url) VALUES {placeholders}
+                    ON DUPLICATE KEY UPDATE
+                        image_key = IF(image_url <=> VALUES(image_url), image_key, NULL),
+                        item_name = VALUES(item_name),
+                        category = VALUES(category),
+                        price = VALUES(price),
+                        image_url = VALUES(image_url)
+                """, params)
+            Item.bump_menu_version(transaction)
+        
+        # Imported items are keyed by name, their ids are not read back
+        event_log.emit_many([('item.upserted', {'item_name': item['item_name'], 'category': item['category'],
+                                                'price': str(item['price'])}) for item in items])
+        created = sum(1 for item in items if item['item_name'].casefold() not in existing)
+        return {'created': created, 'updated': len(items) - created}
+    
+    @staticmethod
+    def iter_items(batch_size=1000):
+        """Yield every item in item_id order, reading batch_size rows per query"""
+        last_id = 0
+        while True:
+            query = "SELECT * FROM items WHERE item_id > %s ORDER BY item_id LIMIT %s"
+            result = db_manager.execute_query(query, (last_id, batch_size), fetch=True)
+            for row in result:
+                yield Item(
+                    item_id=row['item_id'],
+                    item_name=row['item_name'],
+                    category=row['category'],
+                    price=row['price'],
+                    image_url=row.get('image_url'),
+                    image_key=row.get('image_key')
+                )
+            if len(result) < batch_size:
+                return
+            last_id = result[-1]['item_id']
+    
+    @staticmethod
+    def set_image_key(item_id, image_key):
+        """Record the cached image of an item whose image URL was ingested later"""
+        query = "UPDATE items SET image_key = %s WHERE item_id = %s"
+        return db_manager.execute_query(query, (image_key, item_id))
+    
     @staticmethod
     def delete_item(item_id):
         """Delete a menu item"""
         query = "DELETE FROM items WHERE item_id = %s"
-        result = db_manager.execute_query(query, (item_id,))
+        with db_manager.transaction() as transaction:
+            result = transaction.execute(query, (item_id,))
+            Item.bump_menu_version(transaction)
+        if result:
+            event_log.emit('item.deleted', {'item_id': item_id})
         return result
     
     @staticmethod
@@ -107,7 +304,8 @@ class Item:
                 item_name=row['item_name'],
                 category=row['category'],
                 price=row['price'],
-                image_url=row.get('image_url')
+                image_url=row.get('image_url'),
+                image_key=row.get('image_key')
             )
             items.append(item)
         
@@ -126,6 +324,7 @@ class Item:
                 item_name=row['item_name'],
                 category=row['category'],
                 price=row['price'],
-                image_url=row.get('image_url')
+                image_url=row.get('image_url'),
+                image_key=row.get('image_key')
             )
         return None
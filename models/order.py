@@ -1,11 +1,22 @@
+from config import Config
 from models.database import db_manager
+from models.address import Address
+from models.archive import database_label, order_archive, TIMESTAMP_FORMAT
+from models.order_buffer import order_buffer
+from services import event_log
 from datetime import datetime, timedelta
+import heapq
 import re
 
+# Where _scatter_rows puts each order database's own live-row condition
+LIVE_FILTER = ' /* live rows */'
+
 class Order:
     def __init__(self, order_id=None, user_id=None, item_id=None, quantity=None, 
-                 delivery_address=None, order_timestamp=None, item_name=None, category=None, price=None):
+                 delivery_address=None, order_timestamp=None, item_name=None, category=None, price=None,
+                 line_id=None):
         self.order_id = order_id
+        self.line_id = line_id
         self.user_id = user_id
         self.item_id = item_id
         self.quantity = quantity
@@ -15,6 +26,37 @@ class Order:
         self.category = category
         self.price = price
     
+    def to_dict(self):
+        """JSON-ready representation of the order"""
+        return {
+            'order_id': self.order_id,
+            'line_id': self.line_id,
+            'user_id': self.user_id,
+            'item_id': self.item_id,
+            'item_name': self.item_name,
+            'quantity': self.quantity,
+            'delivery_address': self.delivery_address,
+            'order_timestamp': self.order_timestamp,
+            'category': self.category,
+            'price': self.price
+        }
+    
+    @staticmethod
+    def _from_row(row):
+        """Build an Order from a joined order line/item row"""
+        return Order(
+            order_id=row['order_id'],
+            line_id=row.get('line_id'),
+            user_id=row['user_id'],
+            item_id=row['item_id'],
+            quantity=row['quantity'],
+            delivery_address=row['delivery_address'],
+            order_timestamp=row['order_timestamp'],
+            item_name=row['item_name'],
+            category=row['category'],
+            price=row['price']
+        )
+    
     @staticmethod
     def validate_address(address):
         """Validate delivery address"""
@@ -37,171 +79,507 @@ class Order:
             return False, "Quantity must be a valid number"
     
     @staticmethod
-    def create_order(user_id, item_id, quantity, delivery_address):
-        """Create a new order"""
-        # Validate inputs
-        valid_quantity, quantity_error = Order.validate_quantity(quantity)
-        if not valid_quantity:
-            raise ValueError(quantity_error)
+    def place_order(user_id, lines, delivery_address):
+        """Place a cart of (item_id, quantity) lines as one order.
+
+        The order is one header row plus one multi-row insert of its lines,
+        committed together. Each line stores the item's current price and
+        category, so later menu edits never rewrite order history. Returns the
+        new order id, or None when the order was handed to the write buffer.
+        """
+        if not lines:
+            raise ValueError("Cart is empty")
         
         valid_address, address_error = Order.validate_address(delivery_address)
         if not valid_address:
             raise ValueError(address_error)
         
-        # Check if item exists
-        item_query = "SELECT * FROM items WHERE item_id = %s"
-        item_result = db_manager.execute_query(item_query, (item_id,), fetch=True)
-        if not item_result:
+        validated = []
+        for item_id, quantity in lines:
+            valid_quantity, quantity_result = Order.validate_quantity(quantity)
+            if not valid_quantity:
+                raise ValueError(quantity_result)
+            validated.append((item_id, quantity_result))
+        
+        # Check the items exist and read their price and category, all in one query
+        try:
+            item_ids = [int(item_id) for item_id, _ in validated]
+        except (ValueError, TypeError):
             raise ValueError("Item not found")
+        items = Order._get_item_details(item_ids)
+        if set(item_ids) - set(items):
+            raise ValueError("Item not found")
+        validated = [(item_id, quantity, Order._price(items[item_id]), items[item_id]['category'])
+                     for item_id, (_, quantity) in zip(item_ids, validated)]
         
-        # Create order
-        query = """
-            INSERT INTO orders (user_id, item_id, quantity, delivery_address)
-            VALUES (%s, %s, %s, %s)
-        """
-        db_manager.execute_query(query, (user_id, item_id, valid_quantity, address_error))
+        # In buffered mode the order is acknowledged once it is in the local WAL
+        if Config.ORDER_INGEST_MODE == 'buffered':
+            order_buffer.append(user_id, validated, address_error)
+            return None
         
-        return True
+        # Usually an LRU cache hit; a new address is stored before the order's transaction opens
+        orders_db = db_manager.for_user(user_id)
+        address_id = Address.get_id(orders_db, address_error)
+        
+        # Lines carry the header's timestamp, which both tables are partitioned by
+        order_timestamp = datetime.now().replace(microsecond=0)
+        with orders_db.transaction() as transaction:
+            transaction.execute("""
+                INSERT INTO order_headers (user_id, address_id, order_timestamp)
+                VALUES (%s, %s, %s)
+            """, (user_id, address_id, order_timestamp))
+            order_id = transaction.lastrowid
+            transaction.executemany("""
+                INSERT INTO order_items (order_id, item_id, quantity, unit_price, category, order_timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, [(order_id,) + line + (order_timestamp,) for line in validated])
+            Address.remember(transaction, [(user_id, address_id, order_timestamp)])
+        
+        event_log.emit('order.created', Order._created_event(order_id, user_id, address_id, order_timestamp,
+                                                            validated))
+        return order_id
     
     @staticmethod
-    def get_user_orders(user_id, limit=None, offset=0):
-        """Get orders for a specific user"""
-        query = """
-            SELECT o.*, i.item_name, i.category, i.price
-            FROM orders o
-            JOIN items i ON o.item_id = i.item_id
-            WHERE o.user_id = %s
-            ORDER BY o.order_timestamp DESC
+    def _created_event(order_id, user_id, address_id, order_timestamp, lines):
+        """Data of an order.created event; order ids are unique per order database, so per user"""
+        return {
+            'order_id': order_id,
+            'user_id': user_id,
+            'address_id': address_id,
+            'order_timestamp': str(order_timestamp),
+            'lines': [[item_id, quantity, str(unit_price)] for item_id, quantity, unit_price, _ in lines]
+        }
+    
+    @staticmethod
+    def create_order(user_id, item_id, quantity, delivery_address):
+        """Create a single-item order"""
+        return Order.place_order(user_id, [(item_id, quantity)], delivery_address)
+    
+    @staticmethod
+    def _live_filter(orders_db, alias='h'):
+        """SQL condition and params limiting a query on one order database to rows not yet archived.
+
+        Shards are archived one at a time, so each is cut at its own horizon.
+        """
+        horizon = order_archive.horizon(database_label(orders_db) if db_manager.sharded else None)
+        if horizon is None:
+            return "", ()
+        return f" AND {alias}.order_timestamp >= %s", (horizon,)
+    
+    @staticmethod
+    def _price(row):
+        """Price of an item or line row; items without a price count as free"""
+        return row['price'] if row['price'] is not None else 0
+    
+    @staticmethod
+    def _get_item_details(item_ids):
+        """Get {item_id: row} with name, category and price for the given items"""
+        item_ids = list(set(item_ids))
+        if not item_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(item_ids))
+        query = f"SELECT item_id, item_name, category, price FROM items WHERE item_id IN ({placeholders})"
+        result = db_manager.execute_query(query, tuple(item_ids), fetch=True)
+        return {row['item_id']: row for row in result}
+    
+    @staticmethod
+    def _attach_item_details(rows):
+        """Add the current item name to order rows, with price and category as ordered.
+
+        Orders may live in other databases than the catalog, so names are
+        looked up here rather than joined in SQL. Price and category come from
+        the line's snapshot; lines that predate snapshots fall back to the
+        item's current values.
+        """
+        items = Order._get_item_details(row['item_id'] for row in rows)
+        joined = []
+        for row in rows:
+            item = items.get(row['item_id'])
+            if not item:
+                continue
+            if row.get('unit_price') is None:
+                price, category = Order._price(item), item['category']
+            else:
+                price, category = row['unit_price'], row['category']
+            joined.append(dict(row, item_name=item['item_name'], category=category, price=price))
+        return joined
+    
+    @staticmethod
+    def get_user_order_rows(user_id, limit=None, offset=0):
+        """Get a user's order lines as plain dict rows, newest first.
+
+        Listing endpoints serialize these rows directly instead of building
+        Order objects. Archived orders are included when the page reaches past
+        the archive horizon.
+        """
+        orders_db = db_manager.for_user(user_id)
+        live_filter, live_params = Order._live_filter(orders_db, 'h')
+        query = f"""
+            SELECT h.order_id, l.line_id, h.user_id, l.item_id, l.quantity, l.unit_price, l.category,
+                   a.address AS delivery_address, h.order_timestamp
+            FROM order_headers h
+            JOIN order_items l ON l.order_id = h.order_id AND l.order_timestamp = h.order_timestamp
+            JOIN addresses a ON a.address_id = h.address_id
+            WHERE h.user_id = %s{live_filter}
+            ORDER BY h.order_timestamp DESC, h.order_id DESC, l.line_id
         """
         
+        params = (user_id,) + live_params
         if limit:
-            query += f" LIMIT {limit} OFFSET {offset}"
+            query += " LIMIT %s OFFSET %s"
+            params += (int(limit), int(offset))
         
-        result = db_manager.execute_query(query, (user_id,), fetch=True)
+        rows = orders_db.execute_query(query, params, fetch=True, prepared=True)
         
-        orders = []
-        for row in result:
-            order = Order(
-                order_id=row['order_id'],
-                user_id=row['user_id'],
-                item_id=row['item_id'],
-                quantity=row['quantity'],
-                delivery_address=row['delivery_address'],
-                order_timestamp=row['order_timestamp'],
-                item_name=row['item_name'],
-                category=row['category'],
-                price=row['price']
-            )
-            orders.append(order)
+        # Archived orders are all older than live ones, so they continue the listing
+        if live_filter and (not limit or len(rows) < limit):
+            archive_offset = 0
+            if limit and offset and not rows:
+                count_query = f"""
+                    SELECT COUNT(*) as total
+                    FROM order_headers h
+                    JOIN order_items l ON l.order_id = h.order_id AND l.order_timestamp = h.order_timestamp
+                    WHERE h.user_id = %s{live_filter}
+                """
+                live_total = orders_db.execute_query(count_query, (user_id,) + live_params, fetch=True)[0]['total']
+                archive_offset = max(0, offset - live_total)
+            
+            for index, row in enumerate(order_archive.iter_rows(user_id=user_id)):
+                if limit and len(rows) >= limit:
+                    break
+                if index >= archive_offset:
+                    rows.append(row)
         
-        return orders
+        return Order._attach_item_details(rows)
+    
+    @staticmethod
+    def get_user_orders(user_id, limit=None, offset=0):
+        """Get orders for a specific user"""
+        return [Order._from_row(row) for row in Order.get_user_order_rows(user_id, limit, offset)]
     
     @staticmethod
     def get_all_orders(limit=None, offset=0):
-        """Get all orders with item details"""
-        query = """
-            SELECT o.*, i.item_name, i.category, i.price, u.username
-            FROM orders o
-            JOIN items i ON o.item_id = i.item_id
-            JOIN users u ON o.user_id = u.user_id
-            ORDER BY o.order_timestamp DESC
+        """Get all live (non-archived) order lines with item details, merged across shards"""
+        query = f"""
+            SELECT h.order_id, l.line_id, h.user_id, l.item_id, l.quantity, l.unit_price, l.category,
+                   a.address AS delivery_address, h.order_timestamp
+            FROM order_headers h
+            JOIN order_items l ON l.order_id = h.order_id AND l.order_timestamp = h.order_timestamp
+            JOIN addresses a ON a.address_id = h.address_id
+            WHERE 1 = 1{LIVE_FILTER}
+            ORDER BY h.order_timestamp DESC, h.order_id DESC, l.line_id
         """
         
+        # Any row of the merged page is among the first offset + limit rows of its shard
         if limit:
-            query += f" LIMIT {limit} OFFSET {offset}"
-        
-        result = db_manager.execute_query(query, fetch=True)
-        
-        orders = []
-        for row in result:
-            order = Order(
-                order_id=row['order_id'],
-                user_id=row['user_id'],
-                item_id=row['item_id'],
-                quantity=row['quantity'],
-                delivery_address=row['delivery_address'],
-                order_timestamp=row['order_timestamp'],
-                item_name=row['item_name'],
-                category=row['category'],
-                price=row['price']
-            )
-            orders.append(order)
-        
-        return orders
-    
-    @staticmethod
-    def delete_order(order_id, user_id):
-        """Delete an order (only if it belongs to the user)"""
-        query = "DELETE FROM orders WHERE order_id = %s AND user_id = %s"
-        affected_rows = db_manager.execute_query(query, (order_id, user_id))
-        return affected_rows > 0
+            query += " LIMIT %s"
+        
+        def query_shard(orders_db):
+            live_filter, live_params = Order._live_filter(orders_db, 'h')
+            params = live_params + ((int(offset) + int(limit),) if limit else ())
+            return orders_db.execute_query(query.replace(LIVE_FILTER, live_filter), params, fetch=True, prepared=True)
+        
+        # Merged on the per-shard ORDER BY; order ids repeat across shards, so the shard index
+        # keeps the lines of two orders with the same timestamp and id apart
+        streams = [[((row['order_timestamp'], row['order_id'], shard, -row['line_id']), row) for row in shard_rows]
+                   for shard, shard_rows in enumerate(db_manager.scatter(query_shard))]
+        rows = [row for _, row in heapq.merge(*streams, key=lambda entry: entry[0], reverse=True)]
+        if limit:
+            rows = rows[int(offset):int(offset) + int(limit)]
+        return [Order._from_row(row) for row in Order._attach_item_details(rows)]
+    
+    @staticmethod
+    def delete_order(line_id, user_id):
+        """Delete an order line (only if its order belongs to the user); an order left empty is deleted too"""
+        with db_manager.for_user(user_id).transaction() as transaction:
+            rows = transaction.execute("""
+                SELECT h.order_id, h.order_timestamp
+                FROM order_items l
+                JOIN order_headers h ON h.order_id = l.order_id AND h.order_timestamp = l.order_timestamp
+                WHERE l.line_id = %s AND h.user_id = %s
+            """, (line_id, user_id), fetch=True)
+            if not rows:
+                return False
+            
+            order_id, order_timestamp = rows[0]['order_id'], rows[0]['order_timestamp']
+            transaction.execute("DELETE FROM order_items WHERE line_id = %s AND order_timestamp = %s",
+                                (line_id, order_timestamp))
+            order_deleted = transaction.execute("""
+                DELETE FROM order_headers
+                WHERE order_id = %s AND order_timestamp = %s
+                  AND NOT EXISTS (SELECT 1 FROM order_items WHERE order_id = %s AND order_timestamp = %s)
+            """, (order_id, order_timestamp, order_id, order_timestamp)) > 0
+        
+        event_log.emit('order.deleted', {'line_id': line_id, 'order_id': order_id, 'user_id': user_id,
+                                         'order_deleted': order_deleted})
+        return True
     
     @staticmethod
-    def update_order(order_id, user_id, quantity, delivery_address):
-        """Update an order"""
+    def update_order(line_id, user_id, quantity, delivery_address):
+        """Update an order line's quantity and its order's delivery address"""
         # Validate inputs
-        valid_quantity, quantity_error = Order.validate_quantity(quantity)
+        valid_quantity, quantity_result = Order.validate_quantity(quantity)
         if not valid_quantity:
-            raise ValueError(quantity_error)
+            raise ValueError(quantity_result)
         
         valid_address, address_error = Order.validate_address(delivery_address)
         if not valid_address:
             raise ValueError(address_error)
         
-        query = """
-            UPDATE orders 
-            SET quantity = %s, delivery_address = %s
-            WHERE order_id = %s AND user_id = %s
-        """
-        affected_rows = db_manager.execute_query(query, (valid_quantity, address_error, order_id, user_id))
+        orders_db = db_manager.for_user(user_id)
+        address_id = Address.get_id(orders_db, address_error)
+        with orders_db.transaction() as transaction:
+            affected_rows = transaction.execute("""
+                UPDATE order_items l
+                JOIN order_headers h ON h.order_id = l.order_id AND h.order_timestamp = l.order_timestamp
+                SET l.quantity = %s, h.address_id = %s
+                WHERE l.line_id = %s AND h.user_id = %s
+            """, (quantity_result, address_id, line_id, user_id))
+            if affected_rows > 0:
+                Address.remember(transaction, [(user_id, address_id, datetime.now().replace(microsecond=0))])
+        
+        if affected_rows > 0:
+            event_log.emit('order.updated', {'line_id': line_id, 'user_id': user_id,
+                                             'quantity': quantity_result, 'address_id': address_id})
         return affected_rows > 0
     
     # Analytics methods
+    @staticmethod
+    def _scatter_rows(query, params=(), alias=None):
+        """Run a read query on every order database in parallel and concatenate the rows.
+
+        With an alias, LIVE_FILTER in the query becomes that database's live-row
+        condition on the alias, whose params follow params.
+        """
+        def run(orders_db):
+            live_filter, live_params = Order._live_filter(orders_db, alias) if alias else ("", ())
+            return orders_db.execute_query(query.replace(LIVE_FILTER, live_filter), params + live_params, fetch=True)
+        
+        rows = []
+        for shard_rows in db_manager.scatter(run):
+            rows.extend(shard_rows)
+        return rows
+    
+    @staticmethod
+    def _add_totals(totals, key, total_quantity, order_count, revenue):
+        """Add one group's sums into {key: [total_quantity, order_count, revenue]}"""
+        total = totals.setdefault(key, [0, 0, 0.0])
+        total[0] += int(total_quantity)
+        total[1] += order_count
+        total[2] += float(revenue or 0)
+    
+    @staticmethod
+    def _item_totals():
+        """Return {item_id: [total_quantity, order_count, revenue]} over live orders on every shard and the archive"""
+        query = f"""
+            SELECT l.item_id, SUM(l.quantity) as total_quantity, COUNT(DISTINCT l.order_id) as order_count,
+                   SUM(l.quantity * l.unit_price) as revenue
+            FROM order_items l
+            WHERE 1 = 1{LIVE_FILTER}
+            GROUP BY l.item_id
+        """
+        totals = {}
+        for row in Order._scatter_rows(query, alias='l'):
+            Order._add_totals(totals, row['item_id'], row['total_quantity'], row['order_count'], row['revenue'])
+        
+        if order_archive.horizon() is not None:
+            for item_id, total in order_archive.item_totals().items():
+                Order._add_totals(totals, item_id, *total)
+        return totals
+    
+    @staticmethod
+    def _category_totals():
+        """Return {category: [total_quantity, order_count, revenue]} by the category each line was ordered under"""
+        query = f"""
+            SELECT l.category, SUM(l.quantity) as total_quantity, COUNT(DISTINCT l.order_id) as order_count,
+                   SUM(l.quantity * l.unit_price) as revenue
+            FROM order_items l
+            WHERE 1 = 1{LIVE_FILTER}
+            GROUP BY l.category
+        """
+        totals = {}
+        for row in Order._scatter_rows(query, alias='l'):
+            Order._add_totals(totals, row['category'], row['total_quantity'], row['order_count'], row['revenue'])
+        
+        if order_archive.horizon() is not None:
+            for category, total in order_archive.category_totals().items():
+                Order._add_totals(totals, category, *total)
+        return totals
+    
+    @staticmethod
+    def get_order_times(start, end):
+        """Get (user_id, UNIX timestamp) of every live or archived order placed in [start, end)"""
+        query = f"""
+            SELECT h.user_id, UNIX_TIMESTAMP(h.order_timestamp) AS order_ts
+            FROM order_headers h
+            WHERE h.order_timestamp >= %s AND h.order_timestamp < %s{LIVE_FILTER}
+        """
+        times = [(row['user_id'], int(row['order_ts'])) for row in Order._scatter_rows(query, (start, end), 'h')]
+        
+        horizon = order_archive.horizon()
+        if horizon is not None and start < horizon:
+            # The archive stores lines; the lines of one order share its user and timestamp
+            # Only partitions overlapping [start, end) are read, so chunked callers never rescan the archive
+            archived = set()
+            for name, _ in order_archive.partitions_between(start, end):
+                for user_id, order_timestamp in order_archive.iter_partition(name, ('user_id', 'order_timestamp'),
+                                                                             start, end):
+                    archived.add((user_id, int(order_timestamp.timestamp())))
+            times.extend(archived)
+        return times
+    
+    @staticmethod
+    def get_carts(since):
+        """Get the set of item ids of every live or archived order placed since `since`"""
+        query = f"""
+            SELECT l.order_id, l.item_id
+            FROM order_items l
+            WHERE l.order_timestamp >= %s{LIVE_FILTER}
+        """
+        
+        def shard_carts(orders_db):
+            # Order ids are only unique within one database
+            carts = {}
+            live_filter, live_params = Order._live_filter(orders_db, 'l')
+            for row in orders_db.execute_query(query.replace(LIVE_FILTER, live_filter), (since,) + live_params, fetch=True):
+                carts.setdefault(row['order_id'], set()).add(row['item_id'])
+            return list(carts.values())
+        
+        carts = [cart for shard in db_manager.scatter(shard_carts) for cart in shard]
+        
+        horizon = order_archive.horizon()
+        if horizon is not None and since < horizon:
+            archived = {}
+            for row in order_archive.iter_rows(since=since):
+                archived.setdefault((row['user_id'], row['order_timestamp']), set()).add(row['item_id'])
+            carts.extend(archived.values())
+        return carts
+    
+    @staticmethod
+    def get_first_order_time():
+        """Get the timestamp of the oldest live or archived order, or None"""
+        query = "SELECT MIN(h.order_timestamp) AS first_order FROM order_headers h"
+        candidates = [row['first_order'] for row in Order._scatter_rows(query) if row['first_order']]
+        manifest = order_archive.get_manifest()['partitions']
+        candidates.extend(datetime.strptime(entry['start'], TIMESTAMP_FORMAT) for entry in manifest.values())
+        return min(candidates) if candidates else None
+    
     @staticmethod
     def get_total_orders():
-        """Get total number of orders"""
-        query = "SELECT COUNT(*) as total FROM orders"
-        result = db_manager.execute_query(query, fetch=True)
-        return result[0]['total'] if result else 0
+        """Get total number of orders, including archived orders"""
+        query = f"SELECT COUNT(*) as total FROM order_headers h WHERE 1 = 1{LIVE_FILTER}"
+        total = sum(row['total'] for row in Order._scatter_rows(query, alias='h'))
+        if order_archive.horizon() is not None:
+            total += order_archive.count()
+        return total
     
     @staticmethod
     def get_popular_dishes(limit=5):
         """Get most popular dishes"""
-        query = """
-            SELECT i.item_name, i.category, i.price, 
-                   SUM(o.quantity) as total_ordered,
-                   COUNT(o.order_id) as order_count
-            FROM orders o
-            JOIN items i ON o.item_id = i.item_id
-            GROUP BY i.item_id, i.item_name, i.category, i.price
-            ORDER BY total_ordered DESC
-            LIMIT %s
-        """
-        return db_manager.execute_query(query, (limit,), fetch=True)
+        totals = Order._item_totals()
+        items = Order._get_item_details(totals)
+        dishes = [
+            dict(items[item_id], total_ordered=total_ordered, order_count=order_count, revenue=round(revenue, 2))
+            for item_id, (total_ordered, order_count, revenue) in totals.items()
+            if item_id in items
+        ]
+        dishes.sort(key=lambda row: row['total_ordered'], reverse=True)
+        return dishes[:limit]
     
     @staticmethod
     def get_orders_per_day(days=7):
         """Get orders per day for the last N days"""
-        query = """
-            SELECT DATE(order_timestamp) as order_date,
+        query = f"""
+            SELECT DATE(h.order_timestamp) as order_date,
                    COUNT(*) as order_count
-            FROM orders
-            WHERE order_timestamp >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            GROUP BY DATE(order_timestamp)
-            ORDER BY order_date
+            FROM order_headers h
+            WHERE h.order_timestamp >= DATE_SUB(CURDATE(), INTERVAL %s DAY){LIVE_FILTER}
+            GROUP BY DATE(h.order_timestamp)
         """
-        return db_manager.execute_query(query, (days,), fetch=True)
+        counts = {}
+        for row in Order._scatter_rows(query, (days,), 'h'):
+            counts[row['order_date']] = counts.get(row['order_date'], 0) + row['order_count']
+        
+        # Add archived days when the requested window reaches past the horizon
+        since = datetime.combine(datetime.now().date() - timedelta(days=days), datetime.min.time())
+        horizon = order_archive.horizon()
+        if horizon is not None and since < horizon:
+            for order_date, order_count in order_archive.daily_counts(since=since).items():
+                counts[order_date] = counts.get(order_date, 0) + order_count
+        return [{'order_date': order_date, 'order_count': counts[order_date]} for order_date in sorted(counts)]
     
     @staticmethod
     def get_orders_by_category():
         """Get orders grouped by category"""
-        query = """
-            SELECT i.category,
-                   COUNT(o.order_id) as order_count,
-                   SUM(o.quantity) as total_quantity
-            FROM orders o
-            JOIN items i ON o.item_id = i.item_id
-            GROUP BY i.category
-            ORDER BY order_count DESC
+        # Lines of deleted items that were never given a snapshot have no category
+        categories = [
+            {'category': category, 'order_count': order_count, 'total_quantity': total_quantity,
+             'revenue': round(revenue, 2)}
+            for category, (total_quantity, order_count, revenue) in Order._category_totals().items()
+            if category is not None
+        ]
+        return sorted(categories, key=lambda row: row['order_count'], reverse=True)
+    
+    @staticmethod
+    def get_revenue_per_day(days=7):
+        """Get revenue, order count and average order value per day for the last N days"""
+        query = f"""
+            SELECT DATE(l.order_timestamp) as order_date,
+                   COUNT(DISTINCT l.order_id) as order_count,
+                   SUM(l.quantity * l.unit_price) as revenue
+            FROM order_items l
+            WHERE l.order_timestamp >= DATE_SUB(CURDATE(), INTERVAL %s DAY){LIVE_FILTER}
+            GROUP BY DATE(l.order_timestamp)
         """
-        return db_manager.execute_query(query, fetch=True)
+        totals = {}
+        for row in Order._scatter_rows(query, (days,), 'l'):
+            total = totals.setdefault(row['order_date'], [0, 0.0])
+            total[0] += row['order_count']
+            total[1] += float(row['revenue'] or 0)
+        
+        since = datetime.combine(datetime.now().date() - timedelta(days=days), datetime.min.time())
+        horizon = order_archive.horizon()
+        if horizon is not None and since < horizon:
+            for order_date, (order_count, revenue) in order_archive.daily_totals(since=since).items():
+                total = totals.setdefault(order_date, [0, 0.0])
+                total[0] += order_count
+                total[1] += revenue
+        return [
+            {'order_date': order_date, 'order_count': order_count, 'revenue': round(revenue, 2),
+             'average_order_value': round(revenue / order_count, 2) if order_count else 0}
+            for order_date, (order_count, revenue) in sorted(totals.items())
+        ]
+    
+    @staticmethod
+    def get_revenue_summary():
+        """Get total revenue and average order value over every live and archived order"""
+        query = f"""
+            SELECT COUNT(DISTINCT l.order_id) as order_count, SUM(l.quantity * l.unit_price) as revenue
+            FROM order_items l
+            WHERE 1 = 1{LIVE_FILTER}
+        """
+        order_count, revenue = 0, 0.0
+        for row in Order._scatter_rows(query, alias='l'):
+            order_count += row['order_count']
+            revenue += float(row['revenue'] or 0)
+        
+        if order_archive.horizon() is not None:
+            for archived_orders, archived_revenue in order_archive.daily_totals().values():
+                order_count += archived_orders
+                revenue += archived_revenue
+        return {
+            'total_revenue': round(revenue, 2),
+            'average_order_value': round(revenue / order_count, 2) if order_count else 0
+        }
+    
+    @staticmethod
+    def get_analytics_summary():
+        """Get the combined analytics summary used by the dashboard API"""
+        return {
+            'total_orders': Order.get_total_orders(),
+            'popular_dishes': Order.get_popular_dishes(5),
+            'orders_per_day': Order.get_orders_per_day(7),
+            'orders_by_category': Order.get_orders_by_category(),
+            'revenue_per_day': Order.get_revenue_per_day(7),
+            **Order.get_revenue_summary()
+        }
@@ -0,0 +1,366 @@
+from config import Config
+from models.database import db_manager
+from models.address import Address
+from services import event_log
+from collections import deque
+from datetime import datetime
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class OrderWriteBuffer:
+    """Group-commit buffer for order inserts.
+
+    Orders are appended to a local write-ahead log and acknowledged once the
+    append is fsynced. A flusher thread then writes them to MySQL in multi-row
+    batches. Each record is one cart and carries an ingest_key so replaying
+    the log after a crash never inserts an order twice.
+
+    Every process owns one WAL directory, held with an exclusive flock. On
+    start, directories whose owner has died are adopted and replayed.
+    """
+
+    def __init__(self, wal_dir, batch_size=None, flush_interval_ms=None, segment_bytes=None):
+        self.wal_dir = wal_dir
+        self.batch_size = batch_size or Config.ORDER_BUFFER_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or Config.ORDER_BUFFER_FLUSH_MS) / 1000.0
+        self.segment_bytes = segment_bytes or Config.ORDER_WAL_SEGMENT_BYTES
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._wal_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._pending_lock = threading.Condition()
+        self._pending = deque()
+        self._outstanding = {}
+        self._stop = threading.Event()
+
+    # WAL management
+
+    def _open_directory(self):
+        """Adopt an orphaned WAL directory or create a fresh one, returning replayable records"""
+        os.makedirs(self.wal_dir, exist_ok=True)
+        for name in sorted(os.listdir(self.wal_dir)):
+            path = os.path.join(self.wal_dir, name)
+            if not os.path.isdir(path):
+                continue
+            lock_file = open(os.path.join(path, 'owner.lock'), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            self._directory, self._lock_file = path, lock_file
+            return self._read_segments()
+
+        path = os.path.join(self.wal_dir, uuid.uuid4().hex)
+        os.makedirs(path)
+        self._lock_file = open(os.path.join(path, 'owner.lock'), 'a')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._directory = path
+        return []
+
+    def _segment_path(self, segment):
+        return os.path.join(self._directory, f"{segment:012d}.wal")
+
+    def _read_segments(self):
+        """Read all records from existing segments, skipping a torn final line"""
+        records = []
+        for name in sorted(os.listdir(self._directory)):
+            if not name.endswith('.wal'):
+                continue
+            segment = int(name[:-4])
+            with open(os.path.join(self._directory, name), 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning(f"Skipping torn WAL record in {name}")
+                        continue
+                    if 'lines' not in record:
+                        # Logged before carts were stored as one order with lines
+                        record['lines'] = [[record.pop('item_id'), record.pop('quantity')]]
+                    # Lines logged before they carried a price snapshot are filled in by migrate_db.py
+                    record['lines'] = [line + [None] * (4 - len(line)) for line in record['lines']]
+                    record['segment'] = segment
+                    records.append(record)
+            self._outstanding[segment] = 0
+        return records
+
+    def _open_segment(self, segment):
+        self._segment = segment
+        self._fd = os.open(self._segment_path(segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._outstanding.setdefault(segment, 0)
+        self._written = 0
+        self._synced = 0
+
+    def _rotate_segment(self):
+        """Seal the current segment and start a new one; caller holds the WAL lock"""
+        with self._sync_lock:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._open_segment(self._segment + 1)
+
+    def _release_segments(self):
+        """Delete closed segments whose records are all committed"""
+        for segment, outstanding in list(self._outstanding.items()):
+            if outstanding == 0 and segment != self._segment:
+                try:
+                    os.remove(self._segment_path(segment))
+                except FileNotFoundError:
+                    pass
+                del self._outstanding[segment]
+
+    def _ensure_started(self):
+        """Start (or restart after fork) the WAL and flusher for this process"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pending = deque()
+            self._outstanding = {}
+            self._stop = threading.Event()
+
+            replayed = self._open_directory()
+            last_segment = max(self._outstanding, default=0)
+            self._open_segment(last_segment + 1)
+            for record in replayed:
+                self._outstanding[record['segment']] += 1
+                self._pending.append(record)
+            if replayed:
+                logger.info(f"Replaying {len(replayed)} order(s) from write-ahead log")
+            self._release_segments()
+
+            self._thread = threading.Thread(target=self._flush_loop, name='order-flusher', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+
+    def append(self, user_id, lines, delivery_address):
+        """Durably log a cart and queue it for a batched insert; returns its ingest key.
+
+        Lines are (item_id, quantity, unit_price, category) tuples.
+        """
+        self._ensure_started()
+        record = {
+            'key': uuid.uuid4().hex,
+            'user_id': user_id,
+            # Prices are logged as strings so the decimal value survives JSON
+            'lines': [[item_id, quantity, str(unit_price), category]
+                      for item_id, quantity, unit_price, category in lines],
+            'delivery_address': delivery_address,
+            'order_timestamp': datetime.now().strftime(TIMESTAMP_FORMAT)
+        }
+        data = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+        with self._wal_lock:
+            if self._written >= self.segment_bytes:
+                self._rotate_segment()
+            os.write(self._fd, data)
+            self._written += len(data)
+            self._outstanding[self._segment] += 1
+            record['segment'] = segment = self._segment
+            position = self._written
+
+        # Group fsync: whoever gets the lock first syncs everything written so far.
+        # A segment that has since been rotated was fsynced when it was sealed.
+        with self._sync_lock:
+            if segment == self._segment and self._synced < position:
+                target = self._written
+                os.fsync(self._fd)
+                self._synced = max(self._synced, target)
+
+        with self._pending_lock:
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._pending_lock.notify()
+        return record['key']
+
+    # Flushing
+
+    def _take_batch(self):
+        with self._pending_lock:
+            if len(self._pending) < self.batch_size and not self._stop.is_set():
+                self._pending_lock.wait(self.flush_interval)
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popleft())
+            return batch
+
+    def _header_statement(self, records, address_ids):
+        placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(records))
+        query = f"""
+            INSERT INTO order_headers (user_id, address_id, order_timestamp, ingest_key)
+            VALUES {placeholders}
+        """
+        params = []
+        for record in records:
+            params.extend((record['user_id'], address_ids[record['delivery_address']],
+                           record['order_timestamp'], record['key']))
+        return query, tuple(params)
+
+    def _lines_statement(self, records, order_ids):
+        lines = [(order_ids[record['key']], item_id, quantity, unit_price, category, record['order_timestamp'])
+                 for record in records for item_id, quantity, unit_price, category in record['lines']]
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(lines))
+        query = f"""
+            INSERT INTO order_items (order_id, item_id, quantity, unit_price, category, order_timestamp)
+            VALUES {placeholders}
+        """
+        return query, tuple(value for line in lines for value in line)
+
+    def _order_ids(self, transaction, records):
+        """Map ingest keys of records already in order_headers to their order ids"""
+        placeholders = ', '.join(['%s'] * len(records))
+        timestamps = [record['order_timestamp'] for record in records]
+        rows = transaction.execute(f"""
+            SELECT order_id, ingest_key FROM order_headers
+            WHERE order_timestamp BETWEEN %s AND %s AND ingest_key IN ({placeholders})
+        """, (min(timestamps), max(timestamps)) + tuple(record['key'] for record in records), fetch=True)
+        return {row['ingest_key']: row['order_id'] for row in rows}
+
+    def _insert_shard(self, orders_db, records):
+        """Insert the headers and lines of records in one transaction, skipping carts already written"""
+        # Addresses are stored first, outside the transaction, as Order.place_order does
+        address_ids = Address.get_ids(orders_db, [record['delivery_address'] for record in records])
+        with orders_db.transaction() as transaction:
+            written = self._order_ids(transaction, records)
+            records = [record for record in records if record['key'] not in written]
+            if not records:
+                return
+            transaction.execute(*self._header_statement(records, address_ids))
+            order_ids = self._order_ids(transaction, records)
+            transaction.execute(*self._lines_statement(records, order_ids))
+            Address.remember(transaction, [(record['user_id'], address_ids[record['delivery_address']],
+                                            record['order_timestamp']) for record in records])
+        # Replayed carts that were already written were filtered out above, so each order is logged once
+        event_log.emit_many([('order.created', {
+            'order_id': order_ids[record['key']],
+            'user_id': record['user_id'],
+            'address_id': address_ids[record['delivery_address']],
+            'order_timestamp': record['order_timestamp'],
+            'lines': [[item_id, quantity, unit_price] for item_id, quantity, unit_price, _ in record['lines']]
+        }) for record in records])
+
+    def _insert(self, records):
+        """Insert records into their users' shards; replays are idempotent via the ingest key"""
+        by_shard = {}
+        for record in records:
+            by_shard.setdefault(db_manager.for_user(record['user_id']), []).append(record)
+        for orders_db, shard_records in by_shard.items():
+            self._insert_shard(orders_db, shard_records)
+
+    def _commit(self, batch):
+        """Insert a batch, isolating rows that cannot be written.
+
+        Returns (committed, rejected), or None when MySQL is unreachable and
+        the whole batch should be retried later.
+        """
+        try:
+            self._insert(batch)
+            return batch, []
+        except Exception as e:
+            if not self._is_database_reachable():
+                return None
+            logger.warning(f"Batch insert of {len(batch)} orders failed ({e}), retrying row by row")
+
+        committed, rejected = [], []
+        for record in batch:
+            try:
+                self._insert([record])
+                committed.append(record)
+            except Exception:
+                rejected.append(record)
+        return committed, rejected
+
+    def _dead_letter(self, records):
+        """Park records MySQL refuses so they do not block the log"""
+        path = os.path.join(self.wal_dir, 'rejected.jsonl')
+        with open(path, 'a') as f:
+            for record in records:
+                f.write(json.dumps({k: v for k, v in record.items() if k != 'segment'}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        logger.error(f"Rejected {len(records)} buffered order(s), see {path}")
+
+    def _flush_batch(self, batch):
+        outcome = self._commit(batch)
+        if outcome is None:
+            with self._pending_lock:
+                self._pending.extendleft(reversed(batch))
+            return False
+
+        committed, rejected = outcome
+        if rejected:
+            self._dead_letter(rejected)
+
+        with self._wal_lock:
+            for record in batch:
+                self._outstanding[record['segment']] -= 1
+            self._release_segments()
+        return True
+
+    def _is_database_reachable(self):
+        try:
+            db_manager.scatter(lambda orders_db: orders_db.execute_query("SELECT 1", fetch=True))
+            return True
+        except Exception:
+            return False
+
+    def _flush_loop(self):
+        backoff = self.flush_interval
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._stop.is_set():
+                    return
+                continue
+            if self._flush_batch(batch):
+                backoff = self.flush_interval
+            else:
+                logger.error(f"Order flush failed, retrying in {backoff:.2f}s")
+                if self._stop.wait(backoff):
+                    return
+                backoff = min(backoff * 2, 5.0)
+
+    def flush(self, timeout=10.0):
+        """Block until every buffered order has been written or timeout expires"""
+        if self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._wal_lock:
+                if not any(self._outstanding.values()):
+                    return True
+            with self._pending_lock:
+                self._pending_lock.notify()
+            time.sleep(self.flush_interval / 2 or 0.001)
+        return False
+
+    def pending_count(self):
+        """Number of logged orders not yet committed to MySQL"""
+        with self._wal_lock:
+            return sum(self._outstanding.values())
+
+    def close(self):
+        """Flush outstanding orders and stop the flusher"""
+        if self._pid != os.getpid():
+            return
+        self.flush()
+        self._stop.set()
+        with self._pending_lock:
+            self._pending_lock.notify()
+        self._thread.join(timeout=5)
+        os.close(self._fd)
+
+# Global order write buffer, used when ORDER_INGEST_MODE is 'buffered'
+order_buffer = OrderWriteBuffer(Config.ORDER_WAL_DIR)
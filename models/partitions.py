@@ -0,0 +1,108 @@
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Catch-all partition that always sits at the end of the range
+MAX_PARTITION = 'pmax'
+
+# Order tables partitioned by month in lockstep, so a month is archived from both at once
+ORDER_TABLES = ('order_headers', 'order_items')
+
+def month_start(value):
+    """Return the first instant of the month containing value"""
+    return datetime(value.year, value.month, 1)
+
+def add_months(value, months):
+    """Shift a month start by a number of months"""
+    month_index = value.year * 12 + (value.month - 1) + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(start):
+    """Partition name for the month starting at start, e.g. p202501"""
+    return f"p{start.year:04d}{start.month:02d}"
+
+def partition_bounds(name):
+    """Return the (start, end) datetimes covered by a monthly partition"""
+    start = datetime(int(name[1:5]), int(name[5:7]), 1)
+    return start, add_months(start, 1)
+
+def partition_clause(start):
+    """DDL fragment for the monthly partition starting at start"""
+    end = add_months(start, 1)
+    return (f"PARTITION {partition_name(start)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{end:%Y-%m-%d %H:%M:%S}'))")
+
+def get_partitions(cursor, schema, table='order_headers'):
+    """List partition names of a table in ordinal order"""
+    cursor.execute("""
+        SELECT PARTITION_NAME
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (schema, table))
+    return [row[0] for row in cursor.fetchall()]
+
+def get_monthly_partitions(cursor, schema, table='order_headers'):
+    """List (name, start, end) for every monthly partition, oldest first"""
+    partitions = []
+    for name in get_partitions(cursor, schema, table):
+        if name == MAX_PARTITION:
+            continue
+        start, end = partition_bounds(name)
+        partitions.append((name, start, end))
+    return partitions
+
+def partition_table(cursor, schema, table, months_ahead=3, oldest=None):
+    """Convert a table to monthly RANGE partitions on order_timestamp.
+
+    Partitions start at the month of the table's oldest row, or of `oldest`
+    if that is earlier, and run months_ahead past the current month. Returns False if the table
+    is already partitioned.
+    """
+    if get_partitions(cursor, schema, table):
+        return False
+
+    cursor.execute(f"SELECT MIN(order_timestamp) FROM {table}")
+    candidates = [value for value in (oldest, cursor.fetchone()[0]) if value]
+    current = month_start(datetime.now())
+    start = month_start(min(candidates)) if candidates else current
+    last = add_months(current, months_ahead)
+
+    clauses = []
+    while start <= last:
+        clauses.append(partition_clause(start))
+        start = add_months(start, 1)
+    clauses.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+
+    logger.info(f"Partitioning {table} table into {len(clauses)} partitions...")
+    cursor.execute(
+        f"ALTER TABLE {table} PARTITION BY RANGE (UNIX_TIMESTAMP(order_timestamp)) ("
+        + ", ".join(clauses) + ")"
+    )
+    return True
+
+def ensure_future_partitions(cursor, schema, months_ahead=3, table='order_headers'):
+    """Split pmax so that monthly partitions exist months_ahead into the future"""
+    partitions = get_monthly_partitions(cursor, schema, table)
+    if not partitions:
+        return []
+
+    next_start = partitions[-1][2]
+    last = add_months(month_start(datetime.now()), months_ahead)
+
+    clauses = []
+    created = []
+    while next_start <= last:
+        clauses.append(partition_clause(next_start))
+        created.append(partition_name(next_start))
+        next_start = add_months(next_start, 1)
+
+    if clauses:
+        clauses.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+        cursor.execute(
+            f"ALTER TABLE {table} REORGANIZE PARTITION {MAX_PARTITION} INTO ("
+            + ", ".join(clauses) + ")"
+        )
+        logger.info(f"Created {table} partitions: {', '.join(created)}")
+    return created
@@ -0,0 +1,43 @@
+import bisect
+import hashlib
+
+def _ring_hash(value):
+    """Stable 64-bit hash; Python's hash() differs between processes"""
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+def parse_shards(spec):
+    """Parse ORDER_SHARDS: comma-separated `database` or `host[:port]/database` entries"""
+    shards = []
+    for entry in (spec or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, port = None, None
+        database = entry
+        if '/' in entry:
+            address, database = entry.split('/', 1)
+            host, _, port = address.partition(':')
+            port = int(port) if port else None
+        shards.append({'name': entry, 'host': host, 'port': port, 'database': database})
+    return shards
+
+class ShardRouter:
+    """Consistent-hash ring mapping shard keys (user ids) to shard names.
+
+    Each shard owns `vnodes` points on the ring, so adding or removing a shard
+    only moves the keys between it and its ring neighbours (about 1/N of them),
+    and the mapping does not depend on the order shards are listed in.
+    """
+
+    def __init__(self, shards, vnodes=160):
+        if not shards:
+            raise ValueError("A shard ring needs at least one shard")
+        ring = sorted((_ring_hash(f"{shard}#{replica}"), shard) for shard in shards for replica in range(vnodes))
+        self.shards = list(shards)
+        self._points = [point for point, _ in ring]
+        self._owners = [shard for _, shard in ring]
+
+    def shard_for(self, key):
+        """Name of the shard owning a key"""
+        index = bisect.bisect(self._points, _ring_hash(str(key)))
+        return self._owners[index % len(self._owners)]
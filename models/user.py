@@ -9,6 +9,14 @@ class User:
         self.password_hash = password_hash
         self.created_at = created_at
     
+    def to_dict(self):
+        """JSON-ready representation of the user, without the password hash"""
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'created_at': self.created_at
+        }
+    
     @staticmethod
     def validate_username(username):
         """Validate username format"""
@@ -67,7 +75,7 @@ class User:
     def get_by_username(username):
         """Get user by username"""
         query = "SELECT * FROM users WHERE username = %s"
-        result = db_manager.execute_query(query, (username,), fetch=True)
+        result = db_manager.execute_query(query, (username,), fetch=True, prepared=True)
         
         if result:
             user_data = result[0]
@@ -83,7 +91,7 @@ class User:
     def get_by_id(user_id):
         """Get user by ID"""
         query = "SELECT * FROM users WHERE user_id = %s"
-        result = db_manager.execute_query(query, (user_id,), fetch=True)
+        result = db_manager.execute_query(query, (user_id,), fetch=True, prepared=True)
         
         if result:
             user_data = result[0]
@@ -102,3 +110,10 @@ class User:
         if user and user.check_password(password):
             return user
         return None
+    
+    @staticmethod
+    def get_signup_times():
+        """Get (user_id, signup UNIX timestamp) for every user"""
+        query = "SELECT user_id, UNIX_TIMESTAMP(created_at) AS signup_ts FROM users"
+        result = db_manager.execute_query(query, fetch=True)
+        return [(row['user_id'], int(row['signup_ts'] or 0)) for row in result]
@@ -0,0 +1,153 @@
+import hashlib
+from models.address import Address
+from models.database import db_manager
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HEADER_COLUMNS = ('user_id', 'address_id', 'order_timestamp', 'ingest_key')
+LINE_COLUMNS = ('order_id', 'item_id', 'quantity', 'unit_price', 'category', 'order_timestamp')
+
+def _ingest_key(source, header):
+    """Stable key for a moved order, so re-running an interrupted move never duplicates it"""
+    params = source.connect_params()
+    value = f"{params['host']}/{params['database']}/{header['order_id']}/{header['order_timestamp']}"
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+def _sources():
+    """Every database that may hold orders: the shards, plus the primary when it is not one of them"""
+    sources = db_manager.order_databases()
+    primary = db_manager.connect_params()
+    if not any((db.connect_params()['host'], db.connect_params()['database']) ==
+               (primary['host'], primary['database']) for db in sources):
+        sources.append(db_manager)
+    return sources
+
+def _target_order_ids(transaction, keys):
+    """Map ingest keys already present in the target's order_headers to their order ids"""
+    placeholders = ', '.join(['%s'] * len(keys))
+    rows = transaction.execute(
+        f"SELECT order_id, ingest_key FROM order_headers WHERE ingest_key IN ({placeholders})",
+        tuple(keys), fetch=True)
+    return {row['ingest_key']: row['order_id'] for row in rows}
+
+def _move_user_orders(source, target, user_id, batch_size):
+    """Copy a user's orders and their lines to their shard in batches, deleting each batch once committed"""
+    moved = 0
+    while True:
+        headers = source.execute_query("""
+            SELECT h.order_id, h.user_id, a.address, h.order_timestamp, h.ingest_key
+            FROM order_headers h
+            JOIN addresses a ON a.address_id = h.address_id
+            WHERE h.user_id = %s
+            ORDER BY h.order_id
+            LIMIT %s
+        """, (user_id, batch_size), fetch=True)
+        if not headers:
+            return moved
+        
+        order_ids = tuple(header['order_id'] for header in headers)
+        placeholders = ', '.join(['%s'] * len(order_ids))
+        lines = source.execute_query(
+            f"SELECT {', '.join(LINE_COLUMNS)} FROM order_items WHERE order_id IN ({placeholders})",
+            order_ids, fetch=True)
+        # Address ids are local to each database
+        address_ids = Address.get_ids(target, [header['address'] for header in headers])
+        for header in headers:
+            header['ingest_key'] = header['ingest_key'] or _ingest_key(source, header)
+            header['address_id'] = address_ids[header['address']]
+        
+        # Orders get new ids in the target; ones copied by an interrupted run are skipped
+        with target.transaction() as transaction:
+            copied = _target_order_ids(transaction, [header['ingest_key'] for header in headers])
+            new_headers = [header for header in headers if header['ingest_key'] not in copied]
+            if new_headers:
+                transaction.executemany(f"""
+                    INSERT INTO order_headers ({', '.join(HEADER_COLUMNS)})
+                    VALUES ({', '.join(['%s'] * len(HEADER_COLUMNS))})
+                """, [tuple(header[column] for column in HEADER_COLUMNS) for header in new_headers])
+                new_ids = _target_order_ids(transaction, [header['ingest_key'] for header in new_headers])
+                id_map = {header['order_id']: new_ids[header['ingest_key']] for header in new_headers}
+                new_lines = [(id_map[line['order_id']],) + tuple(line[column] for column in LINE_COLUMNS[1:])
+                             for line in lines if line['order_id'] in id_map]
+                if new_lines:
+                    transaction.executemany(f"""
+                        INSERT INTO order_items ({', '.join(LINE_COLUMNS)})
+                        VALUES ({', '.join(['%s'] * len(LINE_COLUMNS))})
+                    """, new_lines)
+        
+        with source.transaction() as transaction:
+            transaction.execute(f"DELETE FROM order_items WHERE order_id IN ({placeholders})", order_ids)
+            transaction.execute(
+                f"DELETE FROM order_headers WHERE user_id = %s AND order_id IN ({placeholders})",
+                (user_id,) + order_ids
+            )
+        moved += len(headers)
+
+def _move_address_book(source, target, user_id):
+    """Merge a user's saved addresses into their new shard and remove them from the old one.
+
+    Counts are merged with GREATEST rather than summed so a repeated run
+    never inflates them.
+    """
+    entries = source.execute_query("""
+        SELECT a.address, ua.last_used, ua.use_count
+        FROM user_addresses ua
+        JOIN addresses a ON a.address_id = ua.address_id
+        WHERE ua.user_id = %s
+    """, (user_id,), fetch=True)
+    if not entries:
+        return
+    
+    address_ids = Address.get_ids(target, [entry['address'] for entry in entries])
+    with target.transaction() as transaction:
+        transaction.executemany("""
+            INSERT INTO user_addresses (user_id, address_id, last_used, use_count)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE last_used = GREATEST(last_used, VALUES(last_used)),
+                                    use_count = GREATEST(use_count, VALUES(use_count))
+        """, [(user_id, address_ids[entry['address']], entry['last_used'], entry['use_count']) for entry in entries])
+    source.execute_query("DELETE FROM user_addresses WHERE user_id = %s", (user_id,))
+
+def rebalance_orders(batch_size=1000):
+    """Move every order to the shard that owns its user on the hash ring.
+
+    Run after turning on ORDER_SHARDS, to move orders out of the primary
+    database, and after adding or removing a shard. Only users whose owner
+    changed are touched, and rows are copied before they are deleted, so an
+    interrupted run can simply be repeated. Moved orders get new order ids
+    in their new shard, and saved addresses move along with their user.
+    """
+    if not db_manager.sharded:
+        logger.warning("ORDER_SHARDS is not configured, nothing to rebalance")
+        return 0
+    
+    moved = 0
+    for source in _sources():
+        try:
+            user_ids = [row['user_id'] for row in
+                        source.execute_query("""
+                            SELECT user_id FROM order_headers
+                            UNION
+                            SELECT user_id FROM user_addresses
+                        """, fetch=True)]
+        except Exception as e:
+            logger.warning(f"Skipping {source.connect_params()['database']}: {e}")
+            continue
+        
+        for user_id in user_ids:
+            target = db_manager.for_user(user_id)
+            if target is source:
+                continue
+            count = _move_user_orders(source, target, user_id, batch_size)
+            _move_address_book(source, target, user_id)
+            logger.info(f"Moved {count} order(s) of user {user_id} from "
+                        f"{source.connect_params()['database']} to {target.connect_params()['database']}")
+            moved += count
+    
+    logger.info(f"Rebalance completed, {moved} order(s) moved")
+    return moved
+
+if __name__ == '__main__':
+    rebalance_orders()
@@ -0,0 +1,318 @@
+"""
+Offline order report generator.
+
+Splits [--from, --to) into partitions: the archived order files in the range,
+then one partition per calendar month and order database for orders still in
+MySQL. Partitions are aggregated in a process pool; live months are read with
+an unbuffered (streaming) cursor whose date range prunes the scan to that
+month's table partition. Each finished partition is saved under the output
+directory, so re-running an interrupted report only aggregates the missing
+ones. The merged per-item, per-category and per-day totals are written as CSV
+files plus a static HTML report with charts.
+
+Usage: python report_orders.py [--from 2025-01-01] [--to 2026-01-01] [--workers 4] [--out DIR] [--fresh]
+"""
+
+from config import Config
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from models.archive import database_label, order_archive, TIMESTAMP_FORMAT
+from models.database import db_manager
+from models.item import Item
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import mysql.connector
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Order line columns read from MySQL and from the archive, in this order
+LINE_COLUMNS = ('order_id', 'user_id', 'item_id', 'quantity', 'unit_price', 'category', 'order_timestamp')
+
+# Both tables are partitioned by order_timestamp, so the range on each prunes it to one month
+LIVE_QUERY = """
+    SELECT h.order_id, h.user_id, l.item_id, l.quantity, l.unit_price, l.category, h.order_timestamp
+    FROM order_headers h
+    JOIN order_items l ON l.order_id = h.order_id AND l.order_timestamp = h.order_timestamp
+    WHERE h.order_timestamp >= %s AND h.order_timestamp < %s
+      AND l.order_timestamp >= %s AND l.order_timestamp < %s
+"""
+
+DAY_FORMAT = '%Y-%m-%d'
+# Longest item list drawn in the HTML report; the CSV has every item
+CHART_ITEMS = 20
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def plan_partitions(start, end):
+    """Split [start, end) into archived partitions and live (database, month) partitions"""
+    partitions = []
+    for name, entry in order_archive.partitions_between(start, end):
+        part_start = max(start, datetime.strptime(entry['start'], TIMESTAMP_FORMAT))
+        part_end = min(end, datetime.strptime(entry['end'], TIMESTAMP_FORMAT))
+        partitions.append({'key': f"archive-{name}-{part_start:%Y%m%d}-{part_end:%Y%m%d}",
+                           'archive': name, 'start': part_start, 'end': part_end})
+
+    # Archival moves whole months, so everything from a database's own horizon on is still in it
+    for orders_db in db_manager.order_databases():
+        label = database_label(orders_db)
+        horizon = order_archive.horizon(label if db_manager.sharded else None)
+        month = max(start, horizon) if horizon else start
+        while month < end:
+            part_end = min(_next_month(month), end)
+            partitions.append({'key': f"{label}-{month:%Y%m%d}-{part_end:%Y%m%d}",
+                               'database': orders_db.connect_params(), 'start': month, 'end': part_end})
+            month = part_end
+    return partitions
+
+def _stream_live(params, start, end, fetch_size):
+    """Yield a month's order lines from one database without holding them all in memory"""
+    connection = mysql.connector.connect(**params)
+    try:
+        # Unbuffered: rows are read off the socket as they are fetched
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(LIVE_QUERY, (start, end, start, end))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+    finally:
+        connection.close()
+
+def aggregate_lines(rows):
+    """Totals of (order_id, user_id, item_id, quantity, unit_price, category, order_timestamp) rows.
+
+    Order ids are only unique within one database, so rows must come from one
+    partition; an order's lines never span two partitions.
+    """
+    items, categories, days = {}, {}, {}
+    orders, users, item_orders, category_orders = set(), set(), set(), set()
+    lines = quantity_total = 0
+    revenue_total = 0.0
+    for order_id, user_id, item_id, quantity, unit_price, category, order_timestamp in rows:
+        revenue = float(unit_price) * quantity if unit_price is not None else 0.0
+        category = category or ''
+        day = days.setdefault(order_timestamp.strftime(DAY_FORMAT), [0, 0, 0.0])
+        if order_id not in orders:
+            orders.add(order_id)
+            users.add(user_id)
+            day[0] += 1
+        day[1] += quantity
+        day[2] += revenue
+
+        item = items.setdefault(str(item_id), [0, 0, 0.0])
+        item[0] += quantity
+        item[2] += revenue
+        if (item_id, order_id) not in item_orders:
+            item_orders.add((item_id, order_id))
+            item[1] += 1
+
+        group = categories.setdefault(category, [0, 0, 0.0])
+        group[0] += quantity
+        group[2] += revenue
+        if (category, order_id) not in category_orders:
+            category_orders.add((category, order_id))
+            group[1] += 1
+
+        lines += 1
+        quantity_total += quantity
+        revenue_total += revenue
+    return {'orders': len(orders), 'lines': lines, 'quantity': quantity_total, 'revenue': revenue_total,
+            'users': sorted(users), 'items': items, 'categories': categories, 'days': days}
+
+def aggregate_partition(partition, fetch_size):
+    """Aggregate one partition; runs in a worker process and returns only the small totals"""
+    started = time.perf_counter()
+    if 'archive' in partition:
+        rows = order_archive.iter_partition(partition['archive'], LINE_COLUMNS, partition['start'], partition['end'])
+    else:
+        rows = _stream_live(partition['database'], partition['start'], partition['end'], fetch_size)
+    partial = aggregate_lines(rows)
+    partial['seconds'] = round(time.perf_counter() - started, 2)
+    return partial
+
+def merge_partials(partials):
+    """Add up partition totals; customers are counted once across partitions"""
+    merged = {'orders': 0, 'lines': 0, 'quantity': 0, 'revenue': 0.0, 'items': {}, 'categories': {}, 'days': {}}
+    users = set()
+    for partial in partials:
+        for field in ('orders', 'lines', 'quantity', 'revenue'):
+            merged[field] += partial[field]
+        users.update(partial['users'])
+        for group in ('items', 'categories', 'days'):
+            for key, values in partial[group].items():
+                total = merged[group].setdefault(key, [0] * len(values))
+                for index, value in enumerate(values):
+                    total[index] += value
+    merged['customers'] = len(users)
+    return merged
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def run_partitions(partitions, parts_dir, workers, fetch_size, fresh=False):
+    """Aggregate the partitions not saved by an earlier run and return every partition's totals"""
+    os.makedirs(parts_dir, exist_ok=True)
+    partials, pending = {}, []
+    for partition in partitions:
+        path = os.path.join(parts_dir, f"{partition['key']}.json")
+        if not fresh and os.path.exists(path):
+            with open(path, 'r') as f:
+                partials[partition['key']] = json.load(f)
+        else:
+            pending.append(partition)
+    logger.info(f"{len(partitions)} partition(s), {len(partials)} done by an earlier run, "
+                f"{len(pending)} to aggregate with {workers} worker(s)")
+
+    started = datetime.now()
+    failed = []
+    def finish(partition, partial):
+        # A month that can still receive orders is aggregated again on the next run
+        if partition['end'] <= started:
+            _write_json(os.path.join(parts_dir, f"{partition['key']}.json"), partial)
+        partials[partition['key']] = partial
+        logger.info(f"Partition {partition['key']}: {partial['lines']} line(s) in {partial['seconds']}s "
+                    f"({len(partials)}/{len(partitions)})")
+
+    if workers > 1 and len(pending) > 1:
+        # Spawned, not forked, as in services/cohorts.py
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(aggregate_partition, partition, fetch_size): partition
+                       for partition in pending}
+            for future in as_completed(futures):
+                try:
+                    finish(futures[future], future.result())
+                except Exception as e:
+                    logger.error(f"Partition {futures[future]['key']} failed: {e}")
+                    failed.append(futures[future]['key'])
+    else:
+        for partition in pending:
+            try:
+                finish(partition, aggregate_partition(partition, fetch_size))
+            except Exception as e:
+                logger.error(f"Partition {partition['key']} failed: {e}")
+                failed.append(partition['key'])
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} partition(s) failed; run again to resume with only those")
+    return [partials[partition['key']] for partition in partitions]
+
+def report_rows(merged, start, end, items):
+    """CSV-ready item, category and day rows; items maps item_id to (name, current category)"""
+    item_rows = []
+    for item_id, (quantity, orders, revenue) in merged['items'].items():
+        name, category = items.get(int(item_id), (f"Deleted item #{item_id}", ''))
+        item_rows.append({'item_id': int(item_id), 'item_name': name, 'category': category,
+                          'quantity': quantity, 'orders': orders, 'revenue': round(revenue, 2)})
+    item_rows.sort(key=lambda row: (-row['revenue'], -row['quantity'], row['item_id']))
+
+    category_rows = [{'category': category or 'Uncategorized', 'quantity': quantity, 'orders': orders,
+                      'revenue': round(revenue, 2)}
+                     for category, (quantity, orders, revenue) in merged['categories'].items()]
+    category_rows.sort(key=lambda row: -row['revenue'])
+
+    # Every day of the range, including days without orders
+    day_rows = []
+    day = start
+    while day < end:
+        orders, quantity, revenue = merged['days'].get(day.strftime(DAY_FORMAT), (0, 0, 0.0))
+        day_rows.append({'date': day.strftime(DAY_FORMAT), 'orders': orders, 'quantity': quantity,
+                         'revenue': round(revenue, 2),
+                         'average_order_value': round(revenue / orders, 2) if orders else 0.0})
+        day += timedelta(days=1)
+    return item_rows, category_rows, day_rows
+
+def _write_csv(path, rows, columns):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def _bars(rows, label_key, value_key):
+    """Bar lengths as percentages of the largest value, for the HTML charts"""
+    largest = max((row[value_key] for row in rows), default=0) or 1
+    return [{'label': row[label_key], 'value': row[value_key], 'percent': round(100.0 * row[value_key] / largest, 2)}
+            for row in rows]
+
+def write_report(out_dir, merged, start, end, items):
+    """Write items.csv, categories.csv, daily.csv and report.html; returns the HTML path"""
+    item_rows, category_rows, day_rows = report_rows(merged, start, end, items)
+    _write_csv(os.path.join(out_dir, 'items.csv'), item_rows,
+               ['item_id', 'item_name', 'category', 'quantity', 'orders', 'revenue'])
+    _write_csv(os.path.join(out_dir, 'categories.csv'), category_rows, ['category', 'quantity', 'orders', 'revenue'])
+    _write_csv(os.path.join(out_dir, 'daily.csv'), day_rows,
+               ['date', 'orders', 'quantity', 'revenue', 'average_order_value'])
+
+    environment = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                   'templates')),
+                              autoescape=select_autoescape(['html']))
+    html = environment.get_template('reports/orders_report.html').render(
+        start=start.strftime(DAY_FORMAT),
+        end=(end - timedelta(days=1)).strftime(DAY_FORMAT),
+        generated=datetime.now().strftime(TIMESTAMP_FORMAT),
+        totals={'orders': merged['orders'], 'customers': merged['customers'], 'quantity': merged['quantity'],
+                'revenue': round(merged['revenue'], 2),
+                'average_order_value': round(merged['revenue'] / merged['orders'], 2) if merged['orders'] else 0.0},
+        daily=_bars(day_rows, 'date', 'revenue'),
+        top_items=_bars(item_rows[:CHART_ITEMS], 'item_name', 'revenue'),
+        categories=_bars(category_rows, 'category', 'revenue'),
+        item_rows=item_rows[:CHART_ITEMS],
+        category_rows=category_rows)
+    path = os.path.join(out_dir, 'report.html')
+    with open(path, 'w') as f:
+        f.write(html)
+    return path
+
+def generate_report(start, end, out_dir=None, workers=None, fetch_size=None, fresh=False):
+    """Build the report for orders placed in [start, end) and return its output directory"""
+    started = time.perf_counter()
+    out_dir = out_dir or os.path.join(Config.REPORT_DIR, f"orders-{start:%Y%m%d}-{end:%Y%m%d}")
+    workers = workers or Config.REPORT_WORKERS
+    fetch_size = fetch_size or Config.REPORT_FETCH_SIZE
+
+    partitions = plan_partitions(start, end)
+    partials = run_partitions(partitions, os.path.join(out_dir, 'partitions'), workers, fetch_size, fresh)
+    merged = merge_partials(partials)
+    items = {item.item_id: (item.item_name, item.category) for item in Item.get_all_items()}
+    path = write_report(out_dir, merged, start, end, items)
+    logger.info(f"Report of {merged['orders']} order(s) written to {path} in {time.perf_counter() - started:.1f}s")
+    return out_dir
+
+def _parse_day(value):
+    return datetime.strptime(value, DAY_FORMAT)
+
+def main():
+    # Default range: the last twelve full calendar months
+    this_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    year_ago = this_month.replace(year=this_month.year - 1)
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--from', dest='start', type=_parse_day, default=year_ago,
+                        help='first day of the range, YYYY-MM-DD')
+    parser.add_argument('--to', dest='end', type=_parse_day, default=this_month,
+                        help='day after the range, YYYY-MM-DD')
+    parser.add_argument('--workers', type=int, default=Config.REPORT_WORKERS)
+    parser.add_argument('--fetch-size', type=int, default=Config.REPORT_FETCH_SIZE)
+    parser.add_argument('--out', help='output directory; re-use it to resume an interrupted report')
+    parser.add_argument('--fresh', action='store_true', help='ignore partitions saved by an earlier run')
+    args = parser.parse_args()
+    if args.end <= args.start:
+        parser.error('--to must be after --from')
+
+    generate_report(args.start, args.end, args.out, args.workers, args.fetch_size, args.fresh)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,10 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, current_app
+from config import Config
 from models.order import Order
 from routes.auth import login_required
+from services.jobs import job_queue
+from services.tasks import read_snapshot, request_analytics_refresh, cohort_snapshot_name
+from services.fragment_cache import data_version
 
 analytics_bp = Blueprint('analytics', __name__)
 
@@ -14,15 +18,21 @@ def analytics_dashboard():
         popular_dishes = Order.get_popular_dishes(5)
         orders_per_day = Order.get_orders_per_day(7)
         orders_by_category = Order.get_orders_by_category()
+        revenue = Order.get_revenue_summary()
         
         return render_template('analytics.html', 
                              total_orders=total_orders,
+                             total_revenue=revenue['total_revenue'],
+                             average_order_value=revenue['average_order_value'],
                              popular_dishes=popular_dishes,
+                             popular_dishes_version=data_version(popular_dishes),
                              orders_per_day=orders_per_day,
                              orders_by_category=orders_by_category)
     except Exception as e:
         return render_template('analytics.html', 
                              total_orders=0,
+                             total_revenue=0,
+                             average_order_value=0,
                              popular_dishes=[],
                              orders_per_day=[],
                              orders_by_category=[],
@@ -58,23 +68,51 @@ def api_orders_by_category():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@analytics_bp.route('/api/analytics/revenue_per_day')
+@login_required
+def api_revenue_per_day():
+    """API endpoint for revenue and average order value per day"""
+    try:
+        revenue_per_day = Order.get_revenue_per_day(7)
+        return jsonify(revenue_per_day)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @analytics_bp.route('/api/analytics/summary')
 @login_required
 def api_analytics_summary():
     """API endpoint for analytics summary"""
     try:
-        total_orders = Order.get_total_orders()
-        popular_dishes = Order.get_popular_dishes(5)
-        orders_per_day = Order.get_orders_per_day(7)
-        orders_by_category = Order.get_orders_by_category()
+        # Serve the summary precomputed by the background worker when it is fresh
+        snapshot = read_snapshot('analytics_summary', Config.ANALYTICS_SNAPSHOT_TTL)
+        if snapshot:
+            return current_app.response_class(snapshot, mimetype='application/json')
         
-        summary = {
-            'total_orders': total_orders,
-            'popular_dishes': popular_dishes,
-            'orders_per_day': orders_per_day,
-            'orders_by_category': orders_by_category
-        }
+        request_analytics_refresh(delay=0)
+        return jsonify(Order.get_analytics_summary())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@analytics_bp.route('/api/analytics/cohorts')
+@login_required
+def api_cohorts():
+    """API endpoint for retention cohorts, computed once a day by the background worker"""
+    try:
+        snapshot = read_snapshot(cohort_snapshot_name(), 2 * 24 * 3600)
+        if snapshot:
+            return current_app.response_class(snapshot, mimetype='application/json')
         
-        return jsonify(summary)
+        job_id = job_queue.enqueue('refresh_cohorts', dedupe_key='refresh_cohorts')
+        return jsonify({'status': 'pending', 'job_id': job_id}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@analytics_bp.route('/api/analytics/export', methods=['POST'])
+@login_required
+def api_export_orders():
+    """Queue a CSV export of all orders and return the job id"""
+    try:
+        job_id = job_queue.enqueue('export_orders')
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
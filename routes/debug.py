@@ -0,0 +1,78 @@
+from flask import Blueprint, render_template, current_app, send_from_directory, abort, request, jsonify
+from routes.menu import admin_required
+from services import admission, metrics, profiling
+from services.event_log import event_log
+import os
+import re
+
+debug_bp = Blueprint('debug', __name__)
+
+@debug_bp.route('/profiles')
+@admin_required
+def profiles():
+    """List recent request profiles"""
+    return render_template('debug/profiles.html',
+                           profiles=profiling.list_profiles(current_app),
+                           profile_header=profiling.PROFILE_HEADER,
+                           profile_token=profiling.make_profile_token(current_app),
+                           sample_rate=current_app.config['PROFILE_SAMPLE_RATE'])
+
+@debug_bp.route('/profiles/<name>.folded')
+@admin_required
+def download_profile(name):
+    """Download a profile's collapsed stacks"""
+    if not re.fullmatch(r'[A-Za-z0-9_.-]+', name):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILE_DIR'], f"{name}.folded",
+                               mimetype='text/plain', as_attachment=True)
+
+def _perf_window():
+    windows = current_app.config['PERF_WINDOWS']
+    window = request.args.get('window', windows[0], type=int)
+    return window if window in windows else windows[0]
+
+@debug_bp.route('/perf')
+@admin_required
+def perf():
+    """Per-endpoint latency percentiles for this worker process"""
+    window = _perf_window()
+    endpoints = sorted(metrics.request_metrics.summarize(window).items(),
+                       key=lambda item: item[1]['requests'], reverse=True)
+    return render_template('debug/perf.html',
+                           endpoints=endpoints,
+                           window=window,
+                           windows=current_app.config['PERF_WINDOWS'],
+                           in_flight=metrics.request_metrics.in_flight(),
+                           admission=admission.admission.get_stats() if admission.admission else None,
+                           pid=os.getpid())
+
+@debug_bp.route('/api/perf')
+@admin_required
+def api_perf():
+    """API endpoint for per-endpoint latency percentiles"""
+    try:
+        window = _perf_window()
+        return jsonify({
+            'pid': os.getpid(),
+            'window_seconds': window,
+            'in_flight': metrics.request_metrics.in_flight(),
+            'endpoints': metrics.request_metrics.summarize(window),
+            'admission': admission.admission.get_stats() if admission.admission else None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@debug_bp.route('/api/events')
+@admin_required
+def api_events():
+    """Replay change events from an offset, with the log end and consumers' committed offsets"""
+    try:
+        offset = request.args.get('offset', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        return jsonify({
+            'events': event_log.read(offset, limit),
+            'end_offset': event_log.end_offset(),
+            'consumers': event_log.committed_offsets()
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
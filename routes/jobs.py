@@ -0,0 +1,32 @@
+from flask import Blueprint, request, jsonify
+from routes.auth import login_required
+from services.jobs import job_queue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/api/jobs')
+@login_required
+def api_jobs():
+    """API endpoint listing recent background jobs and queue stats"""
+    try:
+        status = request.args.get('status', '').strip() or None
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        return jsonify({
+            'stats': job_queue.get_stats(),
+            'jobs': job_queue.list_jobs(status, limit),
+            'schedules': job_queue.list_schedules()
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@jobs_bp.route('/api/jobs/<int:job_id>')
+@login_required
+def api_job_status(job_id):
+    """API endpoint for a single job's status"""
+    try:
+        job = job_queue.get_job(job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
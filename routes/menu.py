@@ -1,7 +1,11 @@
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, request, render_template, redirect, url_for, flash, session, jsonify, Response, stream_with_context
+from config import Config
 from models.item import Item
 from routes.auth import login_required
-import re
+from services import menu_catalog, menu_io
+from services.images import ImageError
+from services.tasks import request_analytics_refresh, request_image_caching
+import time
 
 menu_bp = Blueprint('menu', __name__)
 
@@ -18,6 +22,18 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def get_item_payload():
+    """Item fields from a JSON body, or from a multipart form carrying an uploaded image file"""
+    if request.files or request.form:
+        data = request.form.to_dict()
+        try:
+            data['price'] = float(data['price']) if data.get('price') else None
+        except ValueError:
+            data['price'] = None
+        upload = request.files.get('image')
+        return data, upload.read() if upload and upload.filename else None
+    return request.get_json(), None
+
 @menu_bp.route('/menu')
 @admin_required
 def manage_menu():
@@ -33,8 +49,7 @@ def manage_menu():
             items = Item.get_all_items()
         
         # Get unique categories for filter dropdown
-        categories = list(set([item.category for item in Item.get_all_items() if item.category]))
-        categories.sort()
+        _, categories = Item.get_catalog()
         
         return render_template('menu/manage_menu.html', 
                              items=items, 
@@ -50,26 +65,14 @@ def manage_menu():
 def add_item():
     """Add a new menu item"""
     try:
-        data = request.get_json()
+        data, image_data = get_item_payload()
         
         # Validate input
-        item_name = data.get('item_name', '').strip()
-        category = data.get('category', '').strip()
-        price = data.get('price')
-        image_url = data.get('image_url', '').strip()
-        
-        if not item_name:
-            return jsonify({'error': 'Item name is required'}), 400
-        
-        if not category:
-            return jsonify({'error': 'Category is required'}), 400
-        
-        if not price or not isinstance(price, (int, float)) or price <= 0:
-            return jsonify({'error': 'Valid price is required'}), 400
-        
-        # Validate price format
-        if not re.match(r'^\d+(\.\d{1,2})?$', str(price)):
-            return jsonify({'error': 'Price must be a valid number with up to 2 decimal places'}), 400
+        valid, fields = Item.validate_item(data)
+        if not valid:
+            return jsonify({'error': fields}), 400
+        item_name, category, price, image_url = (fields['item_name'], fields['category'],
+                                                 fields['price'], fields['image_url'])
         
         # Check if item name already exists
         existing_item = Item.get_by_name(item_name)
@@ -77,10 +80,15 @@ def add_item():
             return jsonify({'error': 'Item with this name already exists'}), 400
         
         # Create item
-        Item.create_item(item_name, category, price, image_url if image_url else None)
+        Item.create_item(item_name, category, price, image_url, image_data)
+        request_analytics_refresh()
+        if image_url and image_data is None:
+            request_image_caching()
         
         return jsonify({'message': 'Item added successfully'}), 201
         
+    except ImageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Error adding item: {str(e)}'}), 500
 
@@ -89,26 +97,14 @@ def add_item():
 def edit_item(item_id):
     """Edit an existing menu item"""
     try:
-        data = request.get_json()
+        data, image_data = get_item_payload()
         
         # Validate input
-        item_name = data.get('item_name', '').strip()
-        category = data.get('category', '').strip()
-        price = data.get('price')
-        image_url = data.get('image_url', '').strip()
-        
-        if not item_name:
-            return jsonify({'error': 'Item name is required'}), 400
-        
-        if not category:
-            return jsonify({'error': 'Category is required'}), 400
-        
-        if not price or not isinstance(price, (int, float)) or price <= 0:
-            return jsonify({'error': 'Valid price is required'}), 400
-        
-        # Validate price format
-        if not re.match(r'^\d+(\.\d{1,2})?$', str(price)):
-            return jsonify({'error': 'Price must be a valid number with up to 2 decimal places'}), 400
+        valid, fields = Item.validate_item(data)
+        if not valid:
+            return jsonify({'error': fields}), 400
+        item_name, category, price, image_url = (fields['item_name'], fields['category'],
+                                                 fields['price'], fields['image_url'])
         
         # Check if item exists
         existing_item = Item.get_by_id(item_id)
@@ -121,10 +117,15 @@ def edit_item(item_id):
             return jsonify({'error': 'Item with this name already exists'}), 400
         
         # Update item
-        Item.update_item(item_id, item_name, category, price, image_url if image_url else None)
+        Item.update_item(item_id, item_name, category, price, image_url, image_data)
+        request_analytics_refresh()
+        if image_url and image_data is None and image_url != existing_item.image_url:
+            request_image_caching()
         
         return jsonify({'message': 'Item updated successfully'}), 200
         
+    except ImageError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': f'Error updating item: {str(e)}'}), 500
 
@@ -140,19 +141,87 @@ def delete_item(item_id):
         
         # Delete item
         Item.delete_item(item_id)
+        request_analytics_refresh()
         
         return jsonify({'message': 'Item deleted successfully'}), 200
         
     except Exception as e:
         return jsonify({'error': f'Error deleting item: {str(e)}'}), 500
 
+@menu_bp.route('/menu/import', methods=['POST'])
+@admin_required
+def import_items():
+    """Create or update many menu items from a CSV or JSON file.
+
+    Takes a multipart `file` upload or the file as the request body. Every
+    row is validated first; valid rows are upserted by item name and the
+    rest are listed in the per-row error report. ?dry_run=1 only validates.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload:
+            data = upload.read()
+            file_format = menu_io.detect_format(upload.filename, upload.mimetype)
+        else:
+            data = request.get_data()
+            file_format = menu_io.detect_format(mimetype=request.mimetype)
+        file_format = request.args.get('format', file_format)
+        dry_run = request.args.get('dry_run') in ('1', 'true')
+        
+        started = time.perf_counter()
+        rows = menu_io.parse_items(data, file_format)
+        items, errors = menu_io.validate_rows(rows)
+        
+        result = {'rows': len(rows), 'valid': len(items), 'created': 0, 'updated': 0,
+                  'dry_run': dry_run, 'errors': errors}
+        if items and not dry_run:
+            result.update(Item.upsert_items(items, Config.MENU_IMPORT_BATCH_SIZE))
+            request_analytics_refresh()
+            request_image_caching()
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        
+        return jsonify(result), 200
+        
+    except menu_io.ImportFormatError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error importing items: {str(e)}'}), 500
+
+@menu_bp.route('/menu/export')
+@admin_required
+def export_items():
+    """Stream every menu item as CSV or JSON, in the format the import takes"""
+    file_format = request.args.get('format', 'csv')
+    if file_format not in menu_io.FORMATS:
+        return jsonify({'error': 'Format must be csv or json'}), 400
+    
+    generate = menu_io.export_json if file_format == 'json' else menu_io.export_csv
+    response = Response(stream_with_context(generate(Item.iter_items())), mimetype=menu_io.FORMATS[file_format])
+    response.headers['Content-Disposition'] = f"attachment; filename=menu-{time.strftime('%Y%m%d')}.{file_format}"
+    return response
+
 @menu_bp.route('/menu/categories')
 def get_categories():
     """Get all unique categories"""
     try:
-        items = Item.get_all_items()
-        categories = list(set([item.category for item in items if item.category]))
-        categories.sort()
+        _, categories = Item.get_catalog()
         return jsonify({'categories': categories})
     except Exception as e:
         return jsonify({'error': f'Error fetching categories: {str(e)}'}), 500
+
+@menu_bp.route('/api/catalog')
+@login_required
+def api_catalog():
+    """The whole menu as compact JSON with a version hash, for the browser's menu cache"""
+    try:
+        version, body = menu_catalog.get_catalog()
+        if request.if_none_match.contains(version):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype='application/json')
+        response.set_etag(version)
+        # Browsers must revalidate, which costs a 304 while the menu is unchanged
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Error fetching catalog: {str(e)}'}), 500
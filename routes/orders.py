@@ -1,7 +1,11 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session, jsonify
+from models.address import Address
 from models.order import Order
 from models.item import Item
 from routes.auth import login_required
+from services import menu_catalog
+from services.cooccurrence import related_items
+from services.tasks import request_analytics_refresh
 import json
 
 orders_bp = Blueprint('orders', __name__)
@@ -14,30 +18,52 @@ def home():
         # Get category filter from query parameter
         category_filter = request.args.get('category', '').strip()
         
-        if category_filter:
-            # Filter items by category
-            all_items = Item.get_all_items()
-            filtered_items = [item for item in all_items if item.category == category_filter]
-            
-            # Group filtered items by category
-            items_by_category = {}
-            for item in filtered_items:
-                if item.category not in items_by_category:
-                    items_by_category[item.category] = []
-                items_by_category[item.category].append(item)
-        else:
-            # Get all items grouped by category
-            items_by_category = Item.get_items_by_category()
-        
-        # Get all categories for filter buttons
-        all_items = Item.get_all_items()
-        categories = list(set([item.category for item in all_items if item.category]))
-        categories.sort()
+        # The whole menu and its categories, from this process's catalog cache
+        all_items, categories = Item.get_catalog()
+        
+        # Group items by category, keeping only the selected one if any
+        items_by_category = {}
+        for item in all_items:
+            if category_filter and item.category != category_filter:
+                continue
+            if item.category not in items_by_category:
+                items_by_category[item.category] = []
+            items_by_category[item.category].append(item)
+        
+        # "Customers also ordered", looked up only when the menu grid is re-rendered
+        index = related_items.index
+        item_names = {item.item_id: item.item_name for item in all_items}
+        def also_ordered(item_id):
+            return [item_names[other_id] for other_id, _ in index.related(item_id) if other_id in item_names]
+        
+        # Browsers holding the current catalog render the grid themselves; only the related ids are sent
+        catalog_version, _ = menu_catalog.get_catalog()
+        client_menu = request.cookies.get(menu_catalog.COOKIE_NAME) == catalog_version
+        related_ids = {}
+        if client_menu:
+            for items in items_by_category.values():
+                for item in items:
+                    related = [other_id for other_id, _ in index.related(item.item_id) if other_id in item_names]
+                    if related:
+                        related_ids[item.item_id] = related
+        
+        # Saved addresses to pick from; the menu still renders if they cannot be loaded
+        try:
+            saved_addresses = Address.get_user_addresses(session['user_id'])
+        except Exception:
+            saved_addresses = []
         
         return render_template('home.html', 
                              items_by_category=items_by_category,
+                             saved_addresses=saved_addresses,
                              categories=categories,
-                             selected_category=category_filter)
+                             selected_category=category_filter,
+                             menu_version=Item.get_menu_version(),
+                             also_ordered=also_ordered,
+                             related_version=index.version,
+                             catalog_version=catalog_version,
+                             client_menu=client_menu,
+                             related_ids=related_ids)
     except Exception as e:
         flash(f'Error loading menu: {str(e)}', 'error')
         return render_template('home.html', items_by_category={}, categories=[], selected_category='')
@@ -62,14 +88,13 @@ def place_order():
         
         user_id = session['user_id']
         
-        # Process each item in cart
-        for item in cart_items:
-            item_id = item.get('item_id')
-            quantity = item.get('quantity', 0)
-            
-            if quantity > 0:
-                Order.create_order(user_id, item_id, quantity, delivery_address)
+        # The whole cart is placed as one order
+        lines = [(item.get('item_id'), item.get('quantity', 0)) for item in cart_items
+                 if item.get('quantity', 0) > 0]
+        Order.place_order(user_id, lines, delivery_address)
         
+        related_items.record_cart(item_id for item_id, _ in lines)
+        request_analytics_refresh()
         return jsonify({"message": "Order placed successfully!"}), 200
         
     except ValueError as e:
@@ -100,15 +125,16 @@ def all_orders():
         flash(f'Error loading orders: {str(e)}', 'error')
         return render_template('all_orders.html', orders=[])
 
-@orders_bp.route('/delete_order/<int:order_id>', methods=['POST'])
+@orders_bp.route('/delete_order/<int:line_id>', methods=['POST'])
 @login_required
-def delete_order(order_id):
-    """Delete an order"""
+def delete_order(line_id):
+    """Delete an order line"""
     try:
         user_id = session['user_id']
-        success = Order.delete_order(order_id, user_id)
+        success = Order.delete_order(line_id, user_id)
         
         if success:
+            request_analytics_refresh()
             flash('Order deleted successfully!', 'success')
         else:
             flash('Order not found or you do not have permission to delete it.', 'error')
@@ -119,10 +145,10 @@ def delete_order(order_id):
         flash(f'Error deleting order: {str(e)}', 'error')
         return redirect(url_for('orders.view_orders'))
 
-@orders_bp.route('/edit_order/<int:order_id>', methods=['GET', 'POST'])
+@orders_bp.route('/edit_order/<int:line_id>', methods=['GET', 'POST'])
 @login_required
-def edit_order(order_id):
-    """Edit an order"""
+def edit_order(line_id):
+    """Edit an order line"""
     try:
         user_id = session['user_id']
         
@@ -130,9 +156,10 @@ def edit_order(order_id):
             quantity = request.form.get('quantity')
             delivery_address = request.form.get('delivery_address', '').strip()
             
-            success = Order.update_order(order_id, user_id, quantity, delivery_address)
+            success = Order.update_order(line_id, user_id, quantity, delivery_address)
             
             if success:
+                request_analytics_refresh()
                 flash('Order updated successfully!', 'success')
                 return redirect(url_for('orders.view_orders'))
             else:
@@ -143,7 +170,7 @@ def edit_order(order_id):
         order_to_edit = None
         
         for order in orders:
-            if order.order_id == order_id:
+            if order.line_id == line_id:
                 order_to_edit = order
                 break
         
@@ -166,22 +193,29 @@ def api_orders():
     """API endpoint to get orders for AJAX requests"""
     try:
         user_id = session['user_id']
-        orders = Order.get_user_orders(user_id)
-        
-        # Convert orders to JSON-serializable format
-        orders_data = []
-        for order in orders:
-            orders_data.append({
-                'order_id': order.order_id,
-                'item_name': order.item_name,
-                'quantity': order.quantity,
-                'delivery_address': order.delivery_address,
-                'order_timestamp': order.order_timestamp.strftime('%Y-%m-%d %H:%M:%S') if order.order_timestamp else None,
-                'category': order.category,
-                'price': float(order.price) if order.price else 0
-            })
-        
-        return jsonify(orders_data)
+        # Rows go straight to the JSON encoder without building Order objects
+        return jsonify(Order.get_user_order_rows(user_id))
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@orders_bp.route('/api/addresses')
+@login_required
+def api_addresses():
+    """API endpoint for the current user's saved delivery addresses"""
+    try:
+        addresses = Address.get_user_addresses(session['user_id'])
+        return jsonify([address.to_dict() for address in addresses])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@orders_bp.route('/api/addresses/<int:address_id>', methods=['DELETE'])
+@login_required
+def forget_address(address_id):
+    """Remove an address from the current user's address book"""
+    try:
+        if not Address.forget(session['user_id'], address_id):
+            return jsonify({"error": "Address not found"}), 404
+        return jsonify({"message": "Address removed"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Production server for the Zomato-like App.
+
+Runs the app factory under gunicorn's pre-fork model with threaded workers
+(gthread). Worker and thread counts are derived from the CPU count and the
+MySQL connection budget, and each worker's connection pool is sized to its
+thread count so a request thread never waits for a connection.
+
+    python serve.py                 # start
+    kill -HUP <master pid>          # graceful reload (new workers start, old ones drain)
+    kill -TERM <master pid>         # graceful shutdown
+"""
+
+from config import Config
+from gunicorn.app.base import BaseApplication
+import logging
+import multiprocessing
+import os
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# mysql-connector refuses pools larger than this
+MAX_POOL_SIZE = 32
+
+def pool_size_for(threads):
+    """Connections each worker needs: one per request thread, plus one for the order flusher"""
+    extra = 1 if Config.ORDER_INGEST_MODE == 'buffered' else 0
+    return min(threads + extra, MAX_POOL_SIZE)
+
+def concurrency_settings():
+    """Work out (workers, threads, pool_size) from the environment and hardware"""
+    threads = min(Config.WEB_THREADS, MAX_POOL_SIZE)
+    pool_size = pool_size_for(threads)
+
+    if Config.WEB_WORKERS:
+        workers = Config.WEB_WORKERS
+    else:
+        # Classic 2 x cores + 1, capped so every worker's pool fits in MySQL's connection budget
+        workers = multiprocessing.cpu_count() * 2 + 1
+        workers = max(1, min(workers, Config.DB_MAX_CONNECTIONS // pool_size))
+    return workers, threads, pool_size
+
+class ProductionServer(BaseApplication):
+    """Gunicorn application wrapping create_app()"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from app import create_app
+        
+        class ServerConfig(Config):
+            # Set before create_app so everything sized from the pool (e.g. admission control) agrees
+            DB_POOL_SIZE = self.options['pool_size']
+        
+        return create_app(ServerConfig)
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} booted")
+
+def post_worker_init(worker):
+    """Warm the worker up before it accepts connections; it stays unready on /readyz if this runs long"""
+    from services.warmup import warmup
+    warmup.start(worker.wsgi)
+    # Workers that do not heartbeat within WEB_TIMEOUT are killed, so never wait that long
+    if not warmup.wait(min(Config.WARMUP_TIMEOUT, Config.WEB_TIMEOUT / 2)):
+        worker.log.warning(f"Worker {worker.pid} still warming up, accepting connections anyway")
+
+def main():
+    workers, threads, pool_size = concurrency_settings()
+    options = {
+        'bind': Config.WEB_BIND,
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': threads,
+        # Without preloading, HUP reloads application code too. Preloading is safe
+        # either way because DB pools are only created inside workers.
+        'preload_app': Config.WEB_PRELOAD,
+        'max_requests': Config.WEB_MAX_REQUESTS,
+        'max_requests_jitter': Config.WEB_MAX_REQUESTS_JITTER,
+        'keepalive': Config.WEB_KEEPALIVE,
+        'timeout': Config.WEB_TIMEOUT,
+        'graceful_timeout': Config.WEB_GRACEFUL_TIMEOUT,
+        'backlog': 2048,
+        'worker_tmp_dir': '/dev/shm' if os.path.isdir('/dev/shm') else None,
+        'accesslog': '-',
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'pool_size': pool_size,
+    }
+    logger.info(f"Starting {workers} worker(s) x {threads} thread(s), "
+                f"DB pool {pool_size} per worker, on {Config.WEB_BIND}")
+    ProductionServer(options).run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+from flask import g, request, jsonify, render_template, make_response
+from fnmatch import fnmatch
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+LOW = 'low'
+PRIORITIES = (CRITICAL, NORMAL, LOW)
+
+# Reasons a request is shed
+CAPACITY = 'capacity'
+ENDPOINT_LIMIT = 'endpoint_limit'
+QUEUE_TIME = 'queue_time'
+
+def parse_mapping(spec, value_type=int):
+    """Parse 'key=value,key=value' settings"""
+    mapping = {}
+    for entry in (spec or '').split(','):
+        if '=' in entry:
+            key, value = entry.split('=', 1)
+            mapping[key.strip()] = value_type(value.strip())
+    return mapping
+
+def parse_patterns(spec):
+    return [pattern.strip() for pattern in (spec or '').split(',') if pattern.strip()]
+
+def upstream_queue_ms(header, now=None):
+    """Time a request spent queued before reaching the app, from an X-Request-Start header.
+
+    Accepts the common 't=<seconds>', milli- and microsecond epoch formats;
+    returns 0 when the header is missing or malformed.
+    """
+    if not header:
+        return 0.0
+    try:
+        started = float(header.strip().lstrip('t='))
+    except ValueError:
+        return 0.0
+    # Normalise to seconds from whatever unit the proxy used
+    while started > 1e11:
+        started /= 1000.0
+    return max(0.0, ((now or time.time()) - started) * 1000)
+
+class AdmissionController:
+    """Concurrency limiter with priority classes and per-endpoint caps.
+
+    Each priority may only use its share of the worker's slots, so when the
+    app is saturated low-priority work is turned away first and critical
+    requests keep the remaining headroom. Requests wait for a slot at most
+    for what is left of their queue-time budget.
+    """
+
+    def __init__(self, capacity, shares, endpoint_limits=None):
+        self.capacity = capacity
+        self.limits = {priority: max(1, int(capacity * shares.get(priority, 1.0))) for priority in PRIORITIES}
+        self.endpoint_limits = endpoint_limits or {}
+        self.in_use = 0
+        self._priority_in_use = {priority: 0 for priority in PRIORITIES}
+        self._endpoint_in_use = {}
+        self._stats = {}
+        self._cond = threading.Condition()
+
+    def _blocked(self, endpoint, priority):
+        if self.in_use >= self.limits[priority]:
+            return CAPACITY
+        limit = self.endpoint_limits.get(endpoint)
+        if limit is not None and self._endpoint_in_use.get(endpoint, 0) >= limit:
+            return ENDPOINT_LIMIT
+        return None
+
+    def _endpoint_stats(self, endpoint, priority):
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = {'priority': priority, 'admitted': 0, 'waited': 0,
+                                             CAPACITY: 0, ENDPOINT_LIMIT: 0, QUEUE_TIME: 0}
+        return stats
+
+    def acquire(self, endpoint, priority, timeout):
+        """Take a slot, waiting up to timeout seconds; returns None or the reason for shedding"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            stats = self._endpoint_stats(endpoint, priority)
+            waited = False
+            while True:
+                reason = self._blocked(endpoint, priority)
+                if reason is None:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    stats[reason] += 1
+                    return reason
+                waited = True
+                self._cond.wait(remaining)
+
+            self.in_use += 1
+            self._priority_in_use[priority] += 1
+            self._endpoint_in_use[endpoint] = self._endpoint_in_use.get(endpoint, 0) + 1
+            stats['admitted'] += 1
+            stats['waited'] += waited
+            return None
+
+    def release(self, endpoint, priority):
+        with self._cond:
+            self.in_use -= 1
+            self._priority_in_use[priority] -= 1
+            self._endpoint_in_use[endpoint] -= 1
+            self._cond.notify_all()
+
+    def reject(self, endpoint, priority, reason):
+        """Count a request shed before it asked for a slot"""
+        with self._cond:
+            self._endpoint_stats(endpoint, priority)[reason] += 1
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'capacity': self.capacity,
+                'in_use': self.in_use,
+                'limits': dict(self.limits),
+                'priority_in_use': dict(self._priority_in_use),
+                'endpoint_limits': dict(self.endpoint_limits),
+                'endpoints': {endpoint: dict(stats, in_use=self._endpoint_in_use.get(endpoint, 0))
+                              for endpoint, stats in self._stats.items()}
+            }
+
+def _shed_response(retry_after):
+    if '/api/' in request.path or request.accept_mimetypes.best == 'application/json':
+        response = make_response(jsonify({"error": "The service is busy, please retry shortly"}), 503)
+    else:
+        response = make_response(render_template('errors/503.html'), 503)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def init_app(app):
+    """Shed load per endpoint and priority before requests reach the views"""
+    global admission
+    if not app.config['ADMISSION_ENABLED']:
+        return
+
+    capacity = app.config['ADMISSION_MAX_CONCURRENT'] or app.config['DB_POOL_SIZE']
+    admission = AdmissionController(
+        capacity,
+        {CRITICAL: 1.0, NORMAL: app.config['ADMISSION_NORMAL_SHARE'], LOW: app.config['ADMISSION_LOW_SHARE']},
+        parse_mapping(app.config['ADMISSION_ENDPOINT_LIMITS'])
+    )
+    critical = parse_patterns(app.config['ADMISSION_CRITICAL_ENDPOINTS'])
+    low = parse_patterns(app.config['ADMISSION_LOW_ENDPOINTS'])
+    exempt = parse_patterns(app.config['ADMISSION_EXEMPT_ENDPOINTS'])
+    budgets = parse_mapping(app.config['ADMISSION_QUEUE_BUDGET_MS'], float)
+    retry_after = app.config['ADMISSION_RETRY_AFTER']
+    priorities = {}
+
+    def priority_for(endpoint):
+        """Priority class of an endpoint, or None when it is exempt"""
+        if endpoint in priorities:
+            return priorities[endpoint]
+        if any(fnmatch(endpoint, pattern) for pattern in exempt):
+            priority = None
+        elif any(fnmatch(endpoint, pattern) for pattern in critical):
+            priority = CRITICAL
+        elif any(fnmatch(endpoint, pattern) for pattern in low):
+            priority = LOW
+        else:
+            priority = NORMAL
+        priorities[endpoint] = priority
+        return priority
+
+    @app.before_request
+    def admit_request():
+        endpoint = request.endpoint
+        priority = priority_for(endpoint) if endpoint else None
+        if priority is None:
+            return None
+
+        budget_ms = budgets.get(priority, budgets.get(NORMAL, 1000.0))
+        queued_ms = upstream_queue_ms(request.headers.get('X-Request-Start'))
+        if queued_ms >= budget_ms:
+            # The client has likely given up already; do not spend a slot on it
+            admission.reject(endpoint, priority, QUEUE_TIME)
+            reason = QUEUE_TIME
+        else:
+            reason = admission.acquire(endpoint, priority, (budget_ms - queued_ms) / 1000.0)
+        if reason:
+            logger.warning(f"Shed {request.method} {request.path} ({endpoint}, {priority}): {reason}")
+            return _shed_response(retry_after)
+        g.admission = (endpoint, priority)
+        return None
+
+    @app.teardown_request
+    def release_slot(exc):
+        slot = g.pop('admission', None)
+        if slot is not None:
+            admission.release(*slot)
+
+# Replaced with the app's settings by init_app; None while admission control is off
+admission = None
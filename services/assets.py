@@ -0,0 +1,86 @@
+from flask import Blueprint, current_app, request, send_file, url_for, abort
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Third-party files vendored into static/vendor by build_assets.py, with their upstream source
+VENDOR_ASSETS = {
+    'vendor/chart.umd.min.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js'
+}
+
+# Source files processed by the asset pipeline
+SOURCE_ASSETS = ['css/style.css', 'js/main.js'] + list(VENDOR_ASSETS)
+
+DIST_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Precompressed variants, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+assets_bp = Blueprint('assets', __name__)
+
+def dist_folder(app):
+    return os.path.join(app.static_folder, DIST_DIRNAME)
+
+def load_manifest(app):
+    """Load the {source path: fingerprinted path} manifest written by build_assets.py"""
+    path = os.path.join(dist_folder(app), MANIFEST_NAME)
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def asset_url(path):
+    """URL for a static asset, fingerprinted when the asset pipeline has been run"""
+    hashed = current_app.extensions['asset_manifest'].get(path)
+    if hashed:
+        return url_for('assets.serve_asset', filename=hashed)
+    if path in VENDOR_ASSETS and not os.path.exists(os.path.join(current_app.static_folder, path)):
+        return VENDOR_ASSETS[path]
+    return url_for('static', filename=path)
+
+@assets_bp.route('/<path:filename>')
+def serve_asset(filename):
+    """Serve a fingerprinted asset, preferring a precompressed variant the client accepts"""
+    folder = dist_folder(current_app)
+    path = os.path.realpath(os.path.join(folder, filename))
+    if not path.startswith(os.path.realpath(folder) + os.sep) or not os.path.isfile(path):
+        abort(404)
+
+    accepted = request.accept_encodings
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if accepted[name] and os.path.isfile(path + suffix):
+            encoding = name
+            break
+
+    if encoding:
+        response = send_file(path + dict(ENCODINGS)[encoding], mimetype=_mimetype(filename), conditional=True)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_file(path, mimetype=_mimetype(filename), conditional=True)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+def _mimetype(filename):
+    if filename.endswith('.js'):
+        return 'application/javascript'
+    if filename.endswith('.css'):
+        return 'text/css'
+    return None
+
+def init_app(app):
+    """Register the fingerprinted asset route and the asset_url template helper"""
+    manifest = load_manifest(app)
+    if not manifest:
+        logger.info("No asset manifest found, serving unversioned static files (run build_assets.py)")
+    app.extensions['asset_manifest'] = manifest
+    app.register_blueprint(assets_bp, url_prefix='/assets')
+    app.add_template_global(asset_url, 'asset_url')
@@ -0,0 +1,182 @@
+from config import Config
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from models.order import Order
+from models.user import User
+import logging
+import multiprocessing
+import numpy as np
+import time
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+WEEK_SECONDS = 7 * DAY_SECONDS
+# 1970-01-01 was a Thursday; shifting by four days makes weeks start on Monday
+WEEK_SHIFT = 4 * DAY_SECONDS
+# (user_id, week) pairs are packed into one int64 as user_id << WEEK_BITS | week
+WEEK_BITS = 20
+NO_ORDER = -1
+GAP_BUCKETS = ((0, 1, '< 1 day'), (1, 7, '1-7 days'), (7, 14, '1-2 weeks'),
+               (14, 30, '2-4 weeks'), (30, np.inf, '30+ days'))
+
+def week_index(timestamps):
+    """Monday-based week number of UNIX timestamps"""
+    return (np.asarray(timestamps, dtype=np.int64) - WEEK_SHIFT) // WEEK_SECONDS
+
+def week_start(index):
+    return date(1970, 1, 5) + timedelta(weeks=int(index))
+
+def first_two_orders(user_ids, timestamps):
+    """Per user, sorted by user id: (user_ids, first, second, count); second is NO_ORDER for one-time users"""
+    if not len(user_ids):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    order = np.lexsort((timestamps, user_ids))
+    users, times = user_ids[order], timestamps[order]
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    counts = np.diff(np.r_[starts, len(users)])
+    second = np.where(counts > 1, times[np.minimum(starts + 1, len(times) - 1)], NO_ORDER)
+    return users[starts], times[starts], second, counts
+
+def _range_partial(start, end, chunk_days):
+    """Per-user aggregates for orders placed in [start, end), pulled in chunk_days chunks.
+
+    Runs in a worker process; returns only small arrays so little is pickled.
+    """
+    user_chunks, time_chunks = [], []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days), end)
+        times = Order.get_order_times(chunk_start, chunk_end)
+        if times:
+            pairs = np.array(times, dtype=np.int64)
+            user_chunks.append(pairs[:, 0])
+            time_chunks.append(pairs[:, 1])
+        chunk_start = chunk_end
+
+    if not user_chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return {'users': empty, 'first': empty, 'second': empty, 'counts': empty, 'activity': empty}
+
+    user_ids = np.concatenate(user_chunks)
+    timestamps = np.concatenate(time_chunks)
+    users, first, second, counts = first_two_orders(user_ids, timestamps)
+    activity = np.unique((user_ids << WEEK_BITS) | week_index(timestamps))
+    return {'users': users, 'first': first, 'second': second, 'counts': counts, 'activity': activity}
+
+def _merge_partials(partials):
+    """Combine per-range aggregates into per-user totals and the set of active (user, week) pairs"""
+    users = np.concatenate([p['users'] for p in partials])
+    first = np.concatenate([p['first'] for p in partials])
+    second = np.concatenate([p['second'] for p in partials])
+    counts = np.concatenate([p['counts'] for p in partials])
+
+    # A user's overall first two orders are among the first two of every range
+    has_second = second != NO_ORDER
+    merged_users, merged_first, merged_second, _ = first_two_orders(
+        np.concatenate([users, users[has_second]]), np.concatenate([first, second[has_second]]))
+    totals = np.zeros(len(merged_users), dtype=np.int64)
+    np.add.at(totals, np.searchsorted(merged_users, users), counts)
+
+    activity = np.unique(np.concatenate([p['activity'] for p in partials]))
+    return merged_users, merged_first, merged_second, totals, activity
+
+def _date_ranges(first_order, now, parts):
+    """Split [first_order, now) into up to `parts` contiguous ranges of whole days"""
+    start = datetime.combine(first_order.date(), datetime.min.time())
+    end = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    days = (end - start).days
+    step = max(1, -(-days // parts))
+    return [(start + timedelta(days=offset), min(start + timedelta(days=offset + step), end))
+            for offset in range(0, days, step)]
+
+def _retention_matrix(activity, signup_users, signup_weeks, current_week, weeks):
+    """Cohort sizes and active-user counts for the last `weeks` signup-week cohorts"""
+    first_cohort = current_week - weeks + 1
+    if not len(signup_users):
+        return first_cohort, np.zeros(weeks, dtype=np.int64), np.zeros((weeks, weeks), dtype=np.int64)
+    order = np.argsort(signup_users)
+    signup_users, signup_weeks = signup_users[order], signup_weeks[order]
+
+    active_users = activity >> WEEK_BITS
+    active_weeks = activity & ((1 << WEEK_BITS) - 1)
+    index = np.minimum(np.searchsorted(signup_users, active_users), len(signup_users) - 1)
+    known = signup_users[index] == active_users
+    cohort_week = signup_weeks[index[known]]
+    rows = cohort_week - first_cohort
+    offsets = active_weeks[known] - cohort_week
+    keep = (rows >= 0) & (rows < weeks) & (offsets >= 0) & (offsets < weeks)
+
+    matrix = np.bincount(rows[keep] * weeks + offsets[keep], minlength=weeks * weeks).reshape(weeks, weeks)
+    cohort_rows = signup_weeks - first_cohort
+    sizes = np.bincount(cohort_rows[(cohort_rows >= 0) & (cohort_rows < weeks)], minlength=weeks)
+    return first_cohort, sizes, matrix
+
+def compute_cohorts(now=None, weeks=None, workers=None):
+    """Repeat-order rate, time to second order and weekly retention by signup-week cohort"""
+    started = time.perf_counter()
+    now = now or datetime.now()
+    weeks = weeks or Config.COHORT_WEEKS
+    workers = workers or Config.COHORT_WORKERS
+
+    signups = User.get_signup_times()
+    signup_users = np.array([user_id for user_id, _ in signups], dtype=np.int64)
+    signup_weeks = week_index([signup_ts for _, signup_ts in signups])
+
+    first_order = Order.get_first_order_time()
+    ranges = _date_ranges(first_order, now, workers * 2) if first_order else []
+    if workers > 1 and len(ranges) > 1:
+        # Spawned, not forked: the caller may be a threaded server or job worker
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            partials = list(executor.map(_range_partial, *zip(*ranges),
+                                         [Config.COHORT_CHUNK_DAYS] * len(ranges)))
+    else:
+        partials = [_range_partial(start, end, Config.COHORT_CHUNK_DAYS) for start, end in ranges]
+
+    if not partials:
+        partials = [_range_partial(now, now, 1)]
+    users, first, second, totals, activity = _merge_partials(partials)
+
+    repeaters = second != NO_ORDER
+    gaps = (second[repeaters] - first[repeaters]) / DAY_SECONDS
+    bucket_edges = [low for low, _, _ in GAP_BUCKETS] + [np.inf]
+    bucket_counts = np.histogram(gaps, bins=bucket_edges)[0] if len(gaps) else np.zeros(len(GAP_BUCKETS))
+
+    current_week = int(week_index([int(now.timestamp())])[0])
+    first_cohort, sizes, matrix = _retention_matrix(activity, signup_users, signup_weeks, current_week, weeks)
+    cohorts = []
+    for row in range(weeks):
+        size = int(sizes[row])
+        observed = current_week - (first_cohort + row) + 1
+        cohorts.append({
+            'week': week_start(first_cohort + row).isoformat(),
+            'size': size,
+            # Weeks that have not happened yet for this cohort are None
+            'retention': [round(100.0 * int(matrix[row, offset]) / size, 1) if size else 0.0
+                          for offset in range(observed)] + [None] * (weeks - observed)
+        })
+
+    customers = int(len(users))
+    repeat_customers = int(repeaters.sum())
+    result = {
+        'as_of': now.date().isoformat(),
+        'users': int(len(signup_users)),
+        'customers': customers,
+        'repeat_customers': repeat_customers,
+        'repeat_rate': round(100.0 * repeat_customers / customers, 1) if customers else 0.0,
+        'orders_per_customer': round(float(totals.mean()), 2) if customers else 0.0,
+        'time_to_second_order': {
+            'median_days': round(float(np.median(gaps)), 1) if len(gaps) else None,
+            'p75_days': round(float(np.percentile(gaps, 75)), 1) if len(gaps) else None,
+            'mean_days': round(float(gaps.mean()), 1) if len(gaps) else None,
+            'buckets': [{'label': label, 'customers': int(count)}
+                        for (_, _, label), count in zip(GAP_BUCKETS, bucket_counts)]
+        },
+        'weeks': weeks,
+        'cohorts': cohorts
+    }
+    logger.info(f"Computed cohorts for {customers} customers over {len(ranges)} range(s) "
+                f"in {time.perf_counter() - started:.2f}s")
+    return result
@@ -0,0 +1,153 @@
+from config import Config
+from datetime import datetime, timedelta
+from itertools import combinations
+from models.order import Order
+from services.tasks import read_snapshot, snapshot_mtime
+import heapq
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = 'cooccurrence'
+
+class CooccurrenceIndex:
+    """Sparse item x item counts of how often two items were ordered in one cart.
+
+    Each item's top related items are kept precomputed and are replaced, never
+    mutated, so related() is a dictionary lookup readers can do without locking.
+    Counts only grow, which lets add_cart() keep the top lists exact by
+    touching just the pairs in the new cart.
+    """
+
+    def __init__(self, top_n, counts=None, carts=0):
+        self.top_n = top_n
+        self.carts = carts
+        self.version = 0
+        self._counts = counts or {}
+        self._top = {item_id: self._top_of(row) for item_id, row in self._counts.items()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_carts(cls, carts, top_n):
+        counts = {}
+        for cart in carts:
+            for a, b in combinations(sorted(cart), 2):
+                row = counts.setdefault(a, {})
+                row[b] = row.get(b, 0) + 1
+                row = counts.setdefault(b, {})
+                row[a] = row.get(a, 0) + 1
+        return cls(top_n, counts, len(carts))
+
+    def _top_of(self, row):
+        return tuple(heapq.nsmallest(self.top_n, ((other_id, count) for other_id, count in row.items()),
+                                     key=lambda entry: (-entry[1], entry[0])))
+
+    def _bump(self, item_id, other_id):
+        row = self._counts.setdefault(item_id, {})
+        count = row[other_id] = row.get(other_id, 0) + 1
+
+        top = self._top.get(item_id, ())
+        ranked = any(entry[0] == other_id for entry in top)
+        if not ranked and len(top) >= self.top_n and (-count, other_id) > (-top[-1][1], top[-1][0]):
+            return False
+        entries = [entry for entry in top if entry[0] != other_id] + [(other_id, count)]
+        entries.sort(key=lambda entry: (-entry[1], entry[0]))
+        self._top[item_id] = tuple(entries[:self.top_n])
+        return True
+
+    def add_cart(self, item_ids):
+        """Count every pair of distinct items in a newly placed cart"""
+        items = sorted(set(item_ids))
+        with self._lock:
+            self.carts += 1
+            changed = False
+            for a, b in combinations(items, 2):
+                changed = self._bump(a, b) | changed
+                changed = self._bump(b, a) | changed
+            if changed:
+                self.version += 1
+
+    def related(self, item_id):
+        """((item_id, count), ...) most often ordered together with item_id, best first"""
+        return self._top.get(item_id, ())
+
+    def to_dict(self):
+        with self._lock:
+            return {'top_n': self.top_n, 'carts': self.carts,
+                    'counts': {item_id: dict(row) for item_id, row in self._counts.items()}}
+
+    @classmethod
+    def from_dict(cls, data, top_n):
+        counts = {int(item_id): {int(other_id): count for other_id, count in row.items()}
+                  for item_id, row in data['counts'].items()}
+        return cls(top_n, counts, data['carts'])
+
+    def get_stats(self):
+        return {'items': len(self._counts),
+                'pairs': sum(len(row) for row in self._counts.values()) // 2,
+                'carts': self.carts}
+
+def build_index(now=None):
+    """Build the index from the carts of the last COOCCURRENCE_LOOKBACK_DAYS"""
+    started = time.perf_counter()
+    since = (now or datetime.now()) - timedelta(days=Config.COOCCURRENCE_LOOKBACK_DAYS)
+    carts = Order.get_carts(since)
+    index = CooccurrenceIndex.from_carts(carts, Config.COOCCURRENCE_TOP_N)
+    stats = index.get_stats()
+    logger.info(f"Built co-occurrence index of {stats['pairs']} pairs from {stats['carts']} carts "
+                f"in {time.perf_counter() - started:.2f}s")
+    return index
+
+class RelatedItems:
+    """This process's copy of the index.
+
+    The refresh_cooccurrence job rebuilds the index from the database and
+    stores it as a snapshot; each process reloads it when it changes and
+    folds in the carts it takes itself in the meantime.
+    """
+
+    def __init__(self):
+        self._index = CooccurrenceIndex(Config.COOCCURRENCE_TOP_N)
+        self._snapshot_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + Config.COOCCURRENCE_RELOAD_SECONDS
+            mtime = snapshot_mtime(SNAPSHOT_NAME)
+            if mtime is None or mtime == self._snapshot_mtime:
+                return
+            body = read_snapshot(SNAPSHOT_NAME, float('inf'))
+            if body is None:
+                return
+            index = CooccurrenceIndex.from_dict(json.loads(body), Config.COOCCURRENCE_TOP_N)
+            # Keep cache keys derived from the version moving forward across reloads
+            index.version = self._index.version + 1
+            self._index = index
+            self._snapshot_mtime = mtime
+
+    @property
+    def index(self):
+        try:
+            self._maybe_reload()
+        except Exception as e:
+            logger.error(f"Failed to load co-occurrence index: {e}")
+        return self._index
+
+    def record_cart(self, item_ids):
+        """Count a cart placed through this process; never fails the caller"""
+        try:
+            self.index.add_cart(int(item_id) for item_id in item_ids)
+        except Exception as e:
+            logger.error(f"Failed to record cart in co-occurrence index: {e}")
+
+related_items = RelatedItems()
@@ -0,0 +1,303 @@
+from config import Config
+from bisect import bisect_right
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_NAME = re.compile(r'^(\d{20})\.log$')
+CONSUMER_NAME = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+class EventLog:
+    """Append-only, host-local log of order and menu changes.
+
+    Each event is one JSON line {"offset", "ts", "type", "data"}. Offsets start
+    at 0 and increase by one per event across every process on the host;
+    appends are serialized with an flock on the log directory. Segment files
+    are named after the offset of their first event, so the segment holding
+    any offset is found from the directory listing alone, and a new segment
+    is started once the current one reaches segment_bytes.
+
+    Events are appended after the database commit, so a crash in between can
+    lose an event but the log never holds a change that was rolled back.
+    """
+
+    def __init__(self, directory, segment_bytes=None, fsync=None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes or Config.EVENT_LOG_SEGMENT_BYTES
+        self.fsync = Config.EVENT_LOG_FSYNC if fsync is None else fsync
+        self._lock = threading.Lock()
+        self._pid = None
+        # (segment base offset, size in bytes, next offset) as last seen by this process
+        self._tail = None
+        self._fd = None
+
+    def _segment_path(self, base):
+        return os.path.join(self.directory, f"{base:020d}.log")
+
+    def _segments(self):
+        """Base offsets of the existing segments, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(match.group(1)) for match in map(SEGMENT_NAME.match, names) if match)
+
+    # Writing
+
+    def _open(self):
+        """(Re)open the lock file for this process; flock ownership does not survive fork"""
+        if self._pid == os.getpid():
+            return
+        os.makedirs(os.path.join(self.directory, 'consumers'), exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, 'append.lock'), 'a')
+        self._tail = None
+        self._fd = None
+        self._pid = os.getpid()
+
+    def _recover_tail(self):
+        """Find the active segment and the next offset; caller holds the flock.
+
+        Only bytes appended since this process last looked are read, so
+        catching up with other writers costs one small read.
+        """
+        segments = self._segments()
+        base = segments[-1] if segments else 0
+        path = self._segment_path(base)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = 0
+        if self._tail and self._tail[:2] == (base, size):
+            return self._tail
+
+        start, next_offset = 0, base
+        if self._tail and self._tail[0] == base and self._tail[1] < size:
+            start, next_offset = self._tail[1], self._tail[2]
+        if size > start:
+            with open(path, 'rb+') as f:
+                f.seek(start)
+                data = f.read()
+                if not data.endswith(b'\n'):
+                    # Torn by a writer that died mid-append: end the line so readers skip it
+                    f.write(b'\n')
+                    size += 1
+            for line in data.splitlines():
+                try:
+                    next_offset = json.loads(line)['offset'] + 1
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return base, size, next_offset
+
+    def _write(self, base, data):
+        if self._fd is None or self._fd[0] != base:
+            if self._fd is not None:
+                os.close(self._fd[1])
+            self._fd = (base, os.open(self._segment_path(base), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644))
+        os.write(self._fd[1], data)
+        if self.fsync:
+            os.fsync(self._fd[1])
+
+    def append_many(self, events):
+        """Append (type, data) events in order as one write; returns their offsets"""
+        if not events:
+            return []
+        with self._lock:
+            self._open()
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                base, size, next_offset = self._recover_tail()
+                if size >= self.segment_bytes:
+                    base, size = next_offset, 0
+                ts = int(time.time() * 1000)
+                data = ''.join(
+                    json.dumps({'offset': next_offset + index, 'ts': ts, 'type': event_type, 'data': data},
+                               separators=(',', ':'), default=str) + '\n'
+                    for index, (event_type, data) in enumerate(events)).encode('utf-8')
+                self._write(base, data)
+                self._tail = (base, size + len(data), next_offset + len(events))
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        return list(range(next_offset, next_offset + len(events)))
+
+    def append(self, event_type, data):
+        """Append one event; returns its offset"""
+        return self.append_many([(event_type, data)])[0]
+
+    def end_offset(self):
+        """Offset the next appended event will get"""
+        with self._lock:
+            self._open()
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._tail = self._recover_tail()
+                return self._tail[2]
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    # Reading
+
+    def _read(self, offset, limit, position=None):
+        """Read up to limit events at or after offset.
+
+        position is a (segment base, byte position) hint from a previous read
+        that ended just before offset, letting sequential readers skip the
+        scan from the start of the segment. Returns (events, position).
+        """
+        segments = self._segments()
+        if not segments:
+            return [], None
+        index = max(bisect_right(segments, offset) - 1, 0)
+        if offset < segments[0]:
+            logger.warning(f"Events before offset {segments[0]} were pruned; reading from there")
+
+        events = []
+        for base in segments[index:]:
+            start = position[1] if position and position[0] == base else 0
+            try:
+                f = open(self._segment_path(base), 'rb')
+            except FileNotFoundError:
+                # Pruned since the listing
+                continue
+            with f:
+                f.seek(start)
+                while len(events) < limit:
+                    line = f.readline()
+                    if not line.endswith(b'\n'):
+                        # End of the segment, or an append still being written
+                        break
+                    position = (base, f.tell())
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if event['offset'] >= offset:
+                        events.append(event)
+            if len(events) >= limit:
+                break
+        return events, position
+
+    def read(self, offset=0, limit=1000):
+        """Events at or after offset, oldest first; use to replay from any retained offset"""
+        return self._read(offset, limit)[0]
+
+    # Consumers
+
+    def consumer(self, name):
+        """A named consumer whose committed offset survives restarts"""
+        return Consumer(self, name)
+
+    def _offset_path(self, name):
+        return os.path.join(self.directory, 'consumers', f"{name}.json")
+
+    def committed_offsets(self):
+        """{consumer name: committed offset} for every consumer that has committed"""
+        offsets = {}
+        try:
+            names = os.listdir(os.path.join(self.directory, 'consumers'))
+        except FileNotFoundError:
+            return offsets
+        for name in names:
+            if name.endswith('.json'):
+                try:
+                    with open(self._offset_path(name[:-5]), 'r') as f:
+                        offsets[name[:-5]] = json.load(f)['offset']
+                except (FileNotFoundError, ValueError):
+                    continue
+        return offsets
+
+    # Retention
+
+    def prune(self, max_age):
+        """Delete sealed segments last written more than max_age seconds ago; returns how many"""
+        segments = self._segments()
+        removed = 0
+        # The newest segment is never removed, it carries the next offset
+        for base in segments[:-1]:
+            path = self._segment_path(base)
+            try:
+                if time.time() - os.stat(path).st_mtime > max_age:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            first = self._segments()[0]
+            for name, offset in self.committed_offsets().items():
+                if offset < first:
+                    logger.warning(f"Event consumer {name} at offset {offset} lost pruned events")
+        return removed
+
+class Consumer:
+    """Reads the event log from its committed offset.
+
+    poll() advances an in-memory position; commit() stores it, so after a
+    restart the consumer resumes with the first event it had not committed.
+    Processing is therefore at-least-once between a poll and its commit.
+    """
+
+    def __init__(self, log, name):
+        if not CONSUMER_NAME.match(name):
+            raise ValueError(f"Invalid consumer name: {name}")
+        self.log = log
+        self.name = name
+        self.offset = self.committed()
+        self._position = None
+
+    def committed(self):
+        """Stored offset of the next event to process; 0 for a new consumer"""
+        try:
+            with open(self.log._offset_path(self.name), 'r') as f:
+                return json.load(f)['offset']
+        except FileNotFoundError:
+            return 0
+
+    def poll(self, limit=100):
+        """Next events after the current position, at most limit of them"""
+        events, position = self.log._read(self.offset, limit, self._position)
+        if events:
+            self.offset = events[-1]['offset'] + 1
+        if position:
+            self._position = position
+        return events
+
+    def seek(self, offset):
+        """Move the position, e.g. back to replay events; takes effect for poll, not until commit"""
+        self.offset = offset
+        self._position = None
+
+    def commit(self, offset=None):
+        """Atomically store offset, by default the position after the last polled event"""
+        offset = self.offset if offset is None else offset
+        path = self.log._offset_path(self.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'offset': offset, 'committed_at': int(time.time())}, f)
+        os.replace(tmp_path, path)
+
+# Global change log, shared by every process on this host through the directory
+event_log = EventLog(Config.EVENT_LOG_DIR)
+
+def emit(event_type, data):
+    """Append a change event after a committed write; never fails the caller"""
+    if not Config.EVENT_LOG_ENABLED:
+        return
+    try:
+        event_log.append(event_type, data)
+    except Exception as e:
+        logger.error(f"Failed to log {event_type} event: {e}")
+
+def emit_many(events):
+    """Append several change events in one write; never fails the caller"""
+    if not Config.EVENT_LOG_ENABLED:
+        return
+    try:
+        event_log.append_many(events)
+    except Exception as e:
+        logger.error(f"Failed to log {len(events)} change event(s): {e}")
@@ -0,0 +1,55 @@
+from config import Config
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.runtime import Undefined
+from services.lru import LRUCache
+import hashlib
+
+class FragmentCacheExtension(Extension):
+    """Jinja tag caching the rendered body under a key built from its arguments.
+
+        {% cache 'menu_grid', menu_version, selected_category %}
+            ...
+        {% endcache %}
+
+    Fragments are shared across users and requests, so only wrap markup that
+    depends on nothing but the key parts. If any key part is undefined or
+    None the body is rendered without caching.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        # Several blocks can share a line, so number them within the template
+        index = getattr(parser, '_fragment_cache_index', 0) + 1
+        parser._fragment_cache_index = index
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.Const((parser.name, index)), nodes.List(parts)]),
+            [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, location, parts, caller):
+        if any(part is None or isinstance(part, Undefined) for part in parts):
+            return caller()
+        key = location + tuple(parts)
+        cached = fragment_cache.get(key)
+        if cached is None:
+            cached = caller()
+            fragment_cache.set(key, cached)
+        return cached
+
+def data_version(rows):
+    """Short digest of query results, for keying fragments rendered from them"""
+    return hashlib.sha1(repr(rows).encode('utf-8')).hexdigest()[:16]
+
+def init_app(app):
+    """Enable the {% cache %} tag in the app's templates"""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+# Global fragment cache shared by all templates in the process
+fragment_cache = LRUCache(Config.FRAGMENT_CACHE_SIZE)
@@ -0,0 +1,245 @@
+from flask import Blueprint, abort, send_file, url_for
+from config import Config
+from functools import lru_cache
+from PIL import Image, ImageOps
+from services.assets import IMMUTABLE_CACHE_CONTROL
+import functools
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import logging
+import os
+import re
+import socket
+import urllib.parse
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+# Variant formats, in srcset order: WebP for browsers that take it, JPEG for the rest
+FORMATS = (('webp', 'WEBP', 'image/webp'), ('jpg', 'JPEG', 'image/jpeg'))
+
+VARIANT_NAME = re.compile(r'^([0-9a-f]{64})-(\d+)\.(webp|jpg)$')
+
+images_bp = Blueprint('images', __name__)
+
+class ImageError(ValueError):
+    """The supplied bytes are not an image this pipeline can use"""
+
+def _key_dir(key):
+    return os.path.join(Config.IMAGE_CACHE_DIR, key[:2])
+
+def _meta_path(key):
+    return os.path.join(_key_dir(key), f"{key}.json")
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _target_widths(width):
+    """Configured widths not wider than the original; at least one variant is always made"""
+    widths = sorted(w for w in Config.IMAGE_WIDTHS if w < width)
+    if width <= max(Config.IMAGE_WIDTHS):
+        widths.append(width)
+    return widths or [width]
+
+def ingest_bytes(data):
+    """Store resized variants of an image and return its content key.
+
+    The key is the SHA-256 of the original bytes, so the same picture
+    uploaded twice or shared by several items is processed and stored once.
+    """
+    if len(data) > Config.IMAGE_MAX_BYTES:
+        raise ImageError(f"Image is larger than {Config.IMAGE_MAX_BYTES} bytes")
+    key = hashlib.sha256(data).hexdigest()
+    if load_meta(key):
+        return key
+
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            if probe.width * probe.height > Config.IMAGE_MAX_PIXELS:
+                raise ImageError(f"Image is larger than {Config.IMAGE_MAX_PIXELS} pixels")
+            image = ImageOps.exif_transpose(probe)
+            image.load()
+    except ImageError:
+        raise
+    except Exception as e:
+        logger.warning(f"Rejected image {key[:12]}: {e}")
+        raise ImageError('Not a readable image file')
+
+    # Flatten transparency onto white, JPEG has no alpha channel
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA').split()[-1])
+        image = background
+    else:
+        image = image.convert('RGB')
+
+    os.makedirs(_key_dir(key), exist_ok=True)
+    widths = _target_widths(image.width)
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for extension, pil_format, _ in FORMATS:
+            out = io.BytesIO()
+            resized.save(out, pil_format, quality=Config.IMAGE_QUALITY, optimize=True)
+            _write_atomic(os.path.join(_key_dir(key), f"{key}-{width}.{extension}"), out.getvalue())
+
+    # Written last: a key only counts as ingested once every variant exists
+    meta = {'widths': widths, 'width': image.width, 'height': image.height}
+    _write_atomic(_meta_path(key), json.dumps(meta).encode('utf-8'))
+    logger.info(f"Stored {len(widths)} image variant size(s) for {key[:12]}")
+    return key
+
+def check_destination(url):
+    """Refuse URLs that are not http(s) or whose host resolves to a non-public address.
+
+    Image URLs come from users, so without this the server could be made to
+    request localhost, private networks or the cloud metadata endpoint.
+    Returns the vetted address, which the connection must use.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+        raise ImageError('Only http and https image URLs can be fetched')
+    default_port = 443 if parts.scheme.lower() == 'https' else 80
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or default_port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ImageError(f"Cannot resolve image host {parts.hostname}")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if (address.is_loopback or address.is_private or address.is_link_local or address.is_reserved
+                or address.is_multicast or address.is_unspecified or not address.is_global):
+            raise ImageError(f"Image host {parts.hostname} is not a public address")
+    return addresses[0][4][0]
+
+class _PinnedConnection:
+    """Connects to the address check_destination vetted instead of resolving the host again.
+
+    The host name is kept for the Host header and, over HTTPS, for SNI and
+    certificate checks, so a host that re-resolves elsewhere (DNS rebinding)
+    cannot redirect the connection.
+    """
+
+    def __init__(self, *args, address, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = lambda target, *rest: socket.create_connection((address, target[1]), *rest)
+
+class _PinnedHTTPConnection(_PinnedConnection, http.client.HTTPConnection):
+    pass
+
+class _PinnedHTTPSConnection(_PinnedConnection, http.client.HTTPSConnection):
+    pass
+
+class _PinnedHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        connection = functools.partial(_PinnedHTTPConnection, address=check_destination(req.full_url))
+        return self.do_open(connection, req)
+
+class _PinnedHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        connection = functools.partial(_PinnedHTTPSConnection, address=check_destination(req.full_url))
+        options = {'context': self._context}
+        # Python versions before 3.12 also pass check_hostname
+        if hasattr(self, '_check_hostname'):
+            options['check_hostname'] = self._check_hostname
+        return self.do_open(connection, req, **options)
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Refuse redirects to anything but public http(s) URLs"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_destination(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+# Every request, redirects included, connects only to a vetted address; proxies are
+# bypassed since they would resolve the host themselves
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _PinnedHTTPHandler, _PinnedHTTPSHandler,
+                                      _CheckedRedirectHandler)
+
+def fetch_url(url):
+    """Download an image over HTTP(S) from a public host, refusing anything past IMAGE_MAX_BYTES"""
+    # Also refuses file: and ftp: URLs before the opener could handle them
+    check_destination(url)
+    request = urllib.request.Request(url, headers={'User-Agent': 'menu-image-cache/1.0'})
+    with _opener.open(request, timeout=Config.IMAGE_FETCH_TIMEOUT) as response:
+        data = response.read(Config.IMAGE_MAX_BYTES + 1)
+    if len(data) > Config.IMAGE_MAX_BYTES:
+        raise ImageError(f"Image is larger than {Config.IMAGE_MAX_BYTES} bytes")
+    return data
+
+def ingest_image(image_url=None, image_data=None):
+    """Content key for an item image given as uploaded bytes or a URL, or None.
+
+    Invalid uploads raise ImageError. A URL that cannot be fetched or decoded
+    only logs a warning; pages then fall back to linking the URL directly.
+    URLs are fetched by the cache_item_images job, never in a web request.
+    """
+    if image_data is not None:
+        return ingest_bytes(image_data)
+    if not image_url:
+        return None
+    try:
+        return ingest_bytes(fetch_url(image_url))
+    except Exception as e:
+        logger.warning(f"Could not cache image {image_url}: {e}")
+        return None
+
+@lru_cache(maxsize=4096)
+def _cached_meta(key):
+    with open(_meta_path(key), 'r') as f:
+        return json.load(f)
+
+def load_meta(key):
+    """Sizes of an ingested image, or None when it is not in this host's cache"""
+    if not key or not re.match(r'^[0-9a-f]{64}$', key):
+        return None
+    try:
+        # Content-addressed, so a key's variants never change once written
+        return _cached_meta(key)
+    except FileNotFoundError:
+        return None
+
+def variant_url(key, width, extension):
+    return url_for('images.serve_image', filename=f"{key}-{width}.{extension}")
+
+def responsive_image(key):
+    """src, width, height and per-type srcset strings for an <img>/<picture>, or None"""
+    meta = load_meta(key)
+    if not meta:
+        return None
+    widths = meta['widths']
+    # Default src: the variant closest to a typical card width
+    src_width = min(widths, key=lambda width: abs(width - Config.IMAGE_DEFAULT_WIDTH))
+    return {
+        'src': variant_url(key, src_width, 'jpg'),
+        'width': meta['width'],
+        'height': meta['height'],
+        'sources': [{'type': mimetype,
+                     'srcset': ', '.join(f"{variant_url(key, width, extension)} {width}w" for width in widths)}
+                    for extension, _, mimetype in FORMATS]
+    }
+
+@images_bp.route('/<filename>')
+def serve_image(filename):
+    """Serve a resized variant; names are content-addressed, so they can be cached forever"""
+    match = VARIANT_NAME.match(filename)
+    if not match:
+        abort(404)
+    path = os.path.join(_key_dir(match.group(1)), filename)
+    if not os.path.isfile(path):
+        abort(404)
+    response = send_file(path, mimetype=dict((e, m) for e, _, m in FORMATS)[match.group(3)], conditional=True)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def init_app(app):
+    """Register the image route and the responsive_image template helper"""
+    app.register_blueprint(images_bp, url_prefix='/images')
+    app.add_template_global(responsive_image, 'responsive_image')
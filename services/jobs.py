@@ -0,0 +1,316 @@
+from config import Config
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    dedupe_key TEXT,
+    worker TEXT,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, run_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key) WHERE status = 'queued';
+CREATE TABLE IF NOT EXISTS schedules (
+    schedule_name TEXT PRIMARY KEY,
+    job_name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    interval_seconds REAL NOT NULL,
+    next_run_at REAL NOT NULL
+);
+"""
+
+# Registered job handlers, keyed by job name
+job_handlers = {}
+
+def job_handler(name):
+    """Decorator registering a function as the handler for a job name"""
+    def decorator(f):
+        job_handlers[name] = f
+        return f
+    return decorator
+
+class JobQueue:
+    """Durable local job queue stored in a SQLite database"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        """Get this thread's SQLite connection, creating the schema on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    connection.executescript(SCHEMA)
+                    self._initialized = True
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def enqueue(self, name, payload=None, delay=0, max_attempts=3, dedupe_key=None):
+        """Add a job to the queue and return its id.
+
+        When dedupe_key is given and a queued job with the same key exists,
+        that job's id is returned instead of adding a duplicate.
+        """
+        connection = self._connect()
+        now = time.time()
+        cursor = connection.execute(
+            "INSERT OR IGNORE INTO jobs (name, payload, status, max_attempts, run_at, dedupe_key, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, json.dumps(payload or {}), QUEUED, max_attempts, now + delay, dedupe_key, now)
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid
+        row = connection.execute(
+            "SELECT job_id FROM jobs WHERE dedupe_key = ? AND status = ?", (dedupe_key, QUEUED)
+        ).fetchone()
+        return row['job_id'] if row else None
+
+    def claim(self, worker):
+        """Atomically take the next due job, or return None"""
+        connection = self._connect()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = ? AND run_at <= ? ORDER BY run_at, job_id LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, started_at = ?, dedupe_key = NULL "
+                "WHERE job_id = ?",
+                (RUNNING, worker, now, row['job_id'])
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        job = dict(row)
+        job['attempts'] += 1
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def complete(self, job_id, result=None):
+        """Mark a job as succeeded"""
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, finished_at = ?, last_error = NULL WHERE job_id = ?",
+            (SUCCEEDED, json.dumps(result, default=str), time.time(), job_id)
+        )
+
+    def fail(self, job, error):
+        """Record a failed attempt, scheduling a retry with exponential backoff if attempts remain"""
+        now = time.time()
+        if job['attempts'] < job['max_attempts']:
+            backoff = Config.JOB_RETRY_BACKOFF * (2 ** (job['attempts'] - 1))
+            backoff *= random.uniform(0.8, 1.2)
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, run_at = ?, last_error = ? WHERE job_id = ?",
+                (QUEUED, now + backoff, error, job['job_id'])
+            )
+            return False
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, last_error = ? WHERE job_id = ?",
+            (FAILED, now, error, job['job_id'])
+        )
+        return True
+
+    def requeue_stale(self, lease_seconds):
+        """Return jobs stuck in running (e.g. after a worker crash) to the queue"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, run_at = ? WHERE status = ? AND started_at < ?",
+            (QUEUED, time.time(), RUNNING, time.time() - lease_seconds)
+        )
+        return cursor.rowcount
+
+    def schedule(self, schedule_name, job_name, interval_seconds, payload=None):
+        """Create or update a recurring job that runs every interval_seconds"""
+        self._connect().execute(
+            "INSERT INTO schedules (schedule_name, job_name, payload, interval_seconds, next_run_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (schedule_name) DO UPDATE SET job_name = excluded.job_name, "
+            "payload = excluded.payload, interval_seconds = excluded.interval_seconds",
+            (schedule_name, job_name, json.dumps(payload or {}), interval_seconds, time.time())
+        )
+
+    def enqueue_due_schedules(self):
+        """Enqueue a job for every schedule whose next run time has passed"""
+        connection = self._connect()
+        now = time.time()
+        due = connection.execute(
+            "SELECT * FROM schedules WHERE next_run_at <= ?", (now,)
+        ).fetchall()
+        for row in due:
+            self.enqueue(row['job_name'], json.loads(row['payload']),
+                         dedupe_key=f"schedule:{row['schedule_name']}")
+            next_run_at = row['next_run_at'] + row['interval_seconds']
+            if next_run_at <= now:
+                next_run_at = now + row['interval_seconds']
+            connection.execute(
+                "UPDATE schedules SET next_run_at = ? WHERE schedule_name = ?",
+                (next_run_at, row['schedule_name'])
+            )
+        return len(due)
+
+    def get_job(self, job_id):
+        """Get a job's status record"""
+        row = self._connect().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_status(row) if row else None
+
+    def list_jobs(self, status=None, limit=50):
+        """List recent jobs, newest first"""
+        if status:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY job_id DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs ORDER BY job_id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_status(row) for row in rows]
+
+    def get_stats(self):
+        """Count jobs by status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status").fetchall()
+        stats = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        stats.update({row['status']: row['total'] for row in rows})
+        return stats
+
+    def list_schedules(self):
+        """List recurring job schedules"""
+        rows = self._connect().execute("SELECT * FROM schedules ORDER BY schedule_name").fetchall()
+        return [dict(row, payload=json.loads(row['payload'])) for row in rows]
+
+    def purge_finished(self, older_than_seconds):
+        """Delete finished jobs older than the given age"""
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (SUCCEEDED, FAILED, time.time() - older_than_seconds)
+        )
+        return cursor.rowcount
+
+    @staticmethod
+    def _to_status(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+class WorkerPool:
+    """Pool of threads executing queued jobs, plus a scheduler thread"""
+
+    def __init__(self, queue, workers=None, poll_interval=None, app=None):
+        self.queue = queue
+        self.app = app
+        self.workers = workers or Config.JOB_WORKERS
+        self.poll_interval = poll_interval or Config.JOB_POLL_INTERVAL
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        """Start worker and scheduler threads"""
+        requeued = self.queue.requeue_stale(Config.JOB_LEASE_SECONDS)
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale job(s)")
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(f"{self.name}:{index}",),
+                                      name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        scheduler = threading.Thread(target=self._schedule, name='job-scheduler', daemon=True)
+        scheduler.start()
+        self.threads.append(scheduler)
+        logger.info(f"Job worker pool started with {self.workers} worker(s)")
+
+    def stop(self, timeout=None):
+        """Signal all threads to stop and wait for running jobs to finish"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def run_one(self, worker_name):
+        """Claim and execute a single job, returning False when none was due"""
+        job = self.queue.claim(worker_name)
+        if job is None:
+            return False
+
+        handler = job_handlers.get(job['name'])
+        if handler is None:
+            job['attempts'] = job['max_attempts']
+            self.queue.fail(job, f"No handler registered for job '{job['name']}'")
+            logger.error(f"No handler registered for job '{job['name']}'")
+            return True
+
+        started = time.perf_counter()
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    result = handler(**job['payload'])
+            else:
+                result = handler(**job['payload'])
+            self.queue.complete(job['job_id'], result)
+            logger.info(f"Job {job['job_id']} ({job['name']}) succeeded in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            final = self.queue.fail(job, ''.join(traceback.format_exception_only(type(e), e)).strip())
+            logger.error(f"Job {job['job_id']} ({job['name']}) failed on attempt {job['attempts']}"
+                         f"{'' if not final else ', giving up'}: {e}")
+        return True
+
+    def _work(self, worker_name):
+        while not self.stop_event.is_set():
+            try:
+                if not self.run_one(worker_name):
+                    self.stop_event.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+                self.stop_event.wait(self.poll_interval)
+
+    def _schedule(self):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.enqueue_due_schedules()
+            except Exception as e:
+                logger.error(f"Job scheduler error: {e}")
+            self.stop_event.wait(self.poll_interval)
+
+# Global job queue instance
+job_queue = JobQueue(Config.JOB_QUEUE_PATH)
@@ -0,0 +1,56 @@
+from flask.json.provider import DefaultJSONProvider
+from decimal import Decimal
+import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    """Encode types orjson does not handle natively"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _stdlib_default(obj):
+    """Fallback encoder matching orjson's output for dates"""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    return _default(obj)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson.
+
+    Decimal is encoded as a number, datetime/date as ISO 8601 strings and
+    model objects through their to_dict() method. Falls back to the standard
+    library encoder with the same conventions when orjson is not installed.
+    """
+
+    default = staticmethod(_stdlib_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if self._app.debug:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(orjson.dumps(obj, default=_default, option=option),
+                                        mimetype=self.mimetype)
@@ -0,0 +1,42 @@
+from flask import current_app
+from models.item import Item
+from services.images import responsive_image
+import hashlib
+import json
+import threading
+
+# Cookie main.js sets to the catalog version it holds in localStorage
+COOKIE_NAME = 'menu_catalog'
+
+# Fields of each entry in the catalog's items list
+COLUMNS = ('item_id', 'item_name', 'category', 'price', 'image_url', 'image')
+
+# Per-process copy: (menu version, catalog version, JSON body)
+_catalog = (None, None, None)
+_lock = threading.Lock()
+
+def _build():
+    items, categories = Item.get_catalog()
+    content = {
+        'columns': COLUMNS,
+        'categories': categories,
+        'items': [[item.item_id, item.item_name, item.category,
+                   float(item.price) if item.price is not None else None, item.image_url,
+                   responsive_image(item.image_key)] for item in items]
+    }
+    # A digest of the content rather than the menu version stamp, so every process and host agrees on it
+    version = hashlib.sha1(json.dumps(content, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()[:16]
+    return version, current_app.json.dumps({'version': version, **content})
+
+def get_catalog():
+    """(version, JSON body) of the whole menu for the client-side cache, rebuilt when the menu changes.
+
+    Needs a request context: image URLs are built with url_for.
+    """
+    global _catalog
+    menu_version = Item.get_menu_version()
+    if _catalog[0] != menu_version:
+        with _lock:
+            if _catalog[0] != menu_version:
+                _catalog = (menu_version,) + _build()
+    return _catalog[1], _catalog[2]
@@ -0,0 +1,121 @@
+from config import Config
+from models.item import Item
+import csv
+import io
+import json
+
+# Columns of a menu file, in export order; other CSV columns or JSON keys are ignored
+COLUMNS = ('item_name', 'category', 'price', 'image_url')
+
+# Exports are streamed in chunks of about this many characters rather than one per row
+EXPORT_CHUNK_CHARS = 64 * 1024
+
+FORMATS = {'csv': 'text/csv', 'json': 'application/json'}
+
+class ImportFormatError(ValueError):
+    """The uploaded menu file could not be read at all"""
+
+def detect_format(filename=None, mimetype=None):
+    """'csv' or 'json' from a file name or content type, defaulting to CSV"""
+    if filename and filename.lower().endswith('.json'):
+        return 'json'
+    if not filename and mimetype and mimetype.endswith('json'):
+        return 'json'
+    return 'csv'
+
+def _price(value):
+    """Prices in CSV files are text; parse them the way the menu form does"""
+    if isinstance(value, str):
+        try:
+            return float(value) if value.strip() else None
+        except ValueError:
+            return None
+    return value
+
+def parse_items(data, file_format):
+    """Rows of a CSV file (with a header line) or a JSON list of objects, as dicts"""
+    try:
+        text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    except UnicodeDecodeError:
+        raise ImportFormatError('Menu files must be UTF-8 encoded')
+    
+    if file_format == 'json':
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise ImportFormatError(f"Invalid JSON: {e}")
+        if isinstance(rows, dict):
+            rows = rows.get('items')
+        if not isinstance(rows, list):
+            raise ImportFormatError('JSON menu files must be a list of items or {"items": [...]}')
+    elif file_format == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or 'item_name' not in reader.fieldnames:
+            raise ImportFormatError(f"CSV menu files need a header line with the columns {', '.join(COLUMNS)}")
+        rows = list(reader)
+    else:
+        raise ImportFormatError(f"Unsupported format {file_format!r}, use csv or json")
+    
+    if len(rows) > Config.MENU_IMPORT_MAX_ROWS:
+        raise ImportFormatError(f"Menu files may hold at most {Config.MENU_IMPORT_MAX_ROWS} items")
+    return rows
+
+def validate_rows(rows):
+    """Validate every row in one pass; returns (valid items, [{'row': n, 'error': ...}]).
+
+    Rows are numbered from 1, not counting a CSV header line. A name that
+    appears twice is an error on the later row, since both would update
+    the same item.
+    """
+    items, errors, seen = [], [], {}
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'error': 'Row must be an object'})
+            continue
+        valid, fields = Item.validate_item(dict(row, price=_price(row.get('price'))))
+        if not valid:
+            errors.append({'row': number, 'item_name': row.get('item_name'), 'error': fields})
+            continue
+        name = fields['item_name'].casefold()
+        if name in seen:
+            errors.append({'row': number, 'item_name': fields['item_name'],
+                           'error': f"Duplicate of row {seen[name]}"})
+            continue
+        seen[name] = number
+        items.append(fields)
+    return items, errors
+
+def _drain(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+def _export_row(item):
+    return {'item_name': item.item_name, 'category': item.category,
+            'price': float(item.price) if item.price is not None else None, 'image_url': item.image_url}
+
+def export_csv(items):
+    """CSV text chunks, a header line and then one line per item"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for item in items:
+        row = _export_row(item)
+        writer.writerow([row[column] if row[column] is not None else '' for column in COLUMNS])
+        if buffer.tell() >= EXPORT_CHUNK_CHARS:
+            yield _drain(buffer)
+    yield buffer.getvalue()
+
+def export_json(items):
+    """JSON text chunks of {"items": [...]}, the format parse_items() reads back"""
+    buffer = io.StringIO()
+    buffer.write('{"items": [')
+    separator = ''
+    for item in items:
+        buffer.write(separator + json.dumps(_export_row(item), ensure_ascii=False))
+        separator = ', '
+        if buffer.tell() >= EXPORT_CHUNK_CHARS:
+            yield _drain(buffer)
+    buffer.write(']}')
+    yield buffer.getvalue()
@@ -0,0 +1,194 @@
+from flask import g, request
+from collections import deque
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Log-linear buckets in the style of HdrHistogram: values below 2 * SUB_BUCKETS
+# microseconds are exact, above that each power of two is split into
+# SUB_BUCKETS buckets, so any recorded value is within ~3% of its bucket.
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+LINEAR_LIMIT = SUB_BUCKETS * 2
+
+def bucket_index(value):
+    """Histogram bucket for a non-negative integer value"""
+    if value < LINEAR_LIMIT:
+        return value
+    shift = value.bit_length() - (SUB_BUCKET_BITS + 1)
+    return LINEAR_LIMIT + (shift - 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+def bucket_upper_bound(index):
+    """Largest value that falls into a bucket"""
+    if index < LINEAR_LIMIT:
+        return index
+    shift, sub = divmod(index - LINEAR_LIMIT, SUB_BUCKETS)
+    shift += 1
+    return ((sub + SUB_BUCKETS + 1) << shift) - 1
+
+class LatencyHistogram:
+    """Sparse log-linear histogram of latencies in microseconds"""
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        index = bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentiles(self, quantiles):
+        """Values at the given quantiles (0-1), reported as bucket upper bounds"""
+        if not self.count:
+            return [0] * len(quantiles)
+        targets = [max(1, int(q * self.count + 0.5)) for q in quantiles]
+        results = [None] * len(quantiles)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            for i, target in enumerate(targets):
+                if results[i] is None and seen >= target:
+                    results[i] = min(bucket_upper_bound(index), self.max)
+            if all(result is not None for result in results):
+                break
+        return results
+
+class MetricsSlot:
+    """Everything recorded for one endpoint during one time slot"""
+
+    __slots__ = ('start', 'latency', 'statuses', 'response_bytes')
+
+    def __init__(self, start):
+        self.start = start
+        self.latency = LatencyHistogram()
+        self.statuses = {}
+        self.response_bytes = 0
+
+class EndpointMetrics:
+    """Rolling per-endpoint request metrics kept as a ring of fixed-length slots"""
+
+    def __init__(self, slot_seconds, max_slots):
+        self.slot_seconds = slot_seconds
+        self.slots = deque(maxlen=max_slots)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def record(self, now, duration_us, status, size):
+        slot_start = int(now // self.slot_seconds)
+        with self.lock:
+            if not self.slots or self.slots[-1].start != slot_start:
+                self.slots.append(MetricsSlot(slot_start))
+            slot = self.slots[-1]
+            slot.latency.record(duration_us)
+            status_class = f"{status // 100}xx"
+            slot.statuses[status_class] = slot.statuses.get(status_class, 0) + 1
+            slot.response_bytes += size
+
+    def summarize(self, now, window):
+        """Aggregate the slots that fall inside the last `window` seconds"""
+        oldest = int(now // self.slot_seconds) - max(1, window // self.slot_seconds) + 1
+        latency = LatencyHistogram()
+        statuses = {}
+        response_bytes = 0
+        with self.lock:
+            for slot in self.slots:
+                if slot.start < oldest:
+                    continue
+                latency.merge(slot.latency)
+                for status_class, count in slot.statuses.items():
+                    statuses[status_class] = statuses.get(status_class, 0) + count
+                response_bytes += slot.response_bytes
+            in_flight = self.in_flight
+
+        p50, p95, p99 = latency.percentiles((0.50, 0.95, 0.99))
+        return {
+            'requests': latency.count,
+            'rps': round(latency.count / window, 2),
+            'p50_ms': p50 / 1000,
+            'p95_ms': p95 / 1000,
+            'p99_ms': p99 / 1000,
+            'max_ms': latency.max / 1000,
+            'mean_ms': round(latency.total / latency.count / 1000, 3) if latency.count else 0,
+            'statuses': statuses,
+            'avg_response_bytes': response_bytes // latency.count if latency.count else 0,
+            'in_flight': in_flight
+        }
+
+class RequestMetrics:
+    """Process-wide registry of per-endpoint request metrics"""
+
+    def __init__(self, slot_seconds=10, windows=(60, 300, 900)):
+        self.slot_seconds = slot_seconds
+        self.windows = tuple(windows)
+        self.max_slots = max(self.windows) // slot_seconds + 1
+        self.started = time.monotonic()
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, name):
+        metrics = self._endpoints.get(name)
+        if metrics is None:
+            with self._lock:
+                metrics = self._endpoints.setdefault(name, EndpointMetrics(self.slot_seconds, self.max_slots))
+        return metrics
+
+    def summarize(self, window):
+        now = time.monotonic()
+        window = min(window, int(now - self.started) + self.slot_seconds)
+        rows = {name: metrics.summarize(now, window) for name, metrics in list(self._endpoints.items())}
+        return {name: row for name, row in rows.items() if row['requests'] or row['in_flight']}
+
+    def in_flight(self):
+        return sum(metrics.in_flight for metrics in list(self._endpoints.values()))
+
+def init_app(app):
+    """Time every request and record it under its endpoint"""
+    global request_metrics
+    request_metrics = RequestMetrics(app.config['PERF_SLOT_SECONDS'], app.config['PERF_WINDOWS'])
+    slow_request_ms = app.config['PERF_SLOW_REQUEST_MS']
+
+    @app.before_request
+    def start_timer():
+        metrics = request_metrics.endpoint(request.endpoint or '<unmatched>')
+        with metrics.lock:
+            metrics.in_flight += 1
+        g.perf = (metrics, time.perf_counter())
+
+    @app.after_request
+    def record_request(response):
+        perf = g.get('perf')
+        if perf is not None:
+            metrics, started = perf
+            duration_us = int((time.perf_counter() - started) * 1_000_000)
+            metrics.record(time.monotonic(), duration_us, response.status_code, response.content_length or 0)
+            if slow_request_ms and duration_us >= slow_request_ms * 1000:
+                logger.warning(f"Slow request: {request.method} {request.path} ({request.endpoint}) "
+                               f"{response.status_code} in {duration_us / 1000:.1f} ms")
+        return response
+
+    @app.teardown_request
+    def stop_timer(exc):
+        perf = g.pop('perf', None)
+        if perf is not None:
+            with perf[0].lock:
+                perf[0].in_flight -= 1
+
+# Replaced with the app's settings by init_app
+request_metrics = RequestMetrics()
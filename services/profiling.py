@@ -0,0 +1,184 @@
+from flask import g, request
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from collections import Counter
+from datetime import datetime
+from models.database import query_counter
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_SALT = 'request-profile'
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval.
+
+    Stacks are aggregated in collapsed form ("outer;inner;leaf count"), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{_module_name(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+def _module_name(filename):
+    """Short, separator-free label for a source file"""
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = os.path.relpath(filename) if os.path.isabs(filename) else filename
+    return filename.replace(';', '_').replace(' ', '_')
+
+def _serializer(app):
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+def make_profile_token(app):
+    """Signed value for the X-Profile header that turns on profiling for a request"""
+    return _serializer(app).dumps('profile')
+
+def _token_is_valid(app, token):
+    try:
+        _serializer(app).loads(token, max_age=app.config['PROFILE_TOKEN_MAX_AGE'])
+        return True
+    except BadSignature:
+        return False
+
+def list_profiles(app, limit=100):
+    """Metadata of recent profiles, newest first"""
+    directory = app.config['PROFILE_DIR']
+    try:
+        names = sorted((name for name in os.listdir(directory) if name.endswith('.json')), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name), 'r') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+def _prune(directory, keep):
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in names[:-keep] if keep else names:
+        base = name[:-len('.json')]
+        for suffix in ('.json', '.folded'):
+            try:
+                os.remove(os.path.join(directory, base + suffix))
+            except FileNotFoundError:
+                pass
+
+def init_app(app):
+    """Profile requests that carry a valid X-Profile token or fall in the sample rate"""
+
+    @app.before_request
+    def start_profile():
+        token = request.headers.get(PROFILE_HEADER)
+        sampled = app.config['PROFILE_SAMPLE_RATE'] and random.random() < app.config['PROFILE_SAMPLE_RATE']
+        if not sampled and not (token and _token_is_valid(app, token)):
+            return
+        if request.endpoint in (None, 'static', 'assets.serve_asset'):
+            return
+
+        sampler = StackSampler(threading.get_ident(), app.config['PROFILE_INTERVAL_MS'] / 1000.0)
+        counter = [0]
+        g.profile = {
+            'sampler': sampler,
+            'counter': counter,
+            'counter_token': query_counter.set(counter),
+            'started': time.perf_counter(),
+            'trigger': 'sample' if sampled else 'header'
+        }
+        sampler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+
+        profile['sampler'].stop()
+        query_counter.reset(profile['counter_token'])
+        duration_ms = (time.perf_counter() - profile['started']) * 1000
+        try:
+            _write_profile(app, profile, response.status_code, duration_ms)
+        except Exception as e:
+            logger.error(f"Failed to write profile: {e}")
+        response.headers['X-Profile-Samples'] = str(profile['sampler'].samples)
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # after_request is skipped when the view raises; stop the sampler anyway
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile['sampler'].stop()
+            query_counter.reset(profile['counter_token'])
+
+def _write_profile(app, profile, status_code, duration_ms):
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+
+    endpoint = request.endpoint or 'unknown'
+    now = datetime.now()
+    base = f"{now:%Y%m%d-%H%M%S-%f}-{re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)}-{os.getpid()}"
+    sampler = profile['sampler']
+
+    with open(os.path.join(directory, base + '.folded'), 'w') as f:
+        f.write(sampler.collapsed())
+    metadata = {
+        'name': base,
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': status_code,
+        'duration_ms': round(duration_ms, 2),
+        'query_count': profile['counter'][0],
+        'samples': sampler.samples,
+        'trigger': profile['trigger'],
+        'pid': os.getpid(),
+        'created_at': now.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    with open(os.path.join(directory, base + '.json'), 'w') as f:
+        json.dump(metadata, f)
+
+    _prune(directory, app.config['PROFILE_KEEP'])
+    logger.info(f"Profiled {endpoint}: {duration_ms:.1f} ms, {metadata['query_count']} queries, "
+                f"{sampler.samples} samples -> {base}.folded")
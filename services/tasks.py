@@ -0,0 +1,143 @@
+from flask import current_app
+from config import Config
+from datetime import datetime
+from models.order import Order
+from services.jobs import job_handler, job_queue
+import csv
+import glob
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+def _snapshot_path(name):
+    return os.path.join(Config.DATA_DIR, 'snapshots', f"{name}.json")
+
+def write_snapshot(name, body):
+    """Atomically store a precomputed JSON response body"""
+    path = _snapshot_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+
+def read_snapshot(name, max_age):
+    """Return a stored JSON body if it is younger than max_age seconds, else None"""
+    path = _snapshot_path(name)
+    try:
+        if time.time() - os.stat(path).st_mtime > max_age:
+            return None
+        with open(path, 'r') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def snapshot_mtime(name):
+    """Modification time of a stored snapshot, or None if there is none"""
+    try:
+        return os.stat(_snapshot_path(name)).st_mtime
+    except FileNotFoundError:
+        return None
+
+def request_analytics_refresh(delay=5):
+    """Queue a coalesced analytics refresh after a write; never fails the caller"""
+    try:
+        job_queue.enqueue('refresh_analytics_summary', delay=delay, dedupe_key='refresh_analytics_summary')
+    except Exception as e:
+        logger.error(f"Failed to queue analytics refresh: {e}")
+
+def request_image_caching():
+    """Queue a coalesced cache_item_images run after a menu change; never fails the caller"""
+    try:
+        job_queue.enqueue('cache_item_images', dedupe_key='cache_item_images')
+    except Exception as e:
+        logger.error(f"Failed to queue image caching: {e}")
+
+@job_handler('refresh_analytics_summary')
+def refresh_analytics_summary():
+    """Recompute the analytics summary served by /api/analytics/summary"""
+    summary = Order.get_analytics_summary()
+    write_snapshot('analytics_summary', current_app.json.dumps(summary))
+    return {'total_orders': summary['total_orders']}
+
+def cohort_snapshot_name(day=None):
+    """Cohort results are cached per calendar day"""
+    return f"cohorts-{(day or datetime.now().date()).isoformat()}"
+
+@job_handler('refresh_cohorts')
+def refresh_cohorts(force=False):
+    """Compute today's cohort analytics unless they are already cached"""
+    name = cohort_snapshot_name()
+    if not force and read_snapshot(name, 2 * 24 * 3600):
+        return {'skipped': True}
+    
+    from services.cohorts import compute_cohorts
+    cohorts = compute_cohorts()
+    write_snapshot(name, current_app.json.dumps(cohorts))
+    for path in glob.glob(_snapshot_path('cohorts-*')):
+        if os.path.basename(path) != f"{name}.json":
+            os.remove(path)
+    return {'customers': cohorts['customers']}
+
+@job_handler('refresh_cooccurrence')
+def refresh_cooccurrence():
+    """Rebuild the "customers also ordered" index that web processes load"""
+    from services.cooccurrence import SNAPSHOT_NAME, build_index
+    index = build_index()
+    write_snapshot(SNAPSHOT_NAME, json.dumps(index.to_dict(), separators=(',', ':')))
+    return index.get_stats()
+
+@job_handler('cache_item_images')
+def cache_item_images():
+    """Cache images of items added before the image cache or whose image could not be fetched"""
+    from models.item import Item
+    from services.images import ingest_image, load_meta
+    cached = failed = 0
+    for item in Item.get_all_items():
+        if not item.image_url or load_meta(item.image_key):
+            continue
+        image_key = ingest_image(item.image_url)
+        if image_key is None:
+            failed += 1
+            continue
+        if image_key != item.image_key:
+            Item.set_image_key(item.item_id, image_key)
+        cached += 1
+    if cached:
+        Item.bump_menu_version()
+    return {'cached': cached, 'failed': failed}
+
+@job_handler('export_orders')
+def export_orders(user_id=None):
+    """Write orders to a CSV file under EXPORT_DIR"""
+    os.makedirs(Config.EXPORT_DIR, exist_ok=True)
+    orders = Order.get_user_orders(user_id) if user_id else Order.get_all_orders()
+    suffix = f"user-{user_id}" if user_id else 'all'
+    path = os.path.join(Config.EXPORT_DIR, f"orders-{suffix}-{time.strftime('%Y%m%d-%H%M%S')}.csv")
+    
+    columns = ['order_id', 'line_id', 'user_id', 'item_id', 'item_name', 'category', 'price',
+               'quantity', 'delivery_address', 'order_timestamp']
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for order in orders:
+            writer.writerow([getattr(order, column) for column in columns])
+    
+    logger.info(f"Exported {len(orders)} orders to {path}")
+    return {'path': path, 'rows': len(orders)}
+
+@job_handler('archive_orders')
+def archive_orders(retention_days=None):
+    """Move order partitions past the retention horizon into the archive"""
+    from archive_orders import archive_orders as run_archival
+    return {'archived': run_archival(retention_days)}
+
+@job_handler('prune_event_log')
+def prune_event_log(retention_days=None):
+    """Delete change event log segments older than the retention period"""
+    from services.event_log import event_log
+    days = Config.EVENT_LOG_RETENTION_DAYS if retention_days is None else retention_days
+    return {'pruned_segments': event_log.prune(days * 24 * 3600)}
@@ -0,0 +1,126 @@
+from flask import Blueprint, jsonify
+from config import Config
+import fcntl
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+health_bp = Blueprint('health', __name__)
+
+def open_connections():
+    """Create this process's pools; a pool opens all DB_POOL_SIZE connections when created"""
+    from models.database import db_manager
+    db_manager.execute_query("SELECT 1", fetch=True)
+    if db_manager.sharded:
+        db_manager.scatter(lambda orders_db: orders_db.execute_query("SELECT 1", fetch=True))
+
+def load_catalog():
+    """Fill the per-process menu catalog cache"""
+    from models.item import Item
+    Item.get_catalog()
+
+def precompute_analytics():
+    """Write the analytics summary snapshot unless one is fresh.
+
+    Workers booting together take turns on a lock file, so the summary is
+    computed once per host rather than once per worker.
+    """
+    from services.tasks import read_snapshot, refresh_analytics_summary
+    if read_snapshot('analytics_summary', Config.ANALYTICS_SNAPSHOT_TTL):
+        return
+    lock_path = os.path.join(Config.DATA_DIR, 'snapshots', 'analytics_summary.warmup.lock')
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not read_snapshot('analytics_summary', Config.ANALYTICS_SNAPSHOT_TTL):
+            refresh_analytics_summary()
+
+# Run in order; a failed step is retried with backoff, later steps wait for it
+STEPS = (('connections', open_connections), ('catalog', load_catalog), ('analytics', precompute_analytics))
+
+class WarmUp:
+    """Per-process warm-up state behind /readyz.
+
+    The steps run in a background thread of each serving process, after the
+    fork, so creating the app still opens no connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._done = threading.Event()
+        self.steps = {}
+        self.error = None
+
+    def start(self, app):
+        """Start warming up this process unless it already has"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._done = threading.Event()
+            self.steps = {}
+            self.error = None
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, args=(app,), name='warm-up', daemon=True).start()
+
+    def _run(self, app):
+        started = time.perf_counter()
+        delay = 0.5
+        for name, step in STEPS:
+            while True:
+                step_started = time.perf_counter()
+                try:
+                    with app.app_context():
+                        step()
+                    # Replaced rather than updated, /readyz may be serializing it
+                    self.steps = {**self.steps, name: round((time.perf_counter() - step_started) * 1000, 1)}
+                    break
+                except Exception as e:
+                    self.error = f"{name}: {e}"
+                    logger.warning(f"Warm-up step {name} failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 30.0)
+        self.error = None
+        self._done.set()
+        logger.info(f"Worker {os.getpid()} warmed up in {(time.perf_counter() - started) * 1000:.0f} ms {self.steps}")
+
+    def wait(self, timeout):
+        """Block until warm-up finishes or timeout expires; returns whether it finished"""
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._pid == os.getpid() and self._done.is_set()
+
+# Global warm-up state of this process
+warmup = WarmUp()
+
+@health_bp.route('/healthz')
+def healthz():
+    """Liveness: the process is serving requests"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@health_bp.route('/readyz')
+def readyz():
+    """Readiness: 200 only once this process has warmed up, so load balancers skip cold workers"""
+    if warmup.ready:
+        return jsonify({'status': 'ready', 'pid': os.getpid(), 'steps_ms': warmup.steps})
+    return jsonify({'status': 'warming_up', 'pid': os.getpid(), 'steps_ms': warmup.steps,
+                    'error': warmup.error}), 503
+
+def init_app(app):
+    """Register /healthz and /readyz, and warm up each process when it serves its first request.
+
+    Servers that can hook worker boot (serve.py) call warmup.start() before
+    the worker accepts connections instead.
+    """
+    app.register_blueprint(health_bp)
+
+    @app.before_request
+    def start_warmup():
+        warmup.start(app)
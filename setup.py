@@ -58,6 +58,11 @@ FLASK_ENV=development
         logger.error("❌ Setup failed at database migration")
         return False
     
+    # Build fingerprinted static assets
+    if not run_script('build_assets.py', 'Static asset build'):
+        logger.error("❌ Setup failed at static asset build")
+        return False
+    
     logger.info("🎉 Setup completed successfully!")
     logger.info("📝 Next steps:")
     logger.info("   1. Update .env file with your database credentials")
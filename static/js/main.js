@@ -70,6 +70,171 @@ const Utils = {
             hour: '2-digit',
             minute: '2-digit'
         });
+    },
+    
+    // Escape text for use in HTML markup and attributes
+    escapeHtml: function(text) {
+        return String(text ?? '').replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+};
+
+// Menu catalog kept in localStorage and keyed by the server's catalog version
+const MenuCatalog = {
+    storageKey: 'menuCatalog',
+    cookieName: 'menu_catalog',
+    catalog: null,
+    byId: null,
+    list: [],
+    
+    // Load the stored catalog, if any
+    load: function() {
+        if (this.catalog) {
+            return this.catalog;
+        }
+        try {
+            const stored = JSON.parse(localStorage.getItem(this.storageKey));
+            if (stored && stored.version && Array.isArray(stored.items)) {
+                this.use(stored);
+            }
+        } catch (error) {
+            console.error('Error reading menu catalog:', error);
+        }
+        return this.catalog;
+    },
+    
+    // Keep a catalog in memory and index its items by id
+    use: function(catalog) {
+        this.catalog = catalog;
+        this.byId = {};
+        this.list = catalog.items.map(row => {
+            const item = {};
+            catalog.columns.forEach((column, index) => { item[column] = row[index]; });
+            this.byId[item.item_id] = item;
+            return item;
+        });
+    },
+    
+    // Store a catalog and tell the server which version this browser holds
+    save: function(catalog) {
+        this.use(catalog);
+        try {
+            localStorage.setItem(this.storageKey, JSON.stringify(catalog));
+            document.cookie = `${this.cookieName}=${catalog.version}; path=/; max-age=31536000; SameSite=Lax`;
+        } catch (error) {
+            // Storage full or disabled: the server keeps rendering the menu
+            this.forget();
+        }
+    },
+    
+    // Drop the stored catalog so the next page view is rendered by the server
+    forget: function() {
+        try {
+            localStorage.removeItem(this.storageKey);
+        } catch (error) {
+            // Storage disabled
+        }
+        document.cookie = `${this.cookieName}=; path=/; max-age=0; SameSite=Lax`;
+    },
+    
+    // Make sure the stored catalog is the given version, downloading it only when it changed
+    sync: function(url, version) {
+        const stored = this.load();
+        if (stored && stored.version === version) {
+            return Promise.resolve(stored);
+        }
+        const headers = stored ? { 'If-None-Match': `"${stored.version}"` } : {};
+        return fetch(url, { headers: headers, credentials: 'same-origin' })
+            .then(response => {
+                if (response.status === 304) {
+                    return stored;
+                }
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json().then(catalog => {
+                    this.save(catalog);
+                    return catalog;
+                });
+            });
+    },
+    
+    getItem: function(itemId) {
+        this.load();
+        return this.byId ? this.byId[itemId] || null : null;
+    },
+    
+    // Menu cards grouped by category, matching the server-rendered grid
+    render: function(container, selectedCategory, related = {}) {
+        const esc = Utils.escapeHtml;
+        const groups = new Map();
+        // The catalog is already in the server's order: by category, then name
+        this.list.forEach(item => {
+            if (selectedCategory && item.category !== selectedCategory) {
+                return;
+            }
+            if (!groups.has(item.category)) {
+                groups.set(item.category, []);
+            }
+            groups.get(item.category).push(item);
+        });
+        
+        let html = '';
+        groups.forEach((items, category) => {
+            html += `<div class="mb-4">
+                <h5 class="text-danger border-bottom pb-2"><i class="fas fa-tag me-2"></i>${esc(category)}</h5>
+                <div class="row">`;
+            items.forEach(item => {
+                const id = esc(item.item_id);
+                let image = '';
+                if (item.image) {
+                    const sources = item.image.sources.map(source =>
+                        `<source type="${esc(source.type)}" srcset="${esc(source.srcset)}"
+                                 sizes="(min-width: 992px) 400px, (min-width: 768px) 50vw, 100vw">`).join('');
+                    image = `<picture>${sources}<img src="${esc(item.image.src)}" class="card-img-top" alt="${esc(item.item_name)}"
+                                 width="${esc(item.image.width)}" height="${esc(item.image.height)}" loading="lazy" decoding="async"
+                                 style="height: 200px; object-fit: cover;"></picture>`;
+                } else if (item.image_url) {
+                    image = `<img src="${esc(item.image_url)}" class="card-img-top" alt="${esc(item.item_name)}"
+                                  loading="lazy" style="height: 200px; object-fit: cover;">`;
+                }
+                const alsoOrdered = (related[item.item_id] || [])
+                    .map(otherId => this.byId[otherId] && this.byId[otherId].item_name)
+                    .filter(Boolean);
+                html += `<div class="col-md-6 mb-3">
+                    <div class="card h-100 border-0 shadow-sm" data-item-id="${id}">
+                        ${image}
+                        <div class="card-body">
+                            <div class="d-flex justify-content-between align-items-start mb-2">
+                                <h6 class="card-title mb-0">${esc(item.item_name)}</h6>
+                                <span class="badge bg-success">${Utils.formatCurrency(item.price ?? 0)}</span>
+                            </div>
+                            <p class="card-text text-muted small">${esc(item.category)}</p>
+                            ${alsoOrdered.length ? `<p class="card-text small mb-2">
+                                <i class="fas fa-users me-1 text-danger"></i>Customers also ordered: ${esc(alsoOrdered.join(', '))}
+                            </p>` : ''}
+                            <div class="d-flex align-items-center">
+                                <button class="btn btn-sm btn-outline-danger me-2 quantity-btn" data-action="decrease" data-item-id="${id}">
+                                    <i class="fas fa-minus"></i>
+                                </button>
+                                <input type="number" class="form-control form-control-sm text-center quantity-input"
+                                       id="quantity_${id}" value="0" min="0" max="100" style="width: 60px;" data-item-id="${id}">
+                                <button class="btn btn-sm btn-outline-danger ms-2 quantity-btn" data-action="increase" data-item-id="${id}">
+                                    <i class="fas fa-plus"></i>
+                                </button>
+                            </div>
+                        </div>
+                    </div>
+                </div>`;
+            });
+            html += '</div></div>';
+        });
+        
+        container.innerHTML = html || `<div class="text-center py-4">
+            <i class="fas fa-exclamation-triangle text-warning fa-3x mb-3"></i>
+            <p class="text-muted">No menu items available at the moment.</p>
+        </div>`;
     }
 };
 
@@ -115,15 +280,9 @@ const Cart = {
     },
     
     getItemPrice: function(itemId) {
-        // This would typically come from the server
-        const prices = {
-            1: 180.00, // Biriyani
-            2: 150.00, // Paneer
-            3: 200.00, // Butter Chicken
-            4: 90.00,  // Veg Momos
-            5: 120.00  // Chicken Wings
-        };
-        return prices[itemId] || 0;
+        // Prices come from the cached menu catalog; items without a price count as free
+        const item = MenuCatalog.getItem(itemId);
+        return item && item.price !== null ? item.price : 0;
     },
     
     updateDisplay: function() {
@@ -303,5 +462,6 @@ document.addEventListener('DOMContentLoaded', function() {
 // Export for use in other scripts
 window.Utils = Utils;
 window.Cart = Cart;
+window.MenuCatalog = MenuCatalog;
 window.FormValidator = FormValidator;
 window.API = API;
@@ -0,0 +1,43 @@
+from app import create_app
+from config import Config
+from services.jobs import job_queue, WorkerPool
+import services.tasks  # noqa: F401 - registers job handlers
+import logging
+import signal
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Run background job workers until interrupted"""
+    app = create_app()
+    
+    # Recurring jobs
+    job_queue.schedule('archive_orders', 'archive_orders', 24 * 3600)
+    job_queue.schedule('refresh_analytics_summary', 'refresh_analytics_summary',
+                       max(Config.ANALYTICS_SNAPSHOT_TTL // 2, 5))
+    # Skips quickly once today's cohorts are cached
+    job_queue.schedule('refresh_cohorts', 'refresh_cohorts', 3600)
+    job_queue.schedule('refresh_cooccurrence', 'refresh_cooccurrence', Config.COOCCURRENCE_REFRESH_SECONDS)
+    # Retries item images that could not be fetched; no downloads once every image is cached
+    job_queue.schedule('cache_item_images', 'cache_item_images', 3600)
+    job_queue.schedule('prune_event_log', 'prune_event_log', 3600)
+    
+    pool = WorkerPool(job_queue, app=app)
+    
+    def shutdown(signum, frame):
+        logger.info("Stopping job workers...")
+        pool.stop_event.set()
+    
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    
+    pool.start()
+    while not pool.stop_event.wait(3600):
+        purged = job_queue.purge_finished(7 * 24 * 3600)
+        if purged:
+            logger.info(f"Purged {purged} finished job(s)")
+    pool.stop()
+
+if __name__ == '__main__':
+    main()